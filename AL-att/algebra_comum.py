@@ -0,0 +1,140 @@
+"""
+Núcleo comum das tarefas de Álgebra Linear: escalonamento e fatoração LU com NumPy.
+Usado por algebra_q2.py, algebra_q3.py e algebra_q4.py.
+"""
+import numpy as np
+
+# valores menores que isso (em módulo) contam como zero
+TOL = 1e-10
+# colunas por bloco no escalonamento
+BLOCO = 64
+
+
+# -------------------------
+# Escalonamento (eliminação de Gauss com pivoteamento parcial)
+# -------------------------
+def escalonar(M, copiar=True):
+    """Forma escalonada de M, com os pivôs normalizados em 1.
+
+    Trabalha em float64 no próprio array (com copiar=False e M já um
+    array float64, M é alterada). As colunas são tratadas em blocos de
+    BLOCO: dentro do bloco, cada pivô (a linha de maior módulo na coluna)
+    normaliza a sua linha e zera a coluna abaixo com uma atualização de
+    posto 1, sem laço por elemento. As colunas à direita do bloco recebem
+    todas essas operações de uma vez no fim dele, com um produto de
+    matrizes: é o que deixa um sistema 1000x1000 em décimos de segundo.
+    """
+    A = np.array(M, dtype=np.float64) if copiar else np.asarray(M, dtype=np.float64)
+    linhas, colunas = A.shape
+    # fatores usados em cada linha pelos pivôs do bloco atual (coluna k = k-ésimo pivô)
+    F = np.zeros((linhas, BLOCO))
+    pivo_linha = 0
+
+    for j0 in range(0, colunas, BLOCO):
+        if pivo_linha >= linhas:
+            break
+        j1 = min(j0 + BLOCO, colunas)
+        inicio = pivo_linha
+        pivos = []
+        F[inicio:] = 0
+
+        for j in range(j0, j1):
+            if pivo_linha >= linhas:
+                break
+
+            # Encontrar melhor pivô
+            i_max = pivo_linha + int(np.argmax(np.abs(A[pivo_linha:, j])))
+            pivo = A[i_max, j]
+            if abs(pivo) < TOL:
+                continue
+            if i_max != pivo_linha:
+                A[[pivo_linha, i_max]] = A[[i_max, pivo_linha]]
+                F[[pivo_linha, i_max]] = F[[i_max, pivo_linha]]
+
+            # Normalizar (só dentro do bloco; o resto da linha fica para o fim)
+            linha = A[pivo_linha, j:j1]
+            linha /= pivo
+
+            # Eliminar abaixo: A[i, j:j1] -= A[i, j] * linha para todas as linhas de uma vez
+            abaixo = A[pivo_linha + 1:, j:j1]
+            F[pivo_linha + 1:, len(pivos)] = abaixo[:, 0]
+            abaixo -= np.outer(abaixo[:, 0], linha)
+
+            pivos.append(pivo)
+            pivo_linha += 1
+
+        if not pivos or j1 == colunas:
+            continue
+        # Colunas à direita do bloco: nas linhas dos pivôs, as mesmas eliminações
+        # e normalizações em ordem; abaixo delas, tudo num produto só
+        k = len(pivos)
+        topo = A[inicio:pivo_linha, j1:]
+        for t in range(k):
+            if t:
+                topo[t] -= F[inicio + t, :t] @ topo[:t]
+            topo[t] /= pivos[t]
+        A[pivo_linha:, j1:] -= F[pivo_linha:, :k] @ topo
+
+    return A
+
+
+def achar_pivos(esc):
+    # coluna do primeiro valor não nulo de cada linha (linhas nulas ficam de fora)
+    nao_nulos = np.abs(esc) > TOL
+    tem = nao_nulos.any(axis=1)
+    return np.argmax(nao_nulos, axis=1)[tem].tolist()
+
+
+# -------------------------
+# Fatoração LU (fatora uma vez, resolve vários sistemas)
+# -------------------------
+def fatorar_lu(A):
+    """PA = LU com pivoteamento parcial, para A quadrada.
+
+    Retorna (LU, p): L fica abaixo da diagonal de LU (a diagonal de L,
+    toda 1, não é guardada), U da diagonal para cima, e p é a ordem das
+    linhas (PA = A[p]). Cada coluna é eliminada com uma atualização de
+    posto 1, como em escalonar. Levanta ValueError se A for singular.
+    """
+    LU = np.array(A, dtype=np.float64)
+    n, colunas = LU.shape
+    if n != colunas:
+        raise ValueError(f"a matriz precisa ser quadrada ({n}x{colunas})")
+    p = np.arange(n)
+
+    for j in range(n):
+        i_max = j + int(np.argmax(np.abs(LU[j:, j])))
+        if abs(LU[i_max, j]) < TOL:
+            raise ValueError("matriz singular (colunas linearmente dependentes)")
+        if i_max != j:
+            LU[[j, i_max]] = LU[[i_max, j]]
+            p[[j, i_max]] = p[[i_max, j]]
+
+        # fatores de L na coluna j e atualização do bloco que falta
+        LU[j + 1:, j] /= LU[j, j]
+        LU[j + 1:, j + 1:] -= np.outer(LU[j + 1:, j], LU[j, j + 1:])
+
+    return LU, p
+
+
+def resolver_lu(fatoracao, B):
+    """Resolve AX = B com a fatoração de fatorar_lu.
+
+    B pode ser um vetor ou uma matriz com um lado direito por coluna: as
+    substituições andam linha a linha e tratam todas as colunas juntas,
+    então k sistemas custam O(n²·k) depois da fatoração.
+    """
+    LU, p = fatoracao
+    X = np.array(B, dtype=np.float64)[p]
+    n = len(p)
+
+    # Ly = Pb (diagonal de L = 1)
+    for i in range(1, n):
+        X[i] -= LU[i, :i] @ X[:i]
+
+    # Ux = y
+    for i in range(n - 1, -1, -1):
+        X[i] -= LU[i, i + 1:] @ X[i + 1:]
+        X[i] /= LU[i, i]
+
+    return X
@@ -1,3 +1,8 @@
+import numpy as np
+
+from algebra_comum import escalonar, achar_pivos
+
+
 def ler_matriz(p, n):
     print(f"\nDigite a matriz da transformação ({p}x{n}):")
     matriz = []
@@ -7,47 +12,6 @@ def ler_matriz(p, n):
     return matriz
 
 
-def escalonar(M):
-    M = [linha[:] for linha in M]
-    linhas, colunas = len(M), len(M[0])
-    pivo_linha = 0
-
-    for j in range(colunas):
-        if pivo_linha >= linhas:
-            break
-
-        # Encontrar melhor pivô
-        i_max = max(range(pivo_linha, linhas), key=lambda i: abs(M[i][j]))
-        M[pivo_linha], M[i_max] = M[i_max], M[pivo_linha]
-
-        pivo = M[pivo_linha][j]
-        if abs(pivo) < 1e-10:
-            continue
-
-        # Normalizar
-        M[pivo_linha] = [x / pivo for x in M[pivo_linha]]
-
-        # Eliminar abaixo
-        for i in range(pivo_linha + 1, linhas):
-            fator = M[i][j]
-            for k in range(colunas):
-                M[i][k] -= fator * M[pivo_linha][k]
-
-        pivo_linha += 1
-
-    return M
-
-
-def achar_pivos(M):
-    pivos = []
-    for linha in M:
-        for j, val in enumerate(linha):
-            if val != 0 :
-                pivos.append(j)
-                break
-    return pivos
-
-
 def calcular_base_nucleo(esc, pivos):
     colunas = len(esc[0])
     todas = set(range(colunas))
@@ -56,18 +20,16 @@ def calcular_base_nucleo(esc, pivos):
     base = []
 
     for livre in livres:
-        vetor = [0] * colunas
+        vetor = np.zeros(colunas)
         vetor[livre] = 1  
 
         for i in range(len(pivos) - 1, -1, -1):
             j = pivos[i]
-            soma = 0
-            for k in range(j + 1, colunas):
-                soma += esc[i][k] * vetor[k]
+            soma = esc[i, j + 1:] @ vetor[j + 1:]
 
-            vetor[j] = -soma / esc[i][j]
+            vetor[j] = -soma / esc[i, j]
 
-        base.append(vetor)
+        base.append(vetor.tolist())
 
     return base, livres
 
@@ -85,7 +47,7 @@ def main():
 
     print("\nMatriz escalonada:")
     for linha in esc:
-        print(linha)
+        print(linha.tolist())
 
     print("\nPivôs nas colunas:", pivos)
 
@@ -1,3 +1,8 @@
+import numpy as np
+
+from algebra_comum import escalonar, achar_pivos, TOL
+
+
 def ler_matriz(n):
     print(f"\nDigite a matriz do operador linear ({n}x{n}):")
     M = []
@@ -28,44 +33,6 @@ def subtrair_lambdaI(M, lamb):
     return R
 
 
-def escalonar(M):
-    M = [linha[:] for linha in M]
-    linhas, colunas = len(M), len(M[0])
-    pivo_linha = 0
-
-    for j in range(colunas):
-        if pivo_linha >= linhas:
-            break
-
-        i_max = max(range(pivo_linha, linhas), key=lambda i: abs(M[i][j]))
-        M[pivo_linha], M[i_max] = M[i_max], M[pivo_linha]
-
-        pivo = M[pivo_linha][j]
-        if abs(pivo) < 1e-10:
-            continue
-
-        M[pivo_linha] = [x / pivo for x in M[pivo_linha]]
-
-        for i in range(pivo_linha + 1, linhas):
-            fator = M[i][j]
-            for k in range(colunas):
-                M[i][k] -= fator * M[pivo_linha][k]
-
-        pivo_linha += 1
-
-    return M
-
-
-def achar_pivos(M):
-    pivos = []
-    for linha in M:
-        for j, val in enumerate(linha):
-            if abs(val) > 1e-10:
-                pivos.append(j)
-                break
-    return pivos
-
-
 def base_nucleo(M):
     esc = escalonar(M)
     pivos = achar_pivos(esc)
@@ -76,15 +43,15 @@ def base_nucleo(M):
     base = []
 
     for livre in livres:
-        v = [0] * colunas
+        v = np.zeros(colunas)
         v[livre] = 1
 
         for i in range(len(pivos)-1, -1, -1):
             j = pivos[i]
-            soma = sum(esc[i][k]*v[k] for k in range(j+1, colunas))
-            v[j] = -soma / esc[i][j] if abs(esc[i][j]) > 1e-10 else 0
+            soma = esc[i, j+1:] @ v[j+1:]
+            v[j] = -soma / esc[i, j] if abs(esc[i, j]) > TOL else 0
 
-        base.append(v)
+        base.append(v.tolist())
 
     return base
 
@@ -1,18 +1,31 @@
 """
-Montador simples de duas passagens para RISC-V RV32I (com apenas LA como pseudo-instrução).
+Montador simples de duas passagens para RISC-V RV32I (com as pseudo-instruções usuais: la, li, mv, j, call, ret...).
+Aceita .include, macros (.macro/.endm, com parâmetros) e constantes (.equ/.set); ver Preprocessor.
+O alvo de um branch/jal é uma label ou um endereço absoluto (número), como o desmontador gera
+para alvos fora do .text.
 Entrada: arquivo de texto com assembly.
 Saída: arquivo de texto com linhas de 32 bits (binário) e opcionalmente arquivo .raw com little-endian.
 Andamento:
 
 Limitações:
  - Suporta um conjunto razoável de instruções RV32I (lista no código).
- - Não implementa extensões (M, F, atomic, etc).
+ - Não implementa extensões (M, F, atomic, etc); a C (comprimidas) só na saída, com --rvc.
  - Algumas diretivas/encodings simplificados. Ajuste endereços base conforme necessário.
 """
+import gc
+import os
 import re
 import sys
+import json
+import time
+import functools
 import struct
-from collections import OrderedDict
+import argparse
+import itertools
+import mmap
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
 
 # Endereços base (ajustáveis)
 TEXT_BASE = 0x00400000
@@ -28,50 +41,21 @@ def to_signed(val, bits):
 def int_to_bin(value, bits):
     return format(value & ((1 << bits) - 1), '0{}b'.format(bits))
 
+# Tabela de registradores: nomes xN e nomes da ABI -> número
+REG_MAP = {f'x{i}': i for i in range(32)}
+REG_MAP.update({'zero': 0, 'ra': 1, 'sp': 2, 'gp': 3, 'tp': 4, 'fp': 8})
+REG_MAP.update({f't{i}': n for i, n in enumerate([5, 6, 7, 28, 29, 30, 31])})
+REG_MAP.update({f's{i}': n for i, n in enumerate([8, 9] + list(range(18, 28)))})
+REG_MAP.update({f'a{i}': 10 + i for i in range(8)})
+
+# consulta direta também para os nomes em maiúsculas (o léxico não precisa de lower())
+REG_LOOKUP = {**REG_MAP, **{k.upper(): v for k, v in REG_MAP.items()}}
+
 def parse_reg(reg: str) -> int:
-    r = reg.lower().strip()
-
-    # Caso formato xN
-    if r.startswith("x") and r[1:].isdigit():
-        num = int(r[1:])
-        return num if 0 <= num <= 31 else -1
-
-    # Nomes especiais
-    special = {
-        "ra":   1,
-        "sp":   2,
-        "gp":   3,
-        "tp":   4,
-        "fp":   8,   # alias de s0
-    }
-    if r in special:
-        return special[r]
-
-    # Temporários t0–t6
-    if r.startswith("t") and len(r) == 2 and r[1].isdigit():
-        n = int(r[1])
-        if 0 <= n <= 6:
-            mapping = [5, 6, 7, 28, 29, 30, 31]
-            return mapping[n]
-        return -1
-
-    # Saved registers s0–s11
-    if r.startswith("s") and len(r) >= 2 and r[1].isdigit():
-        n = int(r[1])
-        if n == 0: return 8
-        if n == 1: return 9
-        if 2 <= n <= 11:
-            return 18 + (n - 2)
-        return -1
-
-    # Argument registers a0–a7
-    if r.startswith("a") and len(r) == 2 and r[1].isdigit():
-        n = int(r[1])
-        if 0 <= n <= 7:
-            return 10 + n
-        return -1
-
-    return -1
+    n = REG_LOOKUP.get(reg)
+    if n is None:
+        n = REG_LOOKUP.get(reg.lower().strip(), -1)
+    return n
 
 #||  Formatos de instrução  ||
 
@@ -107,496 +91,1605 @@ def formato_j(imm, rd, opcode):
     imm19_12 = (imm >> 12) & 0xff
     return (imm20 << 31) | (imm19_12 << 12) | (imm11 << 20) | (imm10_1 << 21) | (rd << 7) | opcode
 
-# Instruções
-# Formato R
-def add_enc(args): # add rd, rs1, rs2
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x00, rs2, rs1, 0x0, rd, 0x33)
-def sub_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x20, rs2, rs1, 0x0, rd, 0x33)
-def sll_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x00, rs2, rs1, 0x1, rd, 0x33)
-def srl_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x00, rs2, rs1, 0x5, rd, 0x33)
-def sra_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x20, rs2, rs1, 0x5, rd, 0x33)
-def and_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x00, rs2, rs1, 0x7, rd, 0x33)
-def or_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x00, rs2, rs1, 0x6, rd, 0x33)
-def xor_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x00, rs2, rs1, 0x4, rd, 0x33)
-def slt_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x00, rs2, rs1, 0x2, rd, 0x33)
-def sltu_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1]) 
-    rs2 = parse_reg(args[2])
-    return formato_r(0x00, rs2, rs1, 0x3, rd, 0x33)
-
-#Formato I
-
-def addi_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    imm = int(args[2], 0)
-    return formato_i(imm, rs1, 0x0, rd, 0x13)
-
-def andi_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    imm = int(args[2], 0)
-    return formato_i(imm, rs1, 0x7, rd, 0x13)
-
-def ori_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    imm = int(args[2], 0)
-    return formato_i(imm, rs1, 0x6, rd, 0x13)
-
-def xori_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    imm = int(args[2], 0)
-    return formato_i(imm, rs1, 0x4, rd, 0x13)
-
-def slti_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    imm = int(args[2], 0)
-    return formato_i(imm, rs1, 0x2, rd, 0x13)
-
-def sltiu_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    imm = int(args[2], 0)
-    return formato_i(imm, rs1, 0x3, rd, 0x13)
-
-def slli_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    sh = int(args[2], 0)
-    return formato_i(sh, rs1, 0x1, rd, 0x13)
-
-def srli_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    sh = int(args[2], 0)
-    return formato_i(sh, rs1, 0x5, rd, 0x13)
-
-def srai_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    sh = int(args[2], 0)
-    return formato_i(sh | (0x20 << 5), rs1, 0x5, rd, 0x13)
-
-#l-type
-import re
+# ---------------------------
+# Tabela de instruções
+# ---------------------------
+# mnemônico -> (formato, opcode, funct3, funct7, operandos)
+# funct7 das instruções de shift com imediato (srai) vai nos bits altos do imediato.
+INSTR_MAP = {
+    'add':  ('R', 0x33, 0x0, 0x00, 'rd,rs1,rs2'),
+    'sub':  ('R', 0x33, 0x0, 0x20, 'rd,rs1,rs2'),
+    'sll':  ('R', 0x33, 0x1, 0x00, 'rd,rs1,rs2'),
+    'srl':  ('R', 0x33, 0x5, 0x00, 'rd,rs1,rs2'),
+    'sra':  ('R', 0x33, 0x5, 0x20, 'rd,rs1,rs2'),
+    'and':  ('R', 0x33, 0x7, 0x00, 'rd,rs1,rs2'),
+    'or':   ('R', 0x33, 0x6, 0x00, 'rd,rs1,rs2'),
+    'xor':  ('R', 0x33, 0x4, 0x00, 'rd,rs1,rs2'),
+    'slt':  ('R', 0x33, 0x2, 0x00, 'rd,rs1,rs2'),
+    'sltu': ('R', 0x33, 0x3, 0x00, 'rd,rs1,rs2'),
+
+    'addi': ('I', 0x13, 0x0, 0x00, 'rd,rs1,imm'),
+    'andi': ('I', 0x13, 0x7, 0x00, 'rd,rs1,imm'),
+    'ori':  ('I', 0x13, 0x6, 0x00, 'rd,rs1,imm'),
+    'xori': ('I', 0x13, 0x4, 0x00, 'rd,rs1,imm'),
+    'slti': ('I', 0x13, 0x2, 0x00, 'rd,rs1,imm'),
+    'sltiu':('I', 0x13, 0x3, 0x00, 'rd,rs1,imm'),
+    'slli': ('I', 0x13, 0x1, 0x00, 'rd,rs1,shamt'),
+    'srli': ('I', 0x13, 0x5, 0x00, 'rd,rs1,shamt'),
+    'srai': ('I', 0x13, 0x5, 0x20, 'rd,rs1,shamt'),
+
+    'lw':   ('I', 0x03, 0x2, 0x00, 'rd,mem'),
+    'lb':   ('I', 0x03, 0x0, 0x00, 'rd,mem'),
+    'lh':   ('I', 0x03, 0x1, 0x00, 'rd,mem'),
+
+    'jalr': ('I', 0x67, 0x0, 0x00, 'rd,rs1,imm'),
+
+    'sw':   ('S', 0x23, 0x2, 0x00, 'rs2,mem'),
+    'sb':   ('S', 0x23, 0x0, 0x00, 'rs2,mem'),
+    'sh':   ('S', 0x23, 0x1, 0x00, 'rs2,mem'),
+
+    'beq':  ('B', 0x63, 0x0, 0x00, 'rs1,rs2,label'),
+    'bne':  ('B', 0x63, 0x1, 0x00, 'rs1,rs2,label'),
+    'blt':  ('B', 0x63, 0x4, 0x00, 'rs1,rs2,label'),
+    'bge':  ('B', 0x63, 0x5, 0x00, 'rs1,rs2,label'),
+
+    'lui':  ('U', 0x37, 0x0, 0x00, 'rd,imm'),
+    'auipc':('U', 0x17, 0x0, 0x00, 'rd,imm'),
+
+    'jal':  ('J', 0x6f, 0x0, 0x00, 'rd,label'),
+}
 
-def lw_enc(args):
-    rd = parse_reg(args[0])
-    m = re.match(r'(-?\d+)\((.+)\)', args[1].replace(' ', ''))
-    imm = int(m.group(1), 0)
-    rs1 = parse_reg(m.group(2))
-    return formato_i(imm, rs1, 0x2, rd, 0x03)
-
-def lb_enc(args):
-    rd = parse_reg(args[0])
-    m = re.match(r'(-?\d+)\((.+)\)', args[1].replace(' ', ''))
-    imm = int(m.group(1), 0)
-    rs1 = parse_reg(m.group(2))
-    return formato_i(imm, rs1, 0x0, rd, 0x03)
-
-def lh_enc(args):
-    rd = parse_reg(args[0])
-    m = re.match(r'(-?\d+)\((.+)\)', args[1].replace(' ', ''))
-    imm = int(m.group(1), 0)
-    rs1 = parse_reg(m.group(2))
-    return formato_i(imm, rs1, 0x1, rd, 0x03)
-
-def jalr_enc(args):
-    rd = parse_reg(args[0])
-    rs1 = parse_reg(args[1])
-    imm = int(args[2], 0)
-    return formato_i(imm, rs1, 0x0, rd, 0x67)
-
-#formato S
-
-def sw_enc(args):
-    rs2 = parse_reg(args[0])
-    m = re.match(r'(-?\d+)\((.+)\)', args[1].replace(' ', ''))
-    imm = int(m.group(1), 0)
-    rs1 = parse_reg(m.group(2))
-    return formato_s(imm, rs2, rs1, 0x2, 0x23)
-
-def sb_enc(args):
-    rs2 = parse_reg(args[0])
-    #isso é para capturar o deslocamento do deslocamento
-    m = re.match(r'(-?\d+)\((.+)\)', args[1].replace(' ', ''))
-    imm = int(m.group(1), 0)
-    rs1 = parse_reg(m.group(2))
-    return formato_s(imm, rs2, rs1, 0x0, 0x23)
-
-def sh_enc(args):
-    rs2 = parse_reg(args[0])
-    m = re.match(r'(-?\d+)\((.+)\)', args[1].replace(' ', ''))
-    imm = int(m.group(1), 0)
-    rs1 = parse_reg(m.group(2))
-    return formato_s(imm, rs2, rs1, 0x1, 0x23)
-
-# Formato B
-
-def beq_enc(args, curr_addr, symtab):
-    rs1 = parse_reg(args[0])
-    rs2 = parse_reg(args[1])
-    lbl = args[2]
-    offset = symtab[lbl] - curr_addr
-    return formato_b(offset, rs2, rs1, 0x0, 0x63)
-
-def bne_enc(args, curr_addr, symtab):
-    rs1 = parse_reg(args[0])
-    rs2 = parse_reg(args[1])
-    lbl = args[2]
-    offset = symtab[lbl] - curr_addr
-    return formato_b(offset, rs2, rs1, 0x1, 0x63)
-
-def blt_enc(args, curr_addr, symtab):
-    rs1 = parse_reg(args[0])
-    rs2 = parse_reg(args[1])
-    lbl = args[2]
-    offset = symtab[lbl] - curr_addr
-    return formato_b(offset, rs2, rs1, 0x4, 0x63)
-
-def bge_enc(args, curr_addr, symtab):
-    rs1 = parse_reg(args[0])
-    rs2 = parse_reg(args[1])
-    lbl = args[2]
-    offset = symtab[lbl] - curr_addr
-    return formato_b(offset, rs2, rs1, 0x5, 0x63)
-
-#Formato U
-
-def lui_enc(args):
-    rd = parse_reg(args[0])
-    imm = int(args[1], 0)
-    return formato_u(imm, rd, 0x37)
-
-def auipc_enc(args):
-    rd = parse_reg(args[0])
-    imm = int(args[1], 0)
-    return formato_u(imm, rd, 0x17)
-
-#Formato J
-
-def jal_enc(args, curr_addr, symtab):
-    rd = parse_reg(args[0])
-    lbl = args[1]
-    offset = symtab[lbl] - curr_addr
-    return formato_j(offset, rd, 0x6F)
+# Operandos já vêm do léxico como tokens (tipo, texto, valor); ver lex_line.
+def _reg(tok):
+    if tok[0] != 'reg':
+        raise ValueError(f"registrador inválido '{tok[1]}'")
+    return tok[2]
+
+def _imm(tok):
+    if tok[0] != 'imm':
+        raise ValueError(f"imediato inválido '{tok[1]}'")
+    return tok[2]
+
+def _mem(tok):
+    if tok[0] != 'mem':
+        raise ValueError(f"operando de memória inválido '{tok[1]}'")
+    off, base = tok[2]
+    if base < 0:
+        raise ValueError(f"registrador inválido em '{tok[1]}'")
+    return off, base
+
+def _label(tok, curr_addr, symtab):
+    if tok[0] == 'imm':   # endereço absoluto
+        return tok[2] - curr_addr
+    try:
+        return symtab[tok[1]] - curr_addr
+    except KeyError:
+        raise ValueError(f"símbolo {tok[1]} não encontrado") from None
+
+# alcance dos deslocamentos: branch (13 bits) e jal (21 bits), em bytes
+B_RANGE = 1 << 12
+J_RANGE = 1 << 20
+
+def _check_range(tok, off, limit):
+    if not -limit <= off < limit:
+        raise ValueError(f"desvio para {tok[1]} fora do alcance ({off:+d} bytes, limite ±{limit})")
+    return off
+
+# imediatos do programa: 12 bits com sinal (tipos I e S) e shamt de 0 a 31
+IMM_RANGE = 1 << 11
+SHAMT_LIMIT = 32
+
+def _check_imm(tok, imm, lo, hi):
+    if not lo <= imm < hi:
+        raise ValueError(f"imediato fora do intervalo em '{tok[1]}' ({imm:+d}, limite {lo} a {hi - 1})")
+    return imm
+
+# Leitores de operandos: tokens -> (rd, rs1, rs2, imm)
+def _ops_rd_rs1_rs2(args, curr_addr, symtab):
+    rd, rs1, rs2 = args
+    return _reg(rd), _reg(rs1), _reg(rs2), 0
+
+def _ops_rd_rs1_imm(args, curr_addr, symtab):
+    rd, rs1, imm = args
+    return _reg(rd), _reg(rs1), 0, _check_imm(imm, _imm(imm), -IMM_RANGE, IMM_RANGE)
+
+def _ops_rd_rs1_shamt(args, curr_addr, symtab):
+    rd, rs1, sh = args
+    return _reg(rd), _reg(rs1), 0, _check_imm(sh, _imm(sh), 0, SHAMT_LIMIT)
+
+def _ops_rd_mem(args, curr_addr, symtab):
+    rd, mem = args
+    imm, rs1 = _mem(mem)
+    return _reg(rd), rs1, 0, _check_imm(mem, imm, -IMM_RANGE, IMM_RANGE)
+
+def _ops_rs2_mem(args, curr_addr, symtab):
+    rs2, mem = args
+    imm, rs1 = _mem(mem)
+    return 0, rs1, _reg(rs2), _check_imm(mem, imm, -IMM_RANGE, IMM_RANGE)
+
+def _ops_rs1_rs2_label(args, curr_addr, symtab):
+    rs1, rs2, lbl = args
+    return 0, _reg(rs1), _reg(rs2), _check_range(lbl, _label(lbl, curr_addr, symtab), B_RANGE)
+
+def _ops_rd_imm(args, curr_addr, symtab):
+    rd, imm = args
+    return _reg(rd), 0, 0, _imm(imm)
+
+def _ops_rd_label(args, curr_addr, symtab):
+    rd, lbl = args
+    return _reg(rd), 0, 0, _check_range(lbl, _label(lbl, curr_addr, symtab), J_RANGE)
+
+OPERAND_PARSERS = {
+    'rd,rs1,rs2': _ops_rd_rs1_rs2,
+    'rd,rs1,imm': _ops_rd_rs1_imm,
+    'rd,rs1,shamt': _ops_rd_rs1_shamt,
+    'rd,mem': _ops_rd_mem,
+    'rs2,mem': _ops_rs2_mem,
+    'rs1,rs2,label': _ops_rs1_rs2_label,
+    'rd,imm': _ops_rd_imm,
+    'rd,label': _ops_rd_label,
+}
 
-INSTR_MAP = {
-    'add': ('R', add_enc),
-    'sub': ('R', sub_enc),
-    'sll': ('R', sll_enc),
-    'srl': ('R', srl_enc),
-    'sra': ('R', sra_enc),
-    'and': ('R', and_enc),
-    'or': ('R', or_enc),
-    'xor': ('R', xor_enc),
-    'slt': ('R', slt_enc),
-    'sltu':('R', sltu_enc),
-
-    'addi':('I', addi_enc),
-    'andi':('I', andi_enc),
-    'ori':('I', ori_enc),
-    'xori':('I', xori_enc),
-    'slti':('I', slti_enc),
-    'sltiu':('I', sltiu_enc),
-    'slli':('I', slli_enc),
-    'srli':('I', srli_enc),
-    'srai':('I', srai_enc),
-
-    'lw':('I', lw_enc),
-    'lb':('I', lb_enc),
-    'lh':('I', lh_enc),
-
-    'jalr':('I', jalr_enc),
-
-    'sw':('S', sw_enc),
-    'sb':('S', sb_enc),
-    'sh':('S', sh_enc),
-
-    'beq':('B', beq_enc),
-    'bne':('B', bne_enc),
-    'blt':('B', blt_enc),
-    'bge':('B', bge_enc),
-
-    'lui':('U', lui_enc),
-    'auipc':('U', auipc_enc),
-
-    'jal':('J', jal_enc),
+# Montadores de palavra por formato: 'fixed' já traz opcode, funct3 e funct7 posicionados
+def _pack_r(fixed, rd, rs1, rs2, imm):
+    return fixed | (rs2 << 20) | (rs1 << 15) | (rd << 7)
+
+def _pack_i(fixed, rd, rs1, rs2, imm):
+    return fixed | ((imm & 0xfff) << 20) | (rs1 << 15) | (rd << 7)
+
+def _pack_s(fixed, rd, rs1, rs2, imm):
+    return (fixed | (((imm >> 5) & 0x7f) << 25) | (rs2 << 20) | (rs1 << 15)
+            | ((imm & 0x1f) << 7))
+
+def _pack_b(fixed, rd, rs1, rs2, imm):
+    return (fixed | (((imm >> 12) & 0x1) << 31) | (((imm >> 5) & 0x3f) << 25)
+            | (rs2 << 20) | (rs1 << 15) | (((imm >> 1) & 0xf) << 8) | (((imm >> 11) & 0x1) << 7))
+
+def _pack_u(fixed, rd, rs1, rs2, imm):
+    return fixed | (imm & 0xfffff000) | (rd << 7)
+
+def _pack_j(fixed, rd, rs1, rs2, imm):
+    return (fixed | (((imm >> 20) & 0x1) << 31) | (((imm >> 1) & 0x3ff) << 21)
+            | (((imm >> 11) & 0x1) << 20) | (((imm >> 12) & 0xff) << 12) | (rd << 7))
+
+FORMAT_PACKERS = {'R': _pack_r, 'I': _pack_i, 'S': _pack_s, 'B': _pack_b, 'U': _pack_u, 'J': _pack_j}
+
+# mnemônico -> (leitor de operandos, montador, bits fixos, nº de operandos), calculado uma vez
+_ENCODERS = {}
+for _mnem, (_fmt, _opcode, _funct3, _funct7, _ops) in INSTR_MAP.items():
+    _ENCODERS[_mnem] = (OPERAND_PARSERS[_ops], FORMAT_PACKERS[_fmt],
+                        (_funct7 << 25) | (_funct3 << 12) | _opcode, _ops.count(',') + 1)
+
+def encode(mnem, args, curr_addr=0, symtab=None):
+    """Codifica uma instrução de INSTR_MAP (operandos como tokens de lex_line) em uma palavra de 32 bits."""
+    try:
+        ops, pack, fixed, nargs = _ENCODERS[mnem]
+    except KeyError:
+        raise ValueError(f"mnemônico desconhecido '{mnem}'") from None
+    if len(args) != nargs:
+        raise ValueError(f"'{mnem}' espera {nargs} operandos, recebeu {len(args)}")
+    rd, rs1, rs2, imm = ops(args, curr_addr, symtab)
+    return pack(fixed, rd, rs1, rs2, imm)
+
+# ---------------------------
+# Decodificação (inverso de encode)
+# ---------------------------
+# (opcode, funct3, funct7) -> mnemônico; None onde o campo não identifica a instrução
+DECODE_MAP = {}
+for _mnem, (_fmt, _opcode, _funct3, _funct7, _ops) in INSTR_MAP.items():
+    if _fmt == 'U' or _fmt == 'J':
+        DECODE_MAP[(_opcode, None, None)] = _mnem
+    elif _fmt == 'R' or _ops.endswith('shamt'):
+        DECODE_MAP[(_opcode, _funct3, _funct7)] = _mnem
+    else:
+        DECODE_MAP[(_opcode, _funct3, None)] = _mnem
+
+def imm_i(w):
+    return to_signed(w >> 20, 12)
+
+def imm_s(w):
+    return to_signed(((w >> 25) << 5) | ((w >> 7) & 0x1f), 12)
+
+def imm_b(w):
+    return to_signed((((w >> 31) & 0x1) << 12) | (((w >> 7) & 0x1) << 11)
+                     | (((w >> 25) & 0x3f) << 5) | (((w >> 8) & 0xf) << 1), 13)
+
+def imm_u(w):
+    return w & 0xfffff000
+
+def imm_j(w):
+    return to_signed((((w >> 31) & 0x1) << 20) | (((w >> 12) & 0xff) << 12)
+                     | (((w >> 20) & 0x1) << 11) | (((w >> 21) & 0x3ff) << 1), 21)
+
+IMM_DECODERS = {'R': lambda w: 0, 'I': imm_i, 'S': imm_s, 'B': imm_b, 'U': imm_u, 'J': imm_j}
+
+def decode(word):
+    """Decodifica uma palavra em (mnem, rd, rs1, rs2, imm), ou None se não for de INSTR_MAP."""
+    opcode = word & 0x7f
+    funct3 = (word >> 12) & 0x7
+    funct7 = word >> 25
+    mnem = (DECODE_MAP.get((opcode, funct3, funct7)) or DECODE_MAP.get((opcode, funct3, None))
+            or DECODE_MAP.get((opcode, None, None)))
+    if mnem is None:
+        return None
+    fmt, _, _, _, ops = INSTR_MAP[mnem]
+    imm = (word >> 20) & 0x1f if ops.endswith('shamt') else IMM_DECODERS[fmt](word)
+    return mnem, (word >> 7) & 0x1f, (word >> 15) & 0x1f, (word >> 20) & 0x1f, imm
+
+# ---------------------------
+# Léxico
+# ---------------------------
+# Uma regex compilada separa a linha inteira (labels, mnemônico/diretiva,
+# operandos e comentário); '#' dentro de string não começa comentário. Cada
+# operando vira um token (tipo, texto, valor), classificado por consulta em
+# tabela: registrador (REG_LOOKUP), imediato, memória ou símbolo. Os tokens
+# são imutáveis, então os já vistos são reaproveitados pelo texto.
+LINE_RE = re.compile(r'''\s*
+    (?P<labels>(?:[A-Za-z_.$][\w.$]*\s*:\s*)*)
+    (?P<name>[^\s#",:]+)?
+    (?P<ops>[^#"]*(?:"(?:[^"\\]|\\.)*"[^#"]*)*)
+    (?:\#.*)?''', re.X | re.S)
+LABEL_SEP_RE = re.compile(r'\s*:\s*')
+# deslocamento(registrador) dos loads/stores, ex: -8(sp), 0x10(a0), (t0)
+MEM_RE = re.compile(r'(-?(?:0[xX][0-9a-fA-F]+|\d+))?\s*\(\s*(\w+)\s*\)')
+# operandos com string: vírgulas dentro das aspas não separam
+QUOTED_OPS_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[^,"]+')
+_OPERAND_CACHE = {}
+_OPERAND_CACHE_MAX = 1 << 16
+
+def operand_token(text):
+    """Token (tipo, texto, valor) de um operando, ou None se estiver vazio.
+
+    Tipos: 'reg' (valor = nº do registrador), 'imm' (inteiro), 'mem'
+    ((deslocamento, nº do registrador base ou -1)), 'str' (conteúdo entre
+    aspas) e 'sym' (nome de símbolo, valor = texto).
+    """
+    w = text.strip()
+    if not w:
+        return None
+    n = REG_LOOKUP.get(w)
+    if n is not None:
+        return ('reg', w, n)
+    c = w[0]
+    if c == '"':
+        return ('str', w, w[1:-1])
+    if '(' in w:
+        m = MEM_RE.fullmatch(w)
+        if m is None:
+            return ('sym', w, w)
+        off, base = m.groups()
+        return ('mem', w, (int(off, 0) if off else 0, parse_reg(base)))
+    if c.isdigit() or c == '-' or c == '+':
+        try:
+            return ('imm', w, int(w, 0))
+        except ValueError:
+            return ('sym', w, w)
+    n = REG_LOOKUP.get(w.lower())
+    return ('sym', w, w) if n is None else ('reg', w, n)
+
+def lex_operands(text):
+    """Tokens dos operandos separados por vírgula (ver operand_token)."""
+    toks = []
+    cache = _OPERAND_CACHE
+    for p in (QUOTED_OPS_RE.findall(text) if '"' in text else text.split(',')):
+        t = cache.get(p)
+        if t is None:
+            t = operand_token(p)
+            if t is None:
+                continue
+            if len(cache) < _OPERAND_CACHE_MAX:
+                cache[p] = t
+        toks.append(t)
+    return toks
+
+def lex_line(line):
+    """Analisa uma linha em uma passagem: (labels, nome, operandos).
+
+    labels é uma lista (tupla vazia se não houver), nome é o mnemônico ou a
+    diretiva (começa com '.') ou None, e operandos é a lista de tokens de
+    lex_operands.
+    """
+    m = LINE_RE.fullmatch(line)
+    if m is None:
+        raise ValueError(f"linha mal formada: '{line.strip()}'")
+    labels, name, ops = m.group('labels', 'name', 'ops')
+    labels = LABEL_SEP_RE.split(labels)[:-1] if labels else ()
+    return labels, name, (lex_operands(ops) if ops and not ops.isspace() else ())
+
+def _at(ln_no):
+    """' na linha N' para as mensagens de erro; vazio com ln_no None (quem
+    chamou tem where() e põe o arquivo:linha de origem na frente)."""
+    return '' if ln_no is None else f" na linha {ln_no}"
+
+def _numbers(dname, ops, ln_no):
+    for t in ops:
+        if t[0] != 'imm':
+            raise ValueError(f"valor numérico esperado em {dname}{_at(ln_no)}: '{t[1]}'")
+    return [t[2] for t in ops]
+
+def _number(dname, ops, ln_no):
+    if len(ops) != 1:
+        raise ValueError(f"{dname} espera um valor{_at(ln_no)}")
+    return _numbers(dname, ops, ln_no)[0]
+
+def data_directive_bytes(dname, ops, data_addr, ln_no):
+    """Bytes gerados por uma diretiva de dados em data_addr, ou None se a diretiva não for de dados."""
+    if dname == '.word':
+        return b''.join((x & 0xffffffff).to_bytes(4, 'little') for x in _numbers(dname, ops, ln_no))
+    if dname == '.half':
+        return b''.join((x & 0xffff).to_bytes(2, 'little') for x in _numbers(dname, ops, ln_no))
+    if dname == '.byte':
+        return bytes(x & 0xff for x in _numbers(dname, ops, ln_no))
+    if dname == '.ascii' or dname == '.asciiz':
+        if not ops or ops[0][0] != 'str':
+            raise ValueError(f"{dname} espera uma string entre aspas{_at(ln_no)}")
+        s = ops[0][2].encode('utf-8').decode('unicode_escape')
+        b = s.encode('utf-8')
+        return b + b'\0' if dname == '.asciiz' else b
+    if dname == '.space':
+        return bytes(_number(dname, ops, ln_no))
+    if dname == '.align':
+        align_bytes = 1 << _number(dname, ops, ln_no)
+        return bytes(-data_addr % align_bytes)
+    return None
+
+def la_words(rd, target, addr):
+    """Par auipc + addi que carrega o endereço target em rd a partir de addr."""
+    # +0x800 compensa o addi, que estende o sinal dos 12 bits baixos
+    imm_hi = (target - addr + 0x800) & ~0xfff
+    auipc_word = formato_u(imm_hi, rd, 0x17)
+    imm_lo = (target - (addr + imm_hi))
+    addi_word = formato_i(imm_lo, rd, 0x0, rd, 0x13)
+    return auipc_word, addi_word
+
+def li_words(rd, value):
+    """Par lui + addi que carrega a constante de 32 bits value em rd."""
+    # mesma compensação do la: o addi estende o sinal dos 12 bits baixos
+    imm_hi = (value + 0x800) & 0xfffff000
+    return formato_u(imm_hi, rd, 0x37), formato_i(value - imm_hi, rd, 0x0, rd, 0x13)
+
+# ---------------------------
+# Pseudo-instruções
+# ---------------------------
+# Quase todas viram uma instrução base já na primeira passagem, então o resto
+# do montador (relaxamento, escalonamento, cache) só vê instruções de
+# INSTR_MAP. Só 'la' e o 'li' de duas palavras continuam como pseudo até a
+# segunda passagem, sempre com tamanho conhecido (PSEUDO_SIZE).
+_ZERO = ('reg', 'zero', 0)
+_RA = ('reg', 'ra', 1)
+_IMM_0 = ('imm', '0', 0)
+_IMM_1 = ('imm', '1', 1)
+_IMM_M1 = ('imm', '-1', -1)
+
+# pseudo -> (instrução base, operandos): int = operando da pseudo nessa posição, tupla = token fixo
+PSEUDO_MAP = {
+    'nop':  ('addi', (_ZERO, _ZERO, _IMM_0)),
+    'mv':   ('addi', (0, 1, _IMM_0)),
+    'not':  ('xori', (0, 1, _IMM_M1)),
+    'neg':  ('sub',  (0, _ZERO, 1)),
+    'seqz': ('sltiu', (0, 1, _IMM_1)),
+    'snez': ('sltu', (0, _ZERO, 1)),
+    'sltz': ('slt',  (0, 1, _ZERO)),
+    'sgtz': ('slt',  (0, _ZERO, 1)),
+    'beqz': ('beq',  (0, _ZERO, 1)),
+    'bnez': ('bne',  (0, _ZERO, 1)),
+    'blez': ('bge',  (_ZERO, 0, 1)),
+    'bgez': ('bge',  (0, _ZERO, 1)),
+    'bltz': ('blt',  (0, _ZERO, 1)),
+    'bgtz': ('blt',  (_ZERO, 0, 1)),
+    'bgt':  ('blt',  (1, 0, 2)),
+    'ble':  ('bge',  (1, 0, 2)),
+    'j':    ('jal',  (_ZERO, 0)),
+    'jr':   ('jalr', (_ZERO, 0, _IMM_0)),
+    'ret':  ('jalr', (_ZERO, _RA, _IMM_0)),
+    # call/tail começam como jal; relax_branches troca por auipc + jalr se o alvo estiver longe
+    'call': ('jal',  (_RA, 0)),
+    'tail': ('jal',  (_ZERO, 0)),
 }
+# formas curtas das instruções base: (mnemônico, nº de operandos) -> forma completa
+SHORT_FORMS = {
+    ('jal', 1):  ('jal',  (_RA, 0)),
+    ('jalr', 1): ('jalr', (_RA, 0, _IMM_0)),
+}
+# pseudo-instruções que chegam à segunda passagem -> bytes ocupados
+PSEUDO_SIZE = {'la': 8, 'li': 8}
+PSEUDOS = set(PSEUDO_MAP) | set(PSEUDO_SIZE)
+
+def _nargs(template):
+    return max((t for t in template if t.__class__ is int), default=-1) + 1
+
+def _expand_li(ops, ln_no):
+    if len(ops) != 2:
+        raise ValueError(f"'li' espera 2 operandos{_at(ln_no)}")
+    rd, imm = ops
+    if imm[0] != 'imm':
+        raise ValueError(f"imediato inválido '{imm[1]}'{_at(ln_no)}")
+    if not -(1 << 31) <= imm[2] < (1 << 32):
+        raise ValueError(f"'li' com constante maior que 32 bits{_at(ln_no)}")
+    value = to_signed(imm[2] & 0xffffffff, 32)
+    imm = ('imm', imm[1], value)
+    if -2048 <= value < 2048:
+        return 'addi', (rd, _ZERO, imm)
+    if value & 0xfff == 0:
+        return 'lui', (rd, imm)
+    return 'li', (rd, imm)
+
+def expand_pseudo(mnem, ops, ln_no):
+    """Reescreve uma pseudo-instrução como instrução base: retorna (mnem, ops).
+
+    'li' escolhe a sequência mais curta: addi se a constante cabe em 12 bits,
+    lui se os 12 bits baixos são zero, senão continua 'li' (lui + addi, 8
+    bytes). Mnemônicos que não são pseudo-instruções voltam como estão.
+    """
+    if mnem == 'li':
+        return _expand_li(ops, ln_no)
+    spec = PSEUDO_MAP.get(mnem) or SHORT_FORMS.get((mnem, len(ops)))
+    if spec is None:
+        return mnem, ops
+    base, template = spec
+    n = _nargs(template)
+    if len(ops) != n:
+        raise ValueError(f"'{mnem}' espera {n} operandos{_at(ln_no)}")
+    return base, tuple(ops[t] if t.__class__ is int else t for t in template)
 
-tok_re = re.compile(r'[\s(),]+')
-
-def parse_line(line):
-    # tira comentarios
-    line = line.split('#',1)[0].strip()
-    if not line: return None
-    # label?
-    if ':' in line:
-        parts = line.split(':',1)
-        lbl = parts[0].strip()
-        rest = parts[1].strip()
-        if rest == '':
-            return ('label', lbl)
-        else:
-            return ('label+rest', (lbl, rest))
-    # diretiva?
-    if line.startswith('.'):
-        m = line.split(None,1)
-        if len(m)==1:
-            return ('directive', (m[0], ''))
-        return ('directive', (m[0], m[1].strip()))
-    # instrução e dividir operandos
-    parts = line.strip().split(None,1)
-    mnem = parts[0]
-    args = []
-    if len(parts) > 1:
-        # separar virgulas, mas deixar os parenteses intactos da bola
-        args = [a for a in re.split(r'\s*,\s*', parts[1]) if a!='']
-    return ('instr', (mnem, args))
+# ---------------------------
+# Pré-processador (.include, .macro/.endm, .equ/.set)
+# ---------------------------
+# Roda antes da primeira passagem e entrega cada linha já passada pelo léxico,
+# então pass_one não lê nada duas vezes. Os arquivos incluídos são lidos pelo
+# léxico uma vez por processo e guardados por caminho, valendo enquanto o
+# mtime e o tamanho não mudarem: montar centenas de arquivos que incluem os
+# mesmos cabeçalhos não repete esse trabalho.
+PREPROC_DIRECTIVES = ('.include', '.macro', '.endm', '.equ', '.set')
+MACRO_DEPTH_MAX = 64
+# \param dentro do corpo da macro; \@ é o nº da expansão (para labels únicas)
+MACRO_ARG_RE = re.compile(r'\\(\w+|@)')
+# símbolo(registrador), para constantes usadas como deslocamento
+MEM_SYM_RE = re.compile(r'([A-Za-z_.$][\w.$]*)\s*(\(.*\))')
+# caminho absoluto -> (mtime_ns, tamanho, [(texto, lex_line(texto))])
+_INCLUDE_CACHE = {}
+
+class SourceError(ValueError):
+    """Erro de montagem que já traz arquivo:linha na mensagem."""
+
+def read_include(path):
+    """Linhas de um arquivo incluído como pares (texto, lex_line(texto)), com cache."""
+    st = os.stat(path)
+    hit = _INCLUDE_CACHE.get(path)
+    if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return hit[2]
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for ln_no, raw in enumerate(f, start=1):
+            try:
+                records.append((raw, lex_line(raw)))
+            except ValueError as e:
+                raise SourceError(f"{path}:{ln_no}: {e}") from None
+    _INCLUDE_CACHE[path] = (st.st_mtime_ns, st.st_size, records)
+    return records
+
+class Preprocessor:
+    """Expande .include, .macro e .equ/.set de um programa.
+
+    expand(lines) gera os pares (texto, lex_line(texto)) do programa
+    expandido. As linhas das diretivas do pré-processador continuam no texto
+    mas chegam a pass_one sem mnemônico (só com as labels que tiverem), e uma
+    linha que usa constante é reescrita com o valor: assim o texto expandido
+    descreve exatamente o que é montado, e o cache de montagem pode usá-lo
+    como chave. A origem das linhas geradas (para mensagens de erro e o
+    índice endereço -> fonte) é guardada em trechos: cada trecho é uma
+    sequência de linhas seguidas de um mesmo arquivo, então a memória
+    depende do número de .include e expansões de macro, não do tamanho do
+    programa, e expand() pode alimentar assemble_stream.
+    """
+    def __init__(self, path=None):
+        self.files = [path or '<entrada>']
+        # trechos: nº da primeira linha expandida, arquivo e linha no arquivo
+        self.run_starts = array('I')
+        self.run_files = array('H')
+        self.run_lines = array('I')
+        self.n_lines = 0
+        self._next = None   # (arquivo, linha) que continua o trecho atual
+        self.consts = {}
+        self.macros = {}   # nome -> (parâmetros, [(texto, nº da linha)], id do arquivo)
+        self.expansions = 0
+
+    def origin(self, ln_no):
+        """(id do arquivo, linha) de origem da linha ln_no do programa expandido."""
+        k = bisect_right(self.run_starts, ln_no) - 1
+        return self.run_files[k], self.run_lines[k] + ln_no - self.run_starts[k]
+
+    def where(self, ln_no):
+        """'arquivo:linha' de origem da linha ln_no do programa expandido."""
+        file_id, line = self.origin(ln_no)
+        return f"{self.files[file_id]}:{line}"
+
+    def expand(self, lines):
+        return self._expand(((raw, None, n) for n, raw in enumerate(lines, start=1)), 0, 0)
+
+    def split(self, lines):
+        """expand() como dois iteradores paralelos (linhas, lexed) para pass_one/assemble_stream."""
+        a, b = itertools.tee(self.expand(lines))
+        return (raw for raw, _ in a), (lx for _, lx in b)
+
+    def _error(self, file_id, line_no, msg):
+        return SourceError(f"{self.files[file_id]}:{line_no}: {msg}")
+
+    def _file_id(self, path):
+        if path not in self.files:
+            self.files.append(path)
+        return self.files.index(path)
+
+    def _expand(self, records, file_id, depth):
+        """records: (texto, lex_line(texto) ou None, nº da linha no arquivo file_id)."""
+        consts, macros = self.consts, self.macros
+        body = None   # corpo da macro sendo definida
+        for raw, lexed, line_no in records:
+            if lexed is None:
+                try:
+                    lexed = lex_line(raw)
+                except ValueError as e:
+                    raise self._error(file_id, line_no, e) from None
+            labels, name, ops = lexed
+            self.n_lines += 1
+            if self._next != (file_id, line_no):
+                self.run_starts.append(self.n_lines)
+                self.run_files.append(file_id)
+                self.run_lines.append(line_no)
+            self._next = (file_id, line_no + 1)
+            if body is not None:
+                if name == '.endm':
+                    body = None
+                else:
+                    body.append((raw, line_no))
+                yield raw, ((), None, ())
+                continue
+            if name is None:
+                yield raw, lexed
+                continue
+            if name in PREPROC_DIRECTIVES:
+                yield raw, (labels, None, ())
+                if name == '.include':
+                    if len(ops) != 1 or ops[0][0] != 'str':
+                        raise self._error(file_id, line_no, ".include espera um nome de arquivo entre aspas")
+                    path = os.path.join(os.path.dirname(self.files[file_id]), ops[0][2])
+                    if depth >= MACRO_DEPTH_MAX:
+                        raise self._error(file_id, line_no, f".include recursivo de '{path}'")
+                    try:
+                        included = read_include(os.path.abspath(path))
+                    except OSError as e:
+                        raise self._error(file_id, line_no, f"não foi possível incluir '{path}': {e.strerror}") from None
+                    yield from self._expand(((r, lx, n) for n, (r, lx) in enumerate(included, start=1)),
+                                            self._file_id(path), depth + 1)
+                elif name == '.macro':
+                    params = ','.join(t[1] for t in ops).replace(',', ' ').split()
+                    if not params:
+                        raise self._error(file_id, line_no, ".macro sem nome")
+                    body = []
+                    macros[params[0]] = (params[1:], body, file_id)
+                elif name == '.endm':
+                    raise self._error(file_id, line_no, ".endm sem .macro")
+                else:
+                    if len(ops) != 2 or ops[0][0] != 'sym':
+                        raise self._error(file_id, line_no, f"{name} espera nome, valor")
+                    value = ops[1]
+                    if value[0] == 'sym' and value[1] in consts:
+                        consts[ops[0][1]] = consts[value[1]]
+                    elif value[0] == 'imm':
+                        consts[ops[0][1]] = value[2]
+                    else:
+                        raise self._error(file_id, line_no, f"valor numérico esperado em {name}: '{value[1]}'")
+                continue
+            if macros and name in macros:
+                yield raw, (labels, None, ())
+                if depth >= MACRO_DEPTH_MAX:
+                    raise self._error(file_id, line_no, f"macro '{name}' expandida recursivamente")
+                yield from self._expand(self._macro_lines(name, ops, file_id, line_no),
+                                        macros[name][2], depth + 1)
+                continue
+            if consts and ops:
+                new_ops = self._substitute(ops)
+                if new_ops is not ops:
+                    lbl = ''.join(f"{l}: " for l in labels)
+                    raw = f"{lbl}{name} {', '.join(t[1] for t in new_ops)}\n"
+                    lexed = (labels, name, new_ops)
+            yield raw, lexed
+
+    def _macro_lines(self, name, ops, file_id, line_no):
+        params, body, _ = self.macros[name]
+        if len(ops) != len(params):
+            raise self._error(file_id, line_no, f"macro '{name}' espera {len(params)} argumentos")
+        values = dict(zip(params, (t[1] for t in ops)))
+        values['@'] = str(self.expansions)
+        self.expansions += 1
+        def arg(m):
+            v = values.get(m.group(1))
+            if v is None:
+                raise self._error(file_id, line_no, f"parâmetro desconhecido '\\{m.group(1)}' na macro '{name}'")
+            return v
+        for text, body_line in body:
+            yield MACRO_ARG_RE.sub(arg, text) if '\\' in text else text, None, body_line
+
+    def _substitute(self, ops):
+        """Tokens com as constantes trocadas pelo valor (a mesma lista se nenhuma aparece)."""
+        consts = self.consts
+        out = None
+        for k, t in enumerate(ops):
+            if t[0] != 'sym':
+                continue
+            if t[1] in consts:
+                v = consts[t[1]]
+                new = ('imm', str(v), v)
+            else:
+                m = MEM_SYM_RE.fullmatch(t[1])
+                if m is None or m.group(1) not in consts:
+                    continue
+                new = operand_token(f"{consts[m.group(1)]}{m.group(2)}")
+            if out is None:
+                out = list(ops)
+            out[k] = new
+        return ops if out is None else out
+
+def file_uses_preprocessor(path):
+    """Se o arquivo cita alguma diretiva do pré-processador (busca via mmap, sem ler tudo)."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return any(mm.find(d.encode()) >= 0 for d in PREPROC_DIRECTIVES)
+
+def preprocess(lines, path=None):
+    """(linhas, lexed, pp) do programa depois do pré-processador.
+
+    Se nenhuma linha usa .include/.macro/.equ/.set, devolve (lines, None,
+    None) sem ler nada; senão as linhas expandidas, os resultados de
+    lex_line de cada uma (para pass_one(..., lexed=...)) e o Preprocessor,
+    com a origem de cada linha.
+    """
+    text = ''.join(lines)
+    if not any(d in text for d in PREPROC_DIRECTIVES):
+        return lines, None, None
+    pp = Preprocessor(path)
+    out, lexed = [], []
+    for raw, lx in pp.expand(lines):
+        out.append(raw)
+        lexed.append(lx)
+    return out, lexed, pp
+
+# ---------------------------
+# Representação intermediária do .text
+# ---------------------------
+# Mnemônicos internados: o id é o índice em MNEMONICS. Os de INSTR_MAP vêm
+# primeiro (ids < N_BASE), depois as pseudo de PSEUDO_SIZE; as tabelas são
+# fixas (um mnemônico desconhecido é erro já na primeira passagem).
+MNEMONICS = list(INSTR_MAP) + list(PSEUDO_SIZE)
+MNEM_ID = {m: k for k, m in enumerate(MNEMONICS)}
+N_BASE = len(INSTR_MAP)
+LA_ID, LI_ID = MNEM_ID['la'], MNEM_ID['li']
+# por id: bytes ocupados; e, só para ids < N_BASE, formato e codificador (_ENCODERS)
+OP_SIZE = [PSEUDO_SIZE.get(m, 4) for m in MNEMONICS]
+OP_FORMAT = [INSTR_MAP[m][0] for m in MNEMONICS[:N_BASE]]
+OP_ENCODERS = [_ENCODERS[m] for m in MNEMONICS[:N_BASE]]
+
+def instr_text(mnem, args):
+    """'mnem op1, op2, ...' a partir dos tokens, para as mensagens de erro."""
+    return f"{mnem} {', '.join(t[1] for t in args)}" if args else mnem
+
+class TextIR:
+    """O .text da primeira passagem em colunas, uma posição por instrução.
+
+    ops (id em MNEMONICS), addrs e lines (nº da linha) são arrays, sem um
+    objeto por instrução; args guarda a tupla de tokens de cada uma, a mesma
+    tupla para operandos iguais. marks são as labels e os .align do .text,
+    em ordem, como (posição, 'L', nome) ou (posição, 'A', alinhamento em
+    bytes): valem logo antes da instrução daquela posição (len(ir) no fim).
+    """
+    __slots__ = ('ops', 'addrs', 'lines', 'args', 'marks')
+
+    def __init__(self):
+        self.ops = array('H')
+        self.addrs = array('I')
+        self.lines = array('I')
+        self.args = []
+        self.marks = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def append(self, op, addr, args, line):
+        self.ops.append(op)
+        self.addrs.append(addr)
+        self.lines.append(line)
+        self.args.append(args)
+
+    def mark(self, kind, value):
+        self.marks.append((len(self.ops), kind, value))
+
+    def mnem(self, k):
+        return MNEMONICS[self.ops[k]]
+
+    def walk(self):
+        """(posição, tipo, valor) na ordem do fonte: as marcas e (k, 'I', op) para cada instrução."""
+        marks = self.marks
+        m, n = 0, len(marks)
+        for k, op in enumerate(self.ops):
+            while m < n and marks[m][0] == k:
+                yield marks[m]
+                m += 1
+            yield k, 'I', op
+        yield from marks[m:]
+
+    def take(self, positions):
+        """Nova IR com as instruções das posições dadas, nessa ordem.
+
+        Cada marca vai para antes da primeira instrução mantida que vinha
+        depois dela. Os endereços são os antigos: quem remove instruções
+        refaz o layout (_relayout).
+        """
+        new = TextIR()
+        new.ops = array('H', (self.ops[k] for k in positions))
+        new.addrs = array('I', (self.addrs[k] for k in positions))
+        new.lines = array('I', (self.lines[k] for k in positions))
+        new.args = [self.args[k] for k in positions]
+        kept = sorted(positions)
+        new.marks = [(bisect_left(kept, k), kind, x) for k, kind, x in self.marks]
+        return new
 
 # ---------------------------
 # Algoritimo de duas passagens
 # ---------------------------
-def assemble(lines):
+def count_key(name):
+    """Chave de contagem de uma linha: 'diretiva:.word', 'pseudo:la', 'formato:R' etc."""
+    if name[0] == '.':
+        return 'diretiva:' + name
+    mnem = name.lower()
+    if mnem in INSTR_MAP:
+        return 'formato:' + INSTR_MAP[mnem][0]
+    return ('pseudo:' if mnem in PSEUDOS else 'desconhecida:') + mnem
+
+def _sem_gc(f):
+    """Desliga o coletor de ciclos durante f: as passagens criam centenas de
+    milhares de tuplas e listas sem ciclos, e cada coleta no meio delas só
+    percorre esses objetos de novo."""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        if not gc.isenabled():
+            return f(*args, **kwargs)
+        gc.disable()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            gc.enable()
+    return wrapper
+
+def assemble(lines, relocs=None, globls=None, peephole=False, path=None, aligns=None):
+    """Monta 'lines' e retorna (text_bin, data_bin, symtab).
+
+    Com peephole, o otimizador de otimizador.py roda entre as passagens.
+    path é o arquivo de origem: os .include são procurados a partir dele.
+
+    Modo objeto (relocs é uma lista): referências a símbolos que não estão no
+    .text deste arquivo viram registros (tipo, offset no .text, símbolo) com
+    tipo 'B', 'J' ou 'LA', e a palavra fica com deslocamento zero para o
+    ligador corrigir. Os nomes declarados com .globl vão para globls e os
+    alinhamentos (em bytes) dos .align do .text, para aligns (uma lista).
+    """
+    lines, lexed, pp = preprocess(lines, path)
+    ir, symtab, data_bin, data_syms = pass_one(lines, globls, lexed=lexed, where=pp and pp.where)
+    if aligns is not None:
+        aligns.extend(x for _, kind, x in ir.marks if kind == 'A')
+    if peephole:
+        from otimizador import peephole_text
+        ir, _ = peephole_text(ir, symtab)
+    ir, far = relax_branches(ir, symtab, data_syms if relocs is not None else ())
+    text_bin = pass_two(ir, symtab, data_syms, relocs, far=far, where=pp and pp.where)
+    return text_bin, data_bin, symtab
+
+@_sem_gc
+def pass_one(lines, globls=None, counts=None, lexed=None, where=None):
+    """Primeira passagem: endereços, tabela de símbolos e segmento de dados.
+
+    Retorna (ir, symtab, data_bin, data_syms), com o .text em ir (TextIR):
+    o mnemônico de cada instrução internado (já em minúsculas e com as
+    pseudo expandidas), o endereço, a linha e os operandos como tokens de
+    lex_line; as labels e os .align do .text viram marcas de ir. Diretivas
+    desconhecidas e instruções fora do .text são ignoradas.
+    Se counts (um Counter) for dado, conta as diretivas e as instruções
+    (ver count_key). lexed e where vêm de preprocess(): lex_line já
+    aplicado a cada linha e a origem (arquivo:linha) de cada uma, que
+    passa a aparecer nas mensagens de erro.
+    """
+    if globls is None:
+        globls = set()
     # pass 1: encontrar simpbolos 
     text_addr = TEXT_BASE
     data_addr = DATA_BASE
+    # segmento de dados a partir de DATA_BASE, escrito direto pelas diretivas
+    data_bin = bytearray()
     symtab = {}
-    # guarda elementos para a segunda passagem
-    items = []  
+    data_syms = set()
+    # guarda as instruções para a segunda passagem
+    ir = TextIR()
+    shared_args = {}   # operandos iguais ficam numa tupla só
     cur_section = 'text'
-    for ln_no, raw in enumerate(lines, start=1):
-        parsed = parse_line(raw)
-        if not parsed: continue
-        kind = parsed[0]
-        if kind == 'label':
-            lbl = parsed[1]
-            addr = text_addr if cur_section=='text' else data_addr
-            symtab[lbl] = addr
-            items.append(('label', addr, lbl))
-            continue
-        if kind == 'label+rest':
-            lbl, rest = parsed[1]
-            addr = text_addr if cur_section=='text' else data_addr
-            symtab[lbl] = addr
-            items.append(('label', addr, lbl))
-            # parse rest recursively
-            parsed = parse_line(rest)
-            if not parsed: continue
-            kind = parsed[0]
-
-        if kind == 'directive':
-            dname, carg = parsed[1]
-            if dname == '.text':
-                cur_section = 'text'
-                continue
-            if dname == '.data':
-                cur_section = 'data'
-                continue
-            if cur_section == 'text':
-                if dname == '.align':
-                    n = int(carg,0)
-                    align_bytes = 1 << n
-                    while text_addr % align_bytes != 0:
-                        text_addr += 4
-                    continue
-            else:
-                if dname == '.word':
-                    vals = [int(x,0) for x in re.split(r'\s*,\s*', carg)]
-                    for v in vals:
-                        items.append(('data_word', data_addr, v))
-                        data_addr += 4
-                    continue
-                if dname == '.half':
-                    vals = [int(x,0) for x in re.split(r'\s*,\s*', carg)]
-                    for v in vals:
-                        items.append(('data_half', data_addr, v))
-                        data_addr += 2
-                    continue
-                if dname == '.byte':
-                    vals = [int(x,0) for x in re.split(r'\s*,\s*', carg)]
-                    for v in vals:
-                        items.append(('data_byte', data_addr, v))
-                        data_addr += 1
-                    continue
-                if dname == '.ascii' or dname == '.asciiz':
-                    m = re.match(r'\"(.*)\"', carg)
-                    if not m:
-                        raise ValueError(f"String literal expected at line {ln_no}")
-                    s = m.group(1).encode('utf-8').decode('unicode_escape')
-                    b = s.encode('utf-8')
-                    for ch in b:
-                        items.append(('data_byte', data_addr, ch))
-                        data_addr += 1
-                    if dname == '.asciiz':
-                        items.append(('data_byte', data_addr, 0))
-                        data_addr += 1
+    if lexed is None:
+        records = ((raw, lex_line(raw)) for raw in lines)
+    else:
+        records = zip(lines, lexed)
+    ln_no = 0
+    try:
+        for ln_no, (raw, (labels, name, ops)) in enumerate(records, start=1):
+            ln = None if where else ln_no   # com where, o arquivo:linha vem na frente da mensagem
+            for lbl in labels:
+                addr = text_addr if cur_section=='text' else data_addr
+                symtab[lbl] = addr
+                if cur_section == 'data': data_syms.add(lbl)
+                else: ir.mark('L', lbl)
+            if name is None: continue
+
+            if counts is not None:
+                counts[count_key(name)] += 1
+            if name[0] == '.':
+                if name == '.text':
+                    cur_section = 'text'
                     continue
-                if dname == '.space':
-                    n = int(carg,0)
-                    for _ in range(n):
-                        items.append(('data_byte', data_addr, 0))
-                        data_addr += 1
+                if name == '.data':
+                    cur_section = 'data'
                     continue
-                if dname == '.align':
-                    n = int(carg,0)
-                    align_bytes = 1 << n
-                    while data_addr % align_bytes != 0:
-                        items.append(('data_byte', data_addr, 0))
-                        data_addr += 1
+                if name == '.globl' or name == '.global':
+                    globls.update(t[1] for t in ops)
                     continue
-                items.append(('unknown_directive', (dname, carg)))
-            continue
-
-        if kind == 'instr':
-            mnem, args = parsed[1]
-            if mnem == '.text' or mnem == '.data':
-                if mnem == '.text': cur_section='text'
-                else: cur_section='data'
+                if cur_section == 'text':
+                    if name == '.align':
+                        align_bytes = 1 << _number(name, ops, ln)
+                        ir.mark('A', align_bytes)
+                        while text_addr % align_bytes != 0:
+                            text_addr += 4
+                        continue
+                else:
+                    data = data_directive_bytes(name, ops, data_addr, ln)
+                    if data is not None:
+                        data_bin += data
+                        data_addr += len(data)
                 continue
+
+            mnem = name.lower()
             if cur_section == 'text':
-                items.append(('text_instr', text_addr, (mnem, args, raw.strip())))
-                text_addr += 4
-            else:
-                items.append(('unknown_in_data', (mnem,args)))
+                if mnem not in INSTR_MAP or len(ops) == 1:
+                    mnem, ops = expand_pseudo(mnem, ops, ln)
+                op = MNEM_ID.get(mnem)
+                if op is None:
+                    raise ValueError(f"mnemônico desconhecido '{mnem}'{_at(ln)}")
+                ops = tuple(ops)
+                ir.append(op, text_addr, shared_args.setdefault(ops, ops), ln_no)
+                # la e li longo expandem para duas instruções
+                text_addr += OP_SIZE[op]
+    except SourceError:
+        raise
+    except ValueError as e:
+        if where is None:
+            raise
+        raise SourceError(f"{where(ln_no)}: {e}") from None
     # primeiro passo feito tabela completa mas sem valores calculados
+    return ir, symtab, data_bin, data_syms
+
+# ---------------------------
+# Desvios longos (relaxamento)
+# ---------------------------
+BRANCH_INVERSE = {'beq': 'bne', 'bne': 'beq', 'blt': 'bge', 'bge': 'blt'}
+FAR_TMP = 6   # t1: registrador de apoio do 'auipc' quando o jal/branch longo não tem rd
+
+def _far_jump(tmp, rd, target, addr):
+    """auipc tmp + jalr rd: salto para qualquer endereço de 32 bits a partir de addr."""
+    imm_hi = (target - addr + 0x800) & ~0xfff
+    return formato_u(imm_hi, tmp, 0x17), formato_i(target - addr - imm_hi, tmp, 0x0, rd, 0x67)
+
+def far_words(mnem, args, addr, size, symtab):
+    """Palavras de um branch/jal reescrito por relax_branches (size em bytes).
+
+    branch, 8 bytes:  branch invertido sobre a próxima instrução + jal zero, alvo
+    branch, 12 bytes: branch invertido + auipc t1 + jalr zero, t1
+    jal, 8 bytes:     auipc rd + jalr rd, rd (auipc t1 + jalr zero, t1 quando rd = zero)
+    """
+    target = _label(args[-1], 0, symtab)
+    if INSTR_MAP[mnem][0] == 'J':
+        rd = _reg(args[0])
+        return _far_jump(rd or FAR_TMP, rd, target, addr)
+    _, pack, fixed, _ = _ENCODERS[BRANCH_INVERSE[mnem]]
+    skip = pack(fixed, 0, _reg(args[0]), _reg(args[1]), size)
+    if size == 8:
+        return skip, _pack_j(_ENCODERS['jal'][2], 0, 0, 0, target - addr - 4)
+    return (skip,) + _far_jump(FAR_TMP, 0, target, addr + 4)
+
+def _align_up(addr, align_bytes):
+    return addr + (-addr) % align_bytes   # o endereço pode ser só par (compressao.py)
+
+def _relayout(ir, symtab, sizes):
+    """Recalcula os endereços do .text com os tamanhos novos (posição -> bytes); symtab é atualizada."""
+    addrs = array('I')
+    addr = TEXT_BASE
+    op_size = OP_SIZE
+    for k, kind, x in ir.walk():
+        if kind == 'I':
+            addrs.append(addr)
+            addr += sizes.get(k) or op_size[x]
+        elif kind == 'L':
+            symtab[x] = addr
+        else:
+            addr = _align_up(addr, x)
+    ir.addrs = addrs
+    return ir
+
+@_sem_gc
+def relax_branches(ir, symtab, keep=()):
+    """Reescreve os branch/jal cujo alvo ficou fora do alcance (ver far_words).
+
+    Cada rodada verifica os desvios com os endereços atuais e aumenta os que
+    não alcançam o alvo. Um desvio só cresce, nunca volta a encolher, então as
+    rodadas param quando nenhum muda (na prática, duas ou três). As rodadas só
+    percorrem os desvios, labels e .align do .text, deslocando cada um pelo
+    crescimento acumulado antes dele; os endereços são refeitos uma vez no fim.
+    Símbolos fora de symtab ou em keep (relocações do modo objeto) ficam
+    como estão.
+    Retorna (ir, far) com far = endereço -> tamanho dos desvios reescritos,
+    para pass_two; ir e symtab são atualizadas.
+    """
+    # (endereço original, posição, tipo, símbolo ou alinhamento): 'B'/'J' desvio, 'L' label, 'A' .align
+    args = ir.args
+    fmts, op_size = OP_FORMAT, OP_SIZE
+    events = []
+    addr = TEXT_BASE
+    for k, kind, x in ir.walk():
+        if kind == 'I':
+            if x < N_BASE:
+                fmt = fmts[x]
+                if (fmt == 'B' or fmt == 'J') and args[k]:
+                    sym = args[k][-1][1]
+                    if sym in symtab and sym not in keep:
+                        events.append((addr, k, fmt, sym))
+            addr += op_size[x]
+        else:
+            events.append((addr, k, kind, x))
+            if kind == 'A':
+                addr = _align_up(addr, x)
+    if not any(e[2] == 'B' or e[2] == 'J' for e in events):
+        return ir, {}
+
+    sizes = {}
+    cur = {}
+    while True:
+        # endereços atuais: original + crescimento acumulado (e o que ele muda nos .align)
+        grow = 0
+        for orig, k, kind, x in events:
+            if kind == 'L':
+                symtab[x] = orig + grow
+            elif kind == 'A':
+                grow = _align_up(orig + grow, x) - _align_up(orig, x)
+            else:
+                cur[k] = orig + grow
+                grow += sizes.get(k, 4) - 4
+        changed = False
+        for orig, k, kind, sym in events:
+            if kind == 'L' or kind == 'A':
+                continue
+            size = sizes.get(k, 4)
+            off = symtab[sym] - cur[k]
+            if kind == 'B':
+                if size == 4 and not -B_RANGE <= off < B_RANGE:
+                    size = 8
+                if size == 8 and not -J_RANGE <= off - 4 < J_RANGE:
+                    size = 12
+            elif size == 4 and not -J_RANGE <= off < J_RANGE:
+                size = 8
+            if size != sizes.get(k, 4):
+                sizes[k] = size
+                changed = True
+        if not changed:
+            break
+    if not sizes:
+        return ir, {}
+    ir = _relayout(ir, symtab, sizes)
+    return ir, {ir.addrs[k]: size for k, size in sizes.items()}
+
+@_sem_gc
+def pass_two(ir, symtab, data_syms=(), relocs=None, prefilled=None, far=None, where=None):
+    """Segunda passagem: codifica as instruções resolvendo as labels.
+
+    Um laço só sobre as colunas de ir: o id do mnemônico escolhe o leitor de
+    operandos e o montador da palavra (OP_ENCODERS), sem comparar strings;
+    'la', 'li', os desvios longos e as relocações do modo objeto ficam fora
+    do caminho comum.
+    prefilled (nº da linha -> palavra) traz codificações já conhecidas de
+    instruções que não dependem de endereço; essas linhas não são recodificadas.
+    far (endereço -> tamanho) são os desvios longos de relax_branches.
+    where (de preprocess) põe o arquivo:linha de origem na frente dos erros.
+    """
  # segunda passagem: resolvendo valores binarios e e as labels
     text_bin = OrderedDict()  # addr -> 32-bit int
-    data_bin = OrderedDict()  # addr -> byte (0-255) 
-    for it in items:
-        if it[0] == 'data_word':
-            addr = it[1]; val = it[2]
-            bytes_ = [(val >> (8*i)) & 0xff for i in range(4)]
-            for i,b in enumerate(bytes_):
-                data_bin[addr+i] = b
-        if it[0] == 'data_half':
-            addr = it[1]; val = it[2]
-            bytes_ = [(val >> (8*i)) & 0xff for i in range(2)]
-            for i,b in enumerate(bytes_):
-                data_bin[addr+i] = b
-        if it[0] == 'data_byte':
-            addr = it[1]; val = it[2] & 0xff
-            data_bin[addr] = val
+    encoders, fmts = OP_ENCODERS, OP_FORMAT
+    lines = ir.lines if prefilled else itertools.repeat(0)
+    plain = relocs is None
 
     # resolver as labels
-    for it in items:
-        if it[0] == 'text_instr':
-            addr = it[1]; mnem,args,raw = it[2]
-            mnem_lower = mnem.lower()
+    try:
+        for op, addr, args, ln in zip(ir.ops, ir.addrs, ir.args, lines):
+            if prefilled and ln in prefilled:
+                text_bin[addr] = prefilled[ln]
+                continue
+            if op < N_BASE and plain and not (far and addr in far):
+                parse, pack, fixed, nargs = encoders[op]
+                try:
+                    if len(args) != nargs:
+                        raise ValueError(f"'{MNEMONICS[op]}' espera {nargs} operandos, recebeu {len(args)}")
+                    text_bin[addr] = pack(fixed, *parse(args, addr, symtab))
+                except Exception as e:
+                    raise ValueError(f"erro ao montar instrução '{instr_text(MNEMONICS[op], args)}' em {hex(addr)}: {e}")
+                continue
             #pseudoinstrução a adicionar no futuro 
-            if mnem_lower == 'la':
-                sym = args[1] if len(args)>1 else args[0]  # allow la rd,sym or la sym? assume la rd, sym
-                rd = parse_reg(args[0])
+            if op == LA_ID:
+                if len(args) != 2:
+                    raise ValueError(f"'la' espera 2 operandos em {hex(addr)}")
+                sym = args[1][1]
+                rd = _reg(args[0])
+                if relocs is not None and (sym not in symtab or sym in data_syms):
+                    relocs.append(('LA', addr - TEXT_BASE, sym))
+                    text_bin[addr], text_bin[addr+4] = la_words(rd, addr, addr)
+                    continue
                 if sym not in symtab:
                     raise ValueError(f"símbolo {sym} não encontrado para 'la' at {hex(addr)}")
-                target = symtab[sym]
-                offset = target - addr
-                imm_hi = (target - addr) & ~0xfff
-                # encode auipc
-                auipc_word = formato_u(imm_hi, rd, 0x17)
-                text_bin[addr] = auipc_word
-                imm_lo = (target - (addr + imm_hi)) 
-                addi_word = formato_i(imm_lo, rd, 0x0, rd, 0x13)
-                text_bin[addr+4] = addi_word
+                text_bin[addr], text_bin[addr+4] = la_words(rd, symtab[sym], addr)
                 continue
-            if mnem_lower in INSTR_MAP:
-                typ, handler = INSTR_MAP[mnem_lower]
-                try:
-                    if typ == 'R' or typ == 'I' or typ == 'S' or typ == 'U':
-                        word = handler(args)
-                        text_bin[addr] = word
-                    elif typ == 'B' or typ == 'J':
-                        word = handler(args, addr, symtab)
-                        text_bin[addr] = word
-                    else:
-                        raise ValueError("tipo desconhecido")
-                except Exception as e:
-                    raise ValueError(f"erro ao montar instrução '{raw}' em {hex(addr)}: {e}")
+            mnem = MNEMONICS[op]
+            try:
+                if op == LI_ID:
+                    text_bin[addr], text_bin[addr+4] = li_words(_reg(args[0]), args[1][2])
+                    continue
+                if far and addr in far:
+                    for k, w in enumerate(far_words(mnem, args, addr, far[addr], symtab)):
+                        text_bin[addr + 4*k] = w
+                    continue
+                fmt = fmts[op]
+                if (fmt == 'B' or fmt == 'J') and args and args[-1][0] != 'imm':
+                    sym = args[-1][1]
+                    if sym not in symtab or sym in data_syms:
+                        relocs.append((fmt, addr - TEXT_BASE, sym))
+                        text_bin[addr] = encode(mnem, args, addr, {sym: addr})
+                        continue
+                text_bin[addr] = encode(mnem, args, addr, symtab)
+            except Exception as e:
+                raise ValueError(f"erro ao montar instrução '{instr_text(mnem, args)}' em {hex(addr)}: {e}")
+    except ValueError as e:
+        if where is None:
+            raise
+        # a instrução que falhou, pelo endereço (fica fora do laço, que não paga nada)
+        k = bisect_left(ir.addrs, addr)
+        raise SourceError(f"{where(ir.lines[k])}: {e}") from None
+    return text_bin
+
+# ---------------------------
+# Montagem em uma passagem (streaming)
+# ---------------------------
+class SegmentWriter:
+    """Escreve um segmento em um arquivo binário com buffer limitado.
+
+    Permite corrigir (patch) palavras já emitidas: se ainda estão no buffer
+    são alteradas em memória, senão o arquivo é reposicionado com seek.
+    """
+    def __init__(self, f, bufsize=1 << 16):
+        self.f = f
+        self.bufsize = bufsize
+        self.buf = bytearray()
+        self.flushed = 0
+
+    def size(self):
+        return self.flushed + len(self.buf)
+
+    def write(self, b):
+        self.buf += b
+        if len(self.buf) >= self.bufsize:
+            self.flush()
+
+    def patch(self, offset, b):
+        rel = offset - self.flushed
+        if rel >= 0:
+            self.buf[rel:rel+len(b)] = b
+        else:
+            self.f.seek(offset)
+            self.f.write(b)
+            self.f.seek(self.flushed)
+
+    def flush(self):
+        self.f.write(self.buf)
+        self.flushed += len(self.buf)
+        self.buf.clear()
+
+NOP_WORD = 0x00000013  # addi x0, x0, 0
+
+@_sem_gc
+def assemble_stream(lines, text_out, data_out, counts=None, index=None, lexed=None, where=None):
+    """Monta em uma única passagem, lendo 'lines' sob demanda.
+
+    As palavras vão direto para text_out/data_out (arquivos binários com seek,
+    little-endian, começando em TEXT_BASE/DATA_BASE). Só as referências para
+    frente (branch/jal/la com label ainda não definida) ficam em memória como
+    fixups e são corrigidas quando a label aparece, então a memória usada
+    depende do número de labels e fixups pendentes, não do tamanho da entrada.
+    Diferente de assemble(), 'la' ocupa as duas palavras que gera e o .align
+    do .text é preenchido com nops; não há relaxamento (o tamanho de cada
+    instrução é decidido ao lê-la), então um desvio fora do alcance é erro.
+    counts funciona como em pass_one; se index (indice.SourceIndex) for dado,
+    recebe o endereço e a linha de cada instrução (os símbolos ficam com quem
+    chamou, pela symtab retornada). lexed e where funcionam como em
+    pass_one, com Preprocessor.split para não perder a leitura sob demanda.
+    Retorna (symtab, bytes de texto, bytes de dados).
+    """
+    pack_word = struct.Struct('<I').pack
+    text = SegmentWriter(text_out)
+    data = SegmentWriter(data_out)
+    text_addr = TEXT_BASE
+    data_addr = DATA_BASE
+    symtab = {}
+    fixups = {}  # label -> [(addr, mnem, args, raw, ln_no)]
+    cur_section = 'text'
+
+    def emit(addr, mnem, args, raw, ln_no):
+        try:
+            if mnem == 'la':
+                rd = _reg(args[0])
+                words = la_words(rd, symtab[args[1][1]], addr)
+            elif mnem == 'li':
+                words = li_words(_reg(args[0]), args[1][2])
             else:
-                raise ValueError(f"mnemônico desconhecido '{mnem}' em {hex(addr)}")
-    return text_bin, data_bin, symtab
+                words = (encode(mnem, args, addr, symtab),)
+        except Exception as e:
+            # um fixup é codificado depois, na linha da label: a origem é a da instrução
+            if where is not None:
+                raise SourceError(f"{where(ln_no)}: erro ao montar instrução '{raw}': {e}") from None
+            raise ValueError(f"erro ao montar instrução '{raw}' na linha {ln_no}: {e}")
+        return b''.join(pack_word(w) for w in words)
+
+    if lexed is None:
+        records = ((raw, lex_line(raw)) for raw in lines)
+    else:
+        records = zip(lines, lexed)
+    ln_no = 0
+    try:
+        for ln_no, (raw, (labels, name, ops)) in enumerate(records, start=1):
+            ln = None if where else ln_no   # com where, o arquivo:linha vem na frente da mensagem
+            for lbl in labels:
+                addr = text_addr if cur_section=='text' else data_addr
+                symtab[lbl] = addr
+                for f_addr, f_mnem, f_args, f_raw, f_ln in fixups.pop(lbl, ()):
+                    text.patch(f_addr - TEXT_BASE, emit(f_addr, f_mnem, f_args, f_raw, f_ln))
+            if name is None: continue
+
+            if counts is not None:
+                counts[count_key(name)] += 1
+            if name[0] == '.':
+                if name == '.text':
+                    cur_section = 'text'
+                elif name == '.data':
+                    cur_section = 'data'
+                elif cur_section == 'text':
+                    if name == '.align':
+                        align_bytes = 1 << _number(name, ops, ln)
+                        while text_addr % align_bytes != 0:
+                            text.write(pack_word(NOP_WORD))
+                            text_addr += 4
+                else:
+                    b = data_directive_bytes(name, ops, data_addr, ln)
+                    if b is not None:
+                        data.write(b)
+                        data_addr += len(b)
+                continue
+
+            if cur_section == 'text':
+                mnem = name.lower()
+                if mnem not in INSTR_MAP or len(ops) == 1:
+                    mnem, ops = expand_pseudo(mnem, ops, ln)
+                if mnem == 'la':
+                    if len(ops) != 2:
+                        raise ValueError(f"'la' espera 2 operandos{_at(ln)}")
+                    lbl, size = ops[1][1], 8
+                elif mnem == 'li':
+                    lbl, size = None, 8
+                elif mnem in INSTR_MAP:
+                    lbl = (ops[-1][1] if INSTR_MAP[mnem][4].endswith('label') and ops and ops[-1][0] != 'imm'
+                           else None)
+                    size = 4
+                else:
+                    raise ValueError(f"mnemônico desconhecido '{mnem}'{_at(ln)}")
+                if lbl is not None and lbl not in symtab:
+                    fixups.setdefault(lbl, []).append((text_addr, mnem, ops, raw.strip(), ln_no))
+                    text.write(bytes(size))
+                else:
+                    text.write(emit(text_addr, mnem, ops, raw.strip(), ln_no))
+                if index is not None:
+                    index.add(text_addr, ln_no, size)
+                text_addr += size
+    except SourceError:
+        raise
+    except ValueError as e:
+        if where is None:
+            raise
+        raise SourceError(f"{where(ln_no)}: {e}") from None
+
+    if fixups:
+        lbl, pend = next(iter(fixups.items()))
+        loc = where(pend[0][4]) if where is not None else f"linha {pend[0][4]}"
+        raise ValueError(f"símbolo {lbl} não encontrado ({loc})")
+    text.flush()
+    data.flush()
+    return symtab, text.size(), data.size()
 
 # ---------------------------
 # I/O?
 # ---------------------------
-def write_text_bin_file(text_bin, data_bin, out_txt_path, raw_bin_path=None):
+def text_image(text_bin, half=None):
+    """Imagem contígua little-endian do .text a partir de TEXT_BASE, pronta para um único write.
+
+    Os buracos de .align viram NOP_WORD, como no modo --stream: o .raw, o
+    ELF e a saída do streaming ficam iguais byte a byte.
+    half: endereços das instruções de 16 bits (compressao.py); com ele a
+    imagem é um bytearray, já que as palavras deixam de ser alinhadas a 4
+    (os buracos de 2 bytes já vêm preenchidos com c.nop por compress_words).
+    """
+    if half:
+        end = max(a + (2 if a in half else 4) for a in text_bin)
+        img = bytearray(struct.pack('<I', NOP_WORD) * ((end - TEXT_BASE + 3) >> 2))
+        del img[end - TEXT_BASE:]
+        for addr, word in text_bin.items():
+            k = addr - TEXT_BASE
+            if addr in half:
+                img[k:k+2] = word.to_bytes(2, 'little')
+            else:
+                img[k:k+4] = word.to_bytes(4, 'little')
+        return img
+    if not text_bin:
+        return array('I')
+    img = array('I', [NOP_WORD]) * ((max(text_bin) + 4 - TEXT_BASE) >> 2)
+    for addr, word in text_bin.items():
+        img[(addr - TEXT_BASE) >> 2] = word
+    if sys.byteorder == 'big':
+        img.byteswap()
+    return img
+
+def write_segment(path, buf, use_mmap=False):
+    """Grava um segmento inteiro de uma vez, opcionalmente copiando para um mmap do arquivo."""
+    mv = memoryview(buf).cast('B')
+    with open(path, 'w+b') as f:
+        if use_mmap and len(mv):
+            f.truncate(len(mv))
+            with mmap.mmap(f.fileno(), len(mv)) as mm:
+                mm[:] = mv
+        else:
+            f.write(mv)
+
+def write_text_bin_file(text_bin, data_bin, out_txt_path, raw_bin_path=None, use_mmap=False, half=None):
+    # text_bin: addr -> palavra; data_bin: bytearray do segmento de dados a partir de DATA_BASE
+    # half: endereços das instruções de 16 bits (compressao.py), listadas com 16 dígitos
     with open(out_txt_path, 'w') as f:
         f.write("# Text segment (addr: 32-bit binary)\n")
-        for addr, word in text_bin.items():
-            f.write(f"{hex(addr)}: {int_to_bin(word,32)}\n")
+        if half:
+            f.writelines(f"{hex(addr)}: {word:016b}\n" if addr in half else f"{hex(addr)}: {word:032b}\n"
+                         for addr, word in text_bin.items())
+        else:
+            f.writelines(f"{hex(addr)}: {word:032b}\n" for addr, word in text_bin.items())
         f.write("\n# Data bytes (addr: byte)\n")
-        addrs = sorted(data_bin.keys())
-        for a in addrs:
-            f.write(f"{hex(a)}: {int(data_bin[a])}\n")
+        f.writelines(f"{hex(a)}: {b}\n" for a, b in enumerate(data_bin, start=DATA_BASE))
     if raw_bin_path:
         txt_raw = raw_bin_path + ".text.raw"
         data_raw = raw_bin_path + ".data.raw"
-        with open(txt_raw, 'wb') as ft:
-            for addr, word in text_bin.items():
-                ft.write(struct.pack('<I', word))
-        with open(data_raw, 'wb') as fd:
-            if data_bin:
-                min_a = min(data_bin.keys()); max_a = max(data_bin.keys())
-                for a in range(min_a, max_a+1):
-                    b = data_bin.get(a, 0)
-                    fd.write(bytes([b]))
+        write_segment(txt_raw, text_image(text_bin, half), use_mmap)
+        write_segment(data_raw, data_bin, use_mmap)
         print(f"raw text written to {txt_raw}, raw data written to {data_raw}")
+
+MAP_LINES_HEADER = "# Linhas (endereço arquivo:linha símbolo+deslocamento)\n"
+
+def write_map_file(path, symtab, index=None):
+    """Grava a tabela de símbolos ordenada por endereço ('0x00400000 nome' por linha).
+
+    Com index (indice.SourceIndex), acrescenta a seção '# Linhas' com a origem
+    de cada instrução ('0x00400000 arquivo:linha símbolo+desl').
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# Símbolos (endereço nome)\n")
+        f.writelines(f"{addr:#010x} {sym}\n" for sym, addr in sorted(symtab.items(), key=lambda kv: kv[1]))
+        if index is not None:
+            f.write(MAP_LINES_HEADER)
+            f.writelines(index.listing_lines())
+
+# ---------------------------
+# Saída ELF32 (executável RISC-V)
+# ---------------------------
+EM_RISCV = 243
+EF_RISCV_RVC = 0x1   # e_flags: o código usa instruções comprimidas
+ELF_PAGE = 0x1000
+
+def _elf_align(n, a=ELF_PAGE):
+    return (n + a - 1) & ~(a - 1)
+
+def write_elf_file(path, text, data, symtab, entry=None, rvc=False):
+    """Grava um executável ELF32 little-endian com .text em TEXT_BASE e .data em DATA_BASE.
+
+    text/data são as imagens dos segmentos (qualquer objeto com buffer). Cada
+    segmento fica alinhado a página no arquivo para que simuladores e loaders
+    possam mapeá-lo direto; a tabela de símbolos vai em .symtab/.strtab.
+    rvc marca o executável como RV32C (EF_RISCV_RVC).
+    """
+    text = memoryview(text).cast('B')
+    data = memoryview(data).cast('B')
+    if entry is None:
+        entry = symtab.get('_start', symtab.get('main', TEXT_BASE))
+
+    # tabela de símbolos: índice 0 é o símbolo nulo
+    strtab = bytearray(b'\0')
+    syms = [struct.pack('<IIIBBH', 0, 0, 0, 0, 0, 0)]
+    for name, addr in symtab.items():
+        shndx = 1 if TEXT_BASE <= addr <= TEXT_BASE + len(text) else 2
+        syms.append(struct.pack('<IIIBBH', len(strtab), addr, 0, 0, 0, shndx))  # STB_LOCAL, STT_NOTYPE
+        strtab += name.encode('utf-8') + b'\0'
+    symtab_bytes = b''.join(syms)
+    shstrtab = b'\0.text\0.data\0.symtab\0.strtab\0.shstrtab\0'
+
+    phdrs = [(TEXT_BASE, text, 5)]  # PF_R | PF_X
+    if len(data):
+        phdrs.append((DATA_BASE, data, 6))  # PF_R | PF_W
+    text_off = ELF_PAGE
+    data_off = _elf_align(text_off + len(text))
+    sym_off = _elf_align(data_off + len(data), 4)
+    str_off = sym_off + len(symtab_bytes)
+    shstr_off = str_off + len(strtab)
+    sh_off = _elf_align(shstr_off + len(shstrtab), 4)
+
+    ehdr = struct.pack('<4sBBBB8sHHIIIIIHHHHHH', b'\x7fELF', 1, 1, 1, 0, bytes(8),
+                       2, EM_RISCV, 1, entry, 52, sh_off, EF_RISCV_RVC if rvc else 0, 52, 32, len(phdrs), 40, 6, 5)
+    ph = b''.join(struct.pack('<IIIIIIII', 1, off, vaddr, vaddr, len(seg), len(seg), flags, ELF_PAGE)
+                  for (vaddr, seg, flags), off in zip(phdrs, (text_off, data_off)))
+    # (nome, tipo, flags, addr, offset, size, link, info, align, entsize)
+    sections = [
+        (0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (1, 1, 6, TEXT_BASE, text_off, len(text), 0, 0, 2 if rvc else 4, 0),
+        (7, 1, 3, DATA_BASE, data_off, len(data), 0, 0, 1, 0),
+        (13, 2, 0, 0, sym_off, len(symtab_bytes), 4, len(syms), 4, 16),
+        (21, 3, 0, 0, str_off, len(strtab), 0, 0, 1, 0),
+        (29, 3, 0, 0, shstr_off, len(shstrtab), 0, 0, 1, 0),
+    ]
+    sh = b''.join(struct.pack('<IIIIIIIIII', *s) for s in sections)
+
+    with open(path, 'wb') as f:
+        f.write(ehdr + ph)
+        f.seek(text_off); f.write(text)
+        f.seek(data_off); f.write(data)
+        f.seek(sym_off); f.write(symtab_bytes)
+        f.write(strtab)
+        f.write(shstrtab)
+        f.seek(sh_off); f.write(sh)
+
+def write_listing_from_raw(text_raw, data_raw, out_txt_path, chunk=1 << 16):
+    """Gera a listagem de texto lendo os .raw em blocos (usado pelo modo streaming)."""
+    with open(out_txt_path, 'w') as f:
+        f.write("# Text segment (addr: 32-bit binary)\n")
+        text_raw.seek(0)
+        addr = TEXT_BASE
+        while True:
+            block = text_raw.read(chunk)
+            if not block: break
+            for (word,) in struct.iter_unpack('<I', block):
+                f.write(f"{hex(addr)}: {int_to_bin(word,32)}\n")
+                addr += 4
+        f.write("\n# Data bytes (addr: byte)\n")
+        data_raw.seek(0)
+        addr = DATA_BASE
+        while True:
+            block = data_raw.read(chunk)
+            if not block: break
+            for b in block:
+                f.write(f"{hex(addr)}: {b}\n")
+                addr += 1
+
+# ---------------------------
+# Estatísticas da montagem (--stats / --profile)
+# ---------------------------
+class AssemblyStats:
+    """Tempos por fase, contagens de pass_one e, opcionalmente, um cProfile."""
+    def __init__(self, profile=False):
+        self.times = {}
+        self.counts = Counter()
+        self.profiler = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, phase):
+        """Soma a 'phase' o tempo passado desde a marcação anterior."""
+        now = time.perf_counter()
+        self.times[phase] = self.times.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def top_functions(self, n=20):
+        """As n funções com mais tempo próprio no perfil."""
+        import pstats
+        st = pstats.Stats(self.profiler)
+        rows = sorted(st.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+        return [{'funcao': f"{fn.rsplit('/', 1)[-1]}:{line}({name})", 'chamadas': nc,
+                 'tempo_proprio_s': round(tt, 6), 'tempo_acumulado_s': round(ct, 6)}
+                for (fn, line, name), (cc, nc, tt, ct, _) in rows]
+
+    def to_dict(self, **extra):
+        groups = {}
+        for key, n in sorted(self.counts.items()):
+            group, name = key.split(':', 1)
+            groups.setdefault(group, {})[name] = n
+        d = dict(extra)
+        d['tempos_s'] = {k: round(v, 6) for k, v in self.times.items()}
+        d['total_s'] = round(self._last - self._start, 6)
+        for group in ('formato', 'pseudo', 'diretiva', 'desconhecida'):
+            d[group] = groups.get(group, {})
+        if self.profiler is not None:
+            d['perfil'] = self.top_functions()
+        return d
+
 #organizar levemente o arquivo né
-#proximo passo é fazer ele ser inteligente reconhecer dependencias e relações com memoria de predição de branch
-def main():
-    if len(sys.argv) < 3:
-        print("Uso: python rv32_assembler.py entrada.s saida.txt [raw_out_prefix(optional)]")
-        sys.exit(1)
-    infile = sys.argv[1]; outfile = sys.argv[2]
-    rawprefix = sys.argv[3] if len(sys.argv) > 3 else None
-    with open(infile,'r',encoding='utf-8') as f:
-        lines = f.readlines()
-    text_bin, data_bin, symtab = assemble(lines)
-    write_text_bin_file(text_bin, data_bin, outfile, rawprefix)
+#dependencias e reordenação de instruções: pipeline.py (--schedule); predição de branch: preditor.py
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Montador RV32I de duas passagens")
+    ap.add_argument('infile', help="arquivo assembly de entrada")
+    ap.add_argument('outfile', help="listagem de saída (endereço: binário)")
+    ap.add_argument('rawprefix', nargs='?', help="prefixo dos arquivos .text.raw/.data.raw")
+    ap.add_argument('--stream', action='store_true',
+                    help="monta em uma passagem lendo a entrada sob demanda (memória limitada)")
+    ap.add_argument('--elf', metavar='ARQ', help="também grava um executável ELF32 em ARQ")
+    ap.add_argument('--mmap', action='store_true', help="grava os .raw através de mmap")
+    ap.add_argument('--map', metavar='ARQ',
+                    help="grava a tabela de símbolos e a linha de origem de cada instrução em ARQ")
+    ap.add_argument('--index', metavar='ARQ',
+                    help="grava o índice endereço -> arquivo:linha em binário (ver indice.py)")
+    ap.add_argument('--schedule', action='store_true',
+                    help="reordena as instruções de cada bloco para evitar bolhas no pipeline")
+    ap.add_argument('--peephole', action='store_true',
+                    help="remove instruções redundantes entre as passagens (ver otimizador.py)")
+    ap.add_argument('--rvc', action='store_true',
+                    help="usa instruções comprimidas de 16 bits (RV32C) onde couberem (ver compressao.py)")
+    ap.add_argument('--no-cache', action='store_true', help="não usa o cache incremental em disco")
+    ap.add_argument('--cache-dir', help="diretório do cache (padrão: $ARVA_CACHE_DIR ou ~/.cache/arva)")
+    ap.add_argument('--cache-max-mb', type=int, default=256, help="tamanho máximo do cache em MiB")
+    ap.add_argument('--stats', metavar='ARQ',
+                    help="grava tempos por fase e contagens em JSON ('-' = saída padrão)")
+    ap.add_argument('--profile', metavar='ARQ',
+                    help="roda a montagem sob cProfile e grava o perfil (pstats) em ARQ")
+    opts = ap.parse_args(argv)
+    infile = opts.infile; outfile = opts.outfile
+    rawprefix = opts.rawprefix
+    stats = AssemblyStats(profile=bool(opts.profile)) if (opts.stats or opts.profile) else None
+    counts = stats.counts if stats else None
+    prof = stats.profiler if stats else None
+    lap = stats.lap if stats else (lambda phase: None)
+    cache = None
+    index = None
+    peephole = None
+    rvc = None
+    half = None
+    pp = None
+    if opts.map or opts.index:
+        from indice import SourceIndex
+        index = SourceIndex((infile,))
+    if opts.stream:
+        mode = 'stream'
+        prefix = rawprefix or outfile
+        if prof: prof.enable()
+        with open(infile,'r',encoding='utf-8') as f, \
+             open(prefix + ".text.raw", 'w+b') as ft, open(prefix + ".data.raw", 'w+b') as fd:
+            # a leitura (e o pré-processador) é sob demanda, então fica dentro de 'montagem'
+            lines, lexed = f, None
+            if file_uses_preprocessor(infile):
+                pp = Preprocessor(infile)
+                lines, lexed = pp.split(f)
+            symtab, text_size, data_size = assemble_stream(lines, ft, fd, counts, index,
+                                                           lexed, pp and pp.where)
+            lap('montagem')
+            write_listing_from_raw(ft, fd, outfile)
+            if opts.elf:
+                ft.flush(); fd.flush()
+                text = mmap.mmap(ft.fileno(), 0, access=mmap.ACCESS_READ) if text_size else b''
+                data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) if data_size else b''
+                write_elf_file(opts.elf, text, data, symtab)
+                for seg in (text, data):
+                    if isinstance(seg, mmap.mmap): seg.close()
+        print(f"raw text written to {prefix}.text.raw, raw data written to {prefix}.data.raw")
+        n_words = text_size // 4
+        n_lines = None
+    else:
+        with open(infile,'r',encoding='utf-8') as f:
+            lines = f.readlines()
+        n_lines = len(lines)
+        lap('leitura')
+        if prof: prof.enable()
+        lines, lexed, pp = preprocess(lines, infile)
+        where = pp and pp.where
+        if pp is not None:
+            lap('preprocessador')
+        if opts.schedule or opts.peephole or opts.rvc:
+            mode = 'rvc' if opts.rvc else 'schedule' if opts.schedule else 'peephole'
+            ir, symtab, data_bin, data_syms = pass_one(lines, counts=counts, lexed=lexed, where=where)
+            lap('pass_one')
+            if opts.peephole:
+                from otimizador import peephole_text, format_report
+                ir, peephole = peephole_text(ir, symtab)
+                lap('peephole')
+                print(format_report(peephole))
+            if opts.schedule:
+                from pipeline import schedule_text
+                ir, before, after = schedule_text(ir)
+                lap('escalonamento')
+                print(f"Escalonamento: {before} -> {after} bolhas de dados")
+            ir, far = relax_branches(ir, symtab)
+            lap('relaxamento')
+            if opts.rvc:
+                from compressao import compress_text, compress_words, text_size, report, format_report
+                before = text_size(ir, far)
+                ir, far, half = compress_text(ir, symtab, far)
+                rvc = report(before, ir, far, half)
+                lap('compressao')
+                print(format_report(rvc))
+            if index is not None:
+                sizes = {**far, **dict.fromkeys(half, 2)} if half else far
+                index = SourceIndex.from_text(ir, symtab, infile, sizes)
+            text_bin = pass_two(ir, symtab, data_syms, far=far, where=where)
+            if half:
+                text_bin = compress_words(text_bin, half, ir)
+            lap('pass_two')
+        elif opts.no_cache:
+            mode = 'normal'
+            ir, symtab, data_bin, data_syms = pass_one(lines, counts=counts, lexed=lexed, where=where)
+            lap('pass_one')
+            ir, far = relax_branches(ir, symtab)
+            lap('relaxamento')
+            if index is not None:
+                index = SourceIndex.from_text(ir, symtab, infile, far)
+            text_bin = pass_two(ir, symtab, data_syms, far=far, where=where)
+            lap('pass_two')
+        else:
+            mode = 'cache'
+            from cache_montagem import AssemblyCache, DEFAULT_DIR
+            cache = AssemblyCache(opts.cache_dir or DEFAULT_DIR, opts.cache_max_mb << 20)
+            text_bin, data_bin, symtab = cache.assemble(lines, infile, counts, index, lexed, where)
+            lap('montagem')
+        write_text_bin_file(text_bin, data_bin, outfile, rawprefix, opts.mmap, half)
+        if opts.elf:
+            write_elf_file(opts.elf, text_image(text_bin, half), data_bin, symtab, rvc=bool(half))
+        n_words, data_size = len(text_bin), len(data_bin)
+    if index is not None:
+        if pp is not None:
+            index.set_origins(pp.files, pp.origin)
+        index.set_symbols(symtab)
+        if opts.map:
+            write_map_file(opts.map, symtab, index)
+        if opts.index:
+            index.save(opts.index)
+    lap('saida')
+    if prof:
+        prof.disable()
+        prof.dump_stats(opts.profile)
     print("Montagem concluída.")
-    print(f"Instruções: {len(text_bin)} words; Dados bytes: {len(data_bin)}")
+    print(f"Instruções: {n_words} words; Dados bytes: {data_size}")
+    if cache is not None:
+        st = cache.stats
+        print(f"Cache: {st['cache']} ({st['reaproveitadas']} reaproveitadas, {st['codificadas']} codificadas)")
     print("Símbolos:")
     for k,v in symtab.items():
         print(f"  {k} -> {hex(v)}")
+    if opts.stats:
+        d = stats.to_dict(arquivo=infile, modo=mode, linhas=n_lines, palavras_text=n_words,
+                          bytes_data=data_size, simbolos=len(symtab),
+                          cache=cache.stats if cache is not None else None, peephole=peephole, rvc=rvc)
+        text = json.dumps(d, indent=2, ensure_ascii=False)
+        if opts.stats == '-':
+            print(text)
+        else:
+            with open(opts.stats, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
 
 if __name__ == '__main__':
 
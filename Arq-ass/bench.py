@@ -0,0 +1,242 @@
+"""
+Benchmark do montador aRVA com programas sintéticos.
+Gera programas parametrizados (nº de instruções, densidade de labels,
+alcance dos desvios, tamanho do .data e frequência de 'la') e mede cada
+etapa separadamente:
+
+ - parse:    lex_line em todas as linhas (com o coletor de ciclos ligado;
+             as passagens o desligam, então pass_one pode sair mais rápido)
+ - pass_one: pass_one (inclui o parse, como na montagem normal)
+ - pass_two: relax_branches + pass_two sobre o .text da primeira passagem
+ - write:    write_text_bin_file (listagem + .raw) num diretório temporário
+
+Para cada etapa: melhor tempo de N repetições, linhas/s, pico de RSS do
+processo até ali e, numa rodada separada com tracemalloc (que deixa tudo
+mais lento, por isso não entra no tempo), o pico e o total retido de
+alocações. O resultado sai em JSON e pode ser comparado com um baseline
+salvo: etapas com linhas/s abaixo de (1 - tolerância) x baseline são
+regressões e o programa sai com código 1.
+
+Uso: python bench.py                               (suíte padrão)
+     python bench.py --n 100000 --labels 0.1 --fanout 8 --dados 4096 --la 0.05
+     python bench.py --json atual.json --baseline base.json [--tolerancia 0.1]
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+
+try:
+    import resource
+except ImportError:   # Windows: sem ru_maxrss
+    resource = None
+
+from aRVA import lex_line, pass_one, pass_two, relax_branches, write_text_bin_file
+
+REGS = ['zero', 'ra', 'sp', 't0', 't1', 't2', 's0', 's1', 'a0', 'a1', 'a2', 'a3',
+        'a4', 'a5', 'a6', 'a7', 's2', 's11', 't6', 'x31']
+ALU_R = ['add', 'sub', 'sll', 'srl', 'sra', 'and', 'or', 'xor', 'slt', 'sltu']
+ALU_I = ['addi', 'andi', 'ori', 'xori', 'slti', 'sltiu']
+SHIFTS = ['slli', 'srli', 'srai']
+LOADS = ['lw', 'lh', 'lb']
+STORES = ['sw', 'sh', 'sb']
+BRANCHES = ['beq', 'bne', 'blt', 'bge']
+
+# suíte padrão: nome -> parâmetros de gerar_programa
+SUITE = {
+    'pequeno':      dict(n=2_000),
+    'grande':       dict(n=200_000),
+    'muitas_labels': dict(n=50_000, labels=0.5, fanout=16),
+    'muito_la':     dict(n=50_000, la=0.3, dados=16_384),
+    'dados':        dict(n=10_000, dados=262_144),
+}
+
+def gerar_programa(n, labels=0.05, fanout=4, dados=256, la=0.03, seed=1):
+    """Linhas de um programa com n instruções.
+
+    labels: fração das instruções precedidas por uma label; fanout: os
+    desvios saltam para uma das 'fanout' labels mais próximas (para trás ou
+    para frente); dados: bytes do .data (em .word, com uma label a cada 64
+    bytes); la: fração das instruções que são 'la' para uma label de dados.
+    """
+    r = random.Random(seed)
+    n_labels = max(1, int(n * labels))
+    words = max(16, dados // 4)
+    n_data_labels = (words + 15) // 16
+    # posições das labels no .text (a primeira no início)
+    label_at = set(r.sample(range(1, n), min(n_labels - 1, n - 1))) | {0} if n > 1 else {0}
+    order = sorted(label_at)
+    idx_of = {pos: k for k, pos in enumerate(order)}
+    out = ['.text', 'main:']
+    cur = -1
+    reg = lambda: r.choice(REGS)
+    for i in range(n):
+        if i in idx_of:
+            cur = idx_of[i]
+            out.append(f'L{cur}:')
+        k = r.random()
+        if k < la:
+            out.append(f'    la {reg()}, D{r.randrange(n_data_labels)}')
+            continue
+        k = r.random()
+        if k < 0.30:
+            out.append(f'    {r.choice(ALU_R)} {reg()}, {reg()}, {reg()}')
+        elif k < 0.50:
+            out.append(f'    {r.choice(ALU_I)} {reg()}, {reg()}, {r.randint(-2048, 2047)}')
+        elif k < 0.55:
+            out.append(f'    {r.choice(SHIFTS)} {reg()}, {reg()}, {r.randint(0, 31)}')
+        elif k < 0.65:
+            out.append(f'    {r.choice(LOADS)} {reg()}, {r.randint(-2048, 2047)}({reg()})')
+        elif k < 0.75:
+            out.append(f'    {r.choice(STORES)} {reg()}, {r.randint(-2048, 2047)}({reg()})')
+        elif k < 0.88:
+            t = min(len(order) - 1, max(0, cur + r.randint(-fanout, fanout)))
+            out.append(f'    {r.choice(BRANCHES)} {reg()}, {reg()}, L{t}')
+        elif k < 0.92:
+            t = min(len(order) - 1, max(0, cur + r.randint(-fanout, fanout)))
+            out.append(f'    jal {reg()}, L{t}  # chamada')
+        elif k < 0.95:
+            out.append(f'    jalr {reg()}, {reg()}, {r.randint(-2048, 2047)}')
+        else:
+            out.append(f'    {r.choice(["lui", "auipc"])} {reg()}, {r.randrange(1 << 20) << 12:#x}')
+    out.append('.data')
+    for w in range(0, words, 16):
+        out.append(f'D{w // 16}:')
+        out.append('    .word ' + ', '.join(str(r.randrange(1 << 31)) for _ in range(min(16, words - w))))
+    return [l + '\n' for l in out]
+
+def rss_peak_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak   # macOS informa em bytes
+
+def _stages(lines, tmpdir):
+    """Etapas na ordem: (nome, função sem argumentos). O estado passa entre elas."""
+    st = {}
+    def parse():
+        return [lex_line(l) for l in lines]
+    def one():
+        st['p1'] = pass_one(lines)
+    def two():
+        ir, symtab, data_bin, data_syms = st['p1']
+        ir, far = relax_branches(ir, symtab)
+        st['text'] = pass_two(ir, symtab, data_syms, far=far)
+    def write():
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_text_bin_file(st['text'], st['p1'][2], os.path.join(tmpdir, 'out.txt'),
+                                os.path.join(tmpdir, 'out'))
+    return [('parse', parse), ('pass_one', one), ('pass_two', two), ('write', write)]
+
+def run_workload(lines, repeat=3):
+    """Mede as etapas sobre as linhas dadas; retorna {etapa: métricas}."""
+    result = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        best = {}
+        for _ in range(repeat):
+            for name, f in _stages(lines, tmpdir):
+                t = time.perf_counter()
+                f()
+                dt = time.perf_counter() - t
+                best[name] = min(best.get(name, dt), dt)
+                result.setdefault(name, {})['rss_pico_kb'] = rss_peak_kb()
+        # rodada separada só para as alocações
+        tracemalloc.start()
+        try:
+            for name, f in _stages(lines, tmpdir):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                f()
+                current, peak = tracemalloc.get_traced_memory()
+                result[name]['alloc_pico_kb'] = (peak - before) // 1024
+                result[name]['alloc_retido_kb'] = (current - before) // 1024
+        finally:
+            tracemalloc.stop()
+    for name, t in best.items():
+        result[name]['tempo_s'] = round(t, 6)
+        result[name]['linhas_s'] = round(len(lines) / t) if t else None
+    return result
+
+def run_suite(workloads, repeat=3, log=sys.stderr):
+    report = {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cargas': {},
+    }
+    for name, params in workloads.items():
+        lines = gerar_programa(**params)
+        print(f"{name}: {len(lines)} linhas ...", file=log, flush=True)
+        report['cargas'][name] = {
+            'parametros': params,
+            'linhas': len(lines),
+            'etapas': run_workload(lines, repeat),
+        }
+    return report
+
+def compare(report, baseline, tolerance=0.10):
+    """Regressões: [(carga, etapa, linhas/s atual, linhas/s do baseline, razão)]."""
+    regressions = []
+    for name, cur in report['cargas'].items():
+        base = baseline.get('cargas', {}).get(name)
+        if base is None or base.get('parametros') != cur['parametros']:
+            continue
+        for stage, m in cur['etapas'].items():
+            b = base['etapas'].get(stage, {}).get('linhas_s')
+            if not b or not m.get('linhas_s'):
+                continue
+            ratio = m['linhas_s'] / b
+            m['razao_baseline'] = round(ratio, 3)
+            if ratio < 1 - tolerance:
+                regressions.append((name, stage, m['linhas_s'], b, ratio))
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark do montador aRVA")
+    ap.add_argument('--n', type=int, help="nº de instruções (sem --n roda a suíte padrão)")
+    ap.add_argument('--labels', type=float, default=0.05, help="fração de instruções com label")
+    ap.add_argument('--fanout', type=int, default=4, help="alcance dos desvios, em labels")
+    ap.add_argument('--dados', type=int, default=256, help="bytes do .data")
+    ap.add_argument('--la', type=float, default=0.03, help="fração de instruções 'la'")
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--repeticoes', type=int, default=3, help="repetições (vale o melhor tempo)")
+    ap.add_argument('--json', metavar='ARQ', help="grava o relatório em ARQ (padrão: saída padrão)")
+    ap.add_argument('--baseline', metavar='ARQ', help="compara com um relatório salvo")
+    ap.add_argument('--tolerancia', type=float, default=0.10,
+                    help="queda relativa de linhas/s aceita antes de acusar regressão")
+    opts = ap.parse_args()
+
+    if opts.n:
+        workloads = {'custom': dict(n=opts.n, labels=opts.labels, fanout=opts.fanout,
+                                    dados=opts.dados, la=opts.la, seed=opts.seed)}
+    else:
+        workloads = SUITE
+    report = run_suite(workloads, opts.repeticoes)
+
+    regressions = []
+    if opts.baseline:
+        with open(opts.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), opts.tolerancia)
+        report['regressoes'] = [dict(carga=c, etapa=e, linhas_s=a, baseline=b, razao=round(r, 3))
+                                for c, e, a, b, r in regressions]
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if opts.json:
+        with open(opts.json, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for c, e, a, b, r in regressions:
+        print(f"REGRESSÃO {c}/{e}: {a} linhas/s (baseline {b}, {100*(r-1):+.1f}%)", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
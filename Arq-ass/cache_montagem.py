@@ -0,0 +1,201 @@
+"""
+Cache incremental em disco para o montador aRVA.
+Guarda, por hash do conteúdo, o resultado completo da montagem (palavras do
+.text, .data, tabela de símbolos e linha de origem de cada instrução). Quando o arquivo muda, a primeira passagem
+roda de novo (os endereços podem ter mudado), mas as instruções dos blocos de
+linhas que não mudaram reaproveitam a codificação salva: só as linhas editadas
+e os branch/jal/la (que dependem de endereço) são codificados outra vez.
+
+Os blocos começam em linhas de label, então uma edição só invalida o bloco
+onde ela está. O diretório é limitado por tamanho: ao passar do limite, as
+entradas usadas há mais tempo são apagadas até sobrar EVICT_TARGET dele.
+"""
+import os
+import re
+import pickle
+import hashlib
+from array import array
+from collections import Counter, OrderedDict
+
+import aRVA
+from aRVA import INSTR_MAP, MNEMONICS, pass_one, pass_two, relax_branches
+import indice
+from indice import SourceIndex
+
+DEFAULT_DIR = os.environ.get('ARVA_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'arva')
+DEFAULT_MAX_BYTES = 256 << 20
+EVICT_TARGET = 0.9   # fração de max_bytes que sobra depois de uma limpeza
+CHUNK_MIN_LINES = 64
+CHUNK_MAX_LINES = 1024
+LABEL_LINE_RE = re.compile(r'\s*[A-Za-z_.$][\w.$]*\s*:')
+# diretório -> total estimado, comum a todos os AssemblyCache do processo
+# (aRVA.main cria um por montagem; o lote e o servidor montam muitas seguidas)
+_SIZES = {}
+
+# muda sempre que o montador (ou o formato deste cache) muda, invalidando o cache antigo
+_h = hashlib.blake2b(digest_size=16)
+for _src in (aRVA.__file__, indice.__file__, __file__):
+    with open(_src, 'rb') as _f:
+        _h.update(_f.read())
+ASSEMBLER_HASH = _h.digest()
+
+def _key(*parts):
+    h = hashlib.blake2b(ASSEMBLER_HASH, digest_size=16)
+    for p in parts:
+        h.update(p)
+    return h.hexdigest()
+
+def split_chunks(lines):
+    """Limites dos blocos: cada bloco começa numa label e tem entre MIN e MAX linhas."""
+    bounds = [0]
+    start = 0
+    for i, line in enumerate(lines):
+        n = i - start
+        if n >= CHUNK_MAX_LINES or (n >= CHUNK_MIN_LINES and LABEL_LINE_RE.match(line)):
+            bounds.append(i)
+            start = i
+    bounds.append(len(lines))
+    return bounds
+
+def _position_independent(mnem):
+    m = mnem.lower()
+    return m in INSTR_MAP and INSTR_MAP[m][0] not in ('B', 'J')
+
+class AssemblyCache:
+    def __init__(self, root=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.stats = {}
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def size(self):
+        """Total estimado do diretório (None: ainda não varrido neste processo)."""
+        return _SIZES.get(self.root)
+
+    @size.setter
+    def size(self, total):
+        _SIZES[self.root] = total
+
+    def _path(self, kind, key):
+        return os.path.join(self.root, f'{kind}-{key}.pkl')
+
+    def _load(self, path):
+        try:
+            with open(path, 'rb') as f:
+                obj = pickle.load(f)
+            os.utime(path)  # marca como usado recentemente
+            return obj
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _store(self, path, obj):
+        tmp = path + f'.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        try:
+            size -= os.stat(path).st_size   # substitui uma entrada que já existia
+        except OSError:
+            pass
+        os.replace(tmp, path)
+        if self.size is not None:
+            self.size += size
+
+    def evict(self):
+        """Apaga as entradas menos usadas se o diretório passou de max_bytes.
+
+        O diretório só é varrido na primeira chamada e quando o total
+        estimado (a varredura anterior mais o que _store gravou desde então)
+        passa do limite; o que outros processos gravaram no mesmo diretório
+        entra na varredura seguinte. Cada limpeza desce a EVICT_TARGET do
+        limite, então as varreduras não se repetem a cada gravação.
+        """
+        if self.size is not None and self.size <= self.max_bytes:
+            return
+        entries = []
+        total = 0
+        for e in os.scandir(self.root):
+            if e.is_file() and e.name.endswith('.pkl'):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        entries.sort()
+        target = self.max_bytes if total <= self.max_bytes else int(self.max_bytes * EVICT_TARGET)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+    def assemble(self, lines, path=None, counts=None, index=None, lexed=None, where=None):
+        """Mesmo resultado de aRVA.assemble(lines), reaproveitando o cache.
+
+        counts (Counter) recebe as contagens de pass_one e index
+        (indice.SourceIndex) o endereço e a linha de cada instrução; os dois
+        ficam guardados junto com o resultado para servirem também num
+        acerto completo. Com o pré-processador, lines é o programa já
+        expandido (aRVA.preprocess), então o conteúdo dos .include entra na
+        chave; lexed e where seguem para pass_one.
+        """
+        full_key = _key(''.join(lines).encode('utf-8'))
+        full_path = self._path('f', full_key)
+        hit = self._load(full_path)
+        if hit is not None:
+            addrs, words, data, symtab, saved_counts, (instr_addrs, instr_lines, end) = hit
+            if counts is not None:
+                counts.update(saved_counts)
+            if index is not None:
+                index.extend(instr_addrs, instr_lines, end)
+            self.stats = {'cache': 'completo', 'reaproveitadas': len(words), 'codificadas': 0}
+            return OrderedDict(zip(addrs, words)), bytearray(data), symtab
+
+        line_counts = Counter()
+        ir, symtab, data_bin, data_syms = pass_one(lines, counts=line_counts, lexed=lexed, where=where)
+        if counts is not None:
+            counts.update(line_counts)
+
+        # blocos deste arquivo já vistos: hash do bloco -> {linha relativa: palavra}
+        bounds = split_chunks(lines)
+        chunk_keys = [_key(''.join(lines[a:b]).encode('utf-8')) for a, b in zip(bounds, bounds[1:])]
+        table_path = self._path('c', _key(os.path.abspath(path).encode('utf-8'))) if path else None
+        old_table = (self._load(table_path) if table_path else None) or {}
+        prefilled = {}
+        for a, ck in zip(bounds, chunk_keys):
+            words = old_table.get(ck)
+            if words:
+                for rel, w in words.items():
+                    prefilled[a + rel + 1] = w
+
+        ir, far = relax_branches(ir, symtab)
+        text_bin = pass_two(ir, symtab, data_syms, prefilled=prefilled, far=far, where=where)
+
+        # nova tabela de blocos a partir das instruções independentes de endereço
+        table = {ck: {} for ck in chunk_keys}
+        ci = 0
+        independent = {op for op in set(ir.ops) if _position_independent(MNEMONICS[op])}
+        for op, addr, ln in zip(ir.ops, ir.addrs, ir.lines):
+            if op not in independent:
+                continue
+            ln -= 1
+            while ln >= bounds[ci + 1]:
+                ci += 1
+            table[chunk_keys[ci]][ln - bounds[ci]] = text_bin[addr]
+
+        found = SourceIndex.from_text(ir, symtab, far=far)
+        if index is not None:
+            index.extend(found.addrs, found.lines, found.end)
+        n_instr = len(found)
+        self.stats = {'cache': 'parcial' if prefilled else 'vazio',
+                      'reaproveitadas': len(prefilled), 'codificadas': n_instr - len(prefilled)}
+        self._store(full_path, (array('I', text_bin.keys()), array('I', text_bin.values()),
+                                bytes(data_bin), symtab, dict(line_counts),
+                                (found.addrs, found.lines, found.end)))
+        if table_path:
+            self._store(table_path, table)
+        self.evict()
+        return text_bin, data_bin, symtab
@@ -0,0 +1,55 @@
+"""
+Cliente do servidor de montagem (servidor.py).
+Recebe os mesmos argumentos do aRVA.py, manda o pedido para o servidor pelo
+socket Unix e repassa a saída, as mensagens de erro e o código de saída.
+Só usa a biblioteca padrão básica, então começa rápido; se não houver
+servidor no ar, monta no próprio processo como o aRVA.py faria.
+
+Uso: python cliente.py [--socket ARQ] entrada.s saida.txt [opções do aRVA.py]
+"""
+import os
+import sys
+import json
+import socket
+import tempfile
+
+# padrão do servidor e do cliente: $ARVA_SOCKET ou arva-<uid>.sock no diretório temporário
+DEFAULT_SOCKET = os.environ.get('ARVA_SOCKET') or os.path.join(
+    tempfile.gettempdir(), f"arva-{os.getuid() if hasattr(os, 'getuid') else 0}.sock")
+
+def request(argv, path=DEFAULT_SOCKET, cwd=None):
+    """Monta no servidor; retorna (código, saída, erros) ou None se não houver servidor."""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+    except OSError:
+        s.close()
+        return None
+    with s, s.makefile('rb') as f:
+        msg = {'id': 1, 'argv': list(argv), 'cwd': cwd or os.getcwd()}
+        s.sendall(json.dumps(msg).encode('utf-8') + b'\n')
+        line = f.readline()
+    if not line:
+        raise ConnectionError("o servidor fechou a conexão sem responder")
+    resp = json.loads(line)
+    return resp['codigo'], resp['saida'], resp['erros']
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    path = DEFAULT_SOCKET
+    if argv[:1] == ['--socket'] and len(argv) > 1:
+        path, argv = argv[1], argv[2:]
+    resp = request(argv, path)
+    if resp is None:
+        import aRVA
+        aRVA.main(argv)
+        return
+    code, out, err = resp
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    sys.exit(code)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+"""
+Compressão RV32C do aRVA: troca instruções por formas de 16 bits.
+Roda depois do relaxamento (relax_branches) e antes da segunda passagem:
+
+ 1. marca as instruções que têm forma comprimida. Para as que não dependem
+    de endereço isso é decidido pela própria palavra (codificada uma vez);
+    beq/bne contra zero (c.beqz/c.bnez) e jal zero/ra (c.j/c.jal) também
+    dependem do alcance, bem menor que o da forma de 32 bits;
+ 2. refaz o layout com 2 bytes para as marcadas (symtab e endereços) e
+    desmarca os desvios que ficaram fora do alcance. Um desvio só cresce,
+    nunca volta a encolher, então as rodadas terminam;
+ 3. a segunda passagem codifica tudo em 32 bits nos endereços novos, e
+    compress_words troca as palavras marcadas pela forma de 16 bits, que
+    sai da palavra já pronta (deslocamentos incluídos), e põe c.nop nos
+    2 bytes de .align que só existem por causa da compressão.
+
+Formas usadas: c.nop, c.li, c.addi, c.addi16sp, c.addi4spn, c.mv, c.lui,
+c.andi, c.slli, c.srli, c.srai, c.add, c.sub, c.xor, c.or, c.and, c.lw,
+c.sw, c.lwsp, c.swsp, c.jr, c.jalr, c.j, c.jal, c.beqz e c.bnez. 'la', 'li'
+de duas palavras e os desvios longos ficam com 32 bits.
+
+O resultado mistura palavras de 32 bits e de 16 bits (as de endereço em
+'half'): use text_image(text_bin, half) e write_text_bin_file(..., half=half)
+para gravar. simulador.py e desmontador.py só conhecem RV32I.
+
+Uso: python compressao.py entrada.s [saida.txt] [rawprefix]
+"""
+import argparse
+from collections import OrderedDict
+
+from aRVA import (MNEMONICS, N_BASE, OP_FORMAT, OP_SIZE, TEXT_BASE, B_RANGE, J_RANGE, decode, encode, to_signed,
+                  preprocess, pass_one, pass_two, relax_branches, _relayout, _align_up, _sem_gc, write_text_bin_file)
+
+# alcance das formas comprimidas dos desvios, em bytes
+CB_RANGE = 1 << 8    # c.beqz / c.bnez (9 bits)
+CJ_RANGE = 1 << 11   # c.j / c.jal (12 bits)
+
+def _p(r):
+    """Registrador nos 3 bits das formas CIW/CL/CS/CA/CB (x8-x15), ou None."""
+    return r - 8 if 8 <= r < 16 else None
+
+def _ci(funct3, rd, imm, op):
+    return funct3 << 13 | ((imm >> 5) & 1) << 12 | rd << 7 | (imm & 0x1f) << 2 | op
+
+def _ca(rd, funct2, rs2):
+    return 0b100011 << 10 | _p(rd) << 7 | funct2 << 5 | _p(rs2) << 2 | 0b01
+
+def _cr(funct4, rd, rs2):
+    return funct4 << 12 | rd << 7 | rs2 << 2 | 0b10
+
+def _cb(funct3, rs1, off):
+    return (funct3 << 13 | ((off >> 8) & 1) << 12 | ((off >> 3) & 3) << 10 | _p(rs1) << 7
+            | ((off >> 6) & 3) << 5 | ((off >> 1) & 3) << 3 | ((off >> 5) & 1) << 2 | 0b01)
+
+def _cj(funct3, off):
+    return (funct3 << 13 | ((off >> 11) & 1) << 12 | ((off >> 4) & 1) << 11 | ((off >> 8) & 3) << 9
+            | ((off >> 10) & 1) << 8 | ((off >> 6) & 1) << 7 | ((off >> 7) & 1) << 6
+            | ((off >> 1) & 7) << 3 | ((off >> 5) & 1) << 2 | 0b01)
+
+def _cl(funct3, rd, rs1, off):
+    return (funct3 << 13 | ((off >> 3) & 7) << 10 | _p(rs1) << 7 | ((off >> 2) & 1) << 6
+            | ((off >> 6) & 1) << 5 | _p(rd) << 2)
+
+def _imm6(imm):
+    return -32 <= imm < 32
+
+def _c_addi(rd, rs1, rs2, imm):
+    if rd == 0:
+        return 0x0001 if rs1 == 0 and imm == 0 else None   # c.nop
+    if rs1 == 0 and _imm6(imm):
+        return _ci(0b010, rd, imm, 0b01)   # c.li
+    if rd == rs1 and imm != 0 and _imm6(imm):
+        return _ci(0b000, rd, imm, 0b01)   # c.addi
+    if rd == rs1 == 2 and imm != 0 and imm % 16 == 0 and -512 <= imm < 512:
+        return (0b011 << 13 | ((imm >> 9) & 1) << 12 | 2 << 7 | ((imm >> 4) & 1) << 6   # c.addi16sp
+                | ((imm >> 6) & 1) << 5 | ((imm >> 7) & 3) << 3 | ((imm >> 5) & 1) << 2 | 0b01)
+    if rs1 == 2 and _p(rd) is not None and 0 < imm < 1024 and imm % 4 == 0:
+        return (((imm >> 4) & 3) << 11 | ((imm >> 6) & 0xf) << 7 | ((imm >> 2) & 1) << 6   # c.addi4spn
+                | ((imm >> 3) & 1) << 5 | _p(rd) << 2)
+    if imm == 0 and rs1 != 0:
+        return _cr(0b1000, rd, rs1)   # c.mv
+    return None
+
+def _c_lui(rd, rs1, rs2, imm):
+    v = to_signed(imm, 32) >> 12
+    if rd in (0, 2) or v == 0 or not _imm6(v):
+        return None
+    return _ci(0b011, rd, v, 0b01)
+
+def _c_andi(rd, rs1, rs2, imm):
+    if rd == rs1 and _p(rd) is not None and _imm6(imm):
+        return 0b100 << 13 | ((imm >> 5) & 1) << 12 | 0b10 << 10 | _p(rd) << 7 | (imm & 0x1f) << 2 | 0b01
+    return None
+
+def _c_slli(rd, rs1, rs2, imm):
+    return _ci(0b000, rd, imm, 0b10) if rd == rs1 != 0 and imm != 0 else None
+
+def _c_shift_right(funct2):
+    def rule(rd, rs1, rs2, imm):
+        if rd == rs1 and _p(rd) is not None and imm != 0:
+            return 0b100 << 13 | funct2 << 10 | _p(rd) << 7 | imm << 2 | 0b01
+        return None
+    return rule
+
+def _c_add(rd, rs1, rs2, imm):
+    if rd == 0:
+        return None
+    if rs1 == 0 and rs2 != 0:
+        return _cr(0b1000, rd, rs2)   # c.mv
+    if rs2 == 0 and rs1 != 0:
+        return _cr(0b1000, rd, rs1)   # c.mv
+    if rd == rs1 and rs2 != 0:
+        return _cr(0b1001, rd, rs2)
+    if rd == rs2 and rs1 != 0:
+        return _cr(0b1001, rd, rs1)
+    return None
+
+def _c_alu(funct2, commutative):
+    def rule(rd, rs1, rs2, imm):
+        if _p(rd) is None:
+            return None
+        if rd == rs1 and _p(rs2) is not None:
+            return _ca(rd, funct2, rs2)
+        if commutative and rd == rs2 and _p(rs1) is not None:
+            return _ca(rd, funct2, rs1)
+        return None
+    return rule
+
+def _c_lw(rd, rs1, rs2, imm):
+    if imm < 0 or imm % 4:
+        return None
+    if rs1 == 2 and rd != 0 and imm < 256:   # c.lwsp
+        return 0b010 << 13 | ((imm >> 5) & 1) << 12 | rd << 7 | ((imm >> 2) & 7) << 4 | ((imm >> 6) & 3) << 2 | 0b10
+    if _p(rd) is not None and _p(rs1) is not None and imm < 128:
+        return _cl(0b010, rd, rs1, imm)
+    return None
+
+def _c_sw(rd, rs1, rs2, imm):
+    if imm < 0 or imm % 4:
+        return None
+    if rs1 == 2 and imm < 256:   # c.swsp
+        return 0b110 << 13 | ((imm >> 2) & 0xf) << 9 | ((imm >> 6) & 3) << 7 | rs2 << 2 | 0b10
+    if _p(rs2) is not None and _p(rs1) is not None and imm < 128:
+        return _cl(0b110, rs2, rs1, imm)
+    return None
+
+def _c_jalr(rd, rs1, rs2, imm):
+    if imm != 0 or rs1 == 0 or rd > 1:
+        return None
+    return _cr(0b1000 | rd, rs1, 0)   # c.jr (rd = zero) / c.jalr (rd = ra)
+
+def _c_jal(rd, rs1, rs2, imm):
+    if rd > 1 or not -CJ_RANGE <= imm < CJ_RANGE:
+        return None
+    return _cj(0b101 if rd == 0 else 0b001, imm)   # c.j / c.jal
+
+def _c_branch(funct3):
+    def rule(rd, rs1, rs2, imm):
+        if not -CB_RANGE <= imm < CB_RANGE:
+            return None
+        if rs2 == 0 and _p(rs1) is not None:
+            return _cb(funct3, rs1, imm)
+        if rs1 == 0 and _p(rs2) is not None:
+            return _cb(funct3, rs2, imm)
+        return None
+    return rule
+
+# mnemônico base -> regra (rd, rs1, rs2, imm) -> meia palavra ou None
+RVC_RULES = {
+    'addi': _c_addi,
+    'lui': _c_lui,
+    'andi': _c_andi,
+    'slli': _c_slli,
+    'srli': _c_shift_right(0b00),
+    'srai': _c_shift_right(0b01),
+    'add': _c_add,
+    'sub': _c_alu(0b00, False),
+    'xor': _c_alu(0b01, True),
+    'or': _c_alu(0b10, True),
+    'and': _c_alu(0b11, True),
+    'lw': _c_lw,
+    'sw': _c_sw,
+    'jalr': _c_jalr,
+    'jal': _c_jal,
+    'beq': _c_branch(0b110),
+    'bne': _c_branch(0b111),
+}
+
+def rvc_word(word):
+    """Forma de 16 bits de uma palavra RV32I, ou None se não houver."""
+    d = decode(word)
+    if d is None:
+        return None
+    rule = RVC_RULES.get(d[0])
+    return rule(*d[1:]) if rule else None
+
+def _branch_size(fmt, size, off):
+    """Tamanho que um desvio de 'size' bytes precisa para alcançar off (só cresce)."""
+    limit = CB_RANGE if fmt == 'B' else CJ_RANGE
+    if size == 2 and not -limit <= off < limit:
+        size = 4
+    if fmt == 'B':
+        if size == 4 and not -B_RANGE <= off < B_RANGE:
+            size = 8
+        if size == 8 and not -J_RANGE <= off - 4 < J_RANGE:
+            size = 12
+    elif size == 4 and not -J_RANGE <= off < J_RANGE:
+        size = 8
+    return size
+
+@_sem_gc
+def compress_text(ir, symtab, far=None, keep=()):
+    """Escolhe as instruções comprimidas e refaz o layout (ver o topo do arquivo).
+
+    far são os desvios longos de relax_branches (endereço -> tamanho), que não
+    são comprimidos; keep, os símbolos resolvidos pelo ligador.
+    Todos os desvios são conferidos a cada rodada: um .align pode ganhar
+    preenchimento com o código menor, então até um desvio de 32 bits pode
+    precisar crescer como em relax_branches.
+    Retorna (ir, far, half) com far nos endereços novos e half o conjunto
+    dos endereços das instruções de 16 bits; ir e symtab são atualizadas.
+    """
+    far = far or {}
+    sizes = {}      # posição em ir -> bytes (2 comprimida, ou tamanho do desvio longo)
+    branches = []   # (posição, formato, símbolo) dos desvios resolvidos aqui
+    for k, (op, addr, args) in enumerate(zip(ir.ops, ir.addrs, ir.args)):
+        if op >= N_BASE:   # la, li: 32 bits
+            continue
+        mnem = MNEMONICS[op]
+        fmt = OP_FORMAT[op]
+        if (fmt == 'B' or fmt == 'J') and args:
+            sym = args[-1][1]
+            if sym not in symtab or sym in keep:
+                continue
+            branches.append((k, fmt, sym))
+            if addr in far:
+                sizes[k] = far[addr]
+                continue
+            try:   # só os registradores: deslocamento zero
+                word = encode(mnem, args, 0, {sym: 0})
+            except ValueError:
+                continue   # a segunda passagem mostra o erro
+        elif mnem in RVC_RULES and args:
+            try:
+                word = encode(mnem, args, 0, symtab)
+            except ValueError:
+                continue
+        else:
+            continue
+        if mnem in RVC_RULES and rvc_word(word) is not None:
+            sizes[k] = 2
+
+    while True:
+        addrs = _relayout(ir, symtab, sizes).addrs
+        changed = False
+        for k, fmt, sym in branches:
+            size = sizes.get(k, 4)
+            new = _branch_size(fmt, size, symtab[sym] - addrs[k])
+            if new != size:
+                sizes[k] = new
+                changed = True
+        if not changed:
+            break
+    far = {addrs[k]: size for k, size in sizes.items() if size > 4}
+    half = {addrs[k] for k, size in sizes.items() if size == 2}
+    return ir, far, half
+
+C_NOP = 0x0001
+
+def _align_starts(ir, text_bin, half):
+    """(início do preenchimento, alinhamento) de cada .align do .text, segundo as palavras de text_bin."""
+    out = []
+    prev = None   # (posição, fim) do .align anterior
+    for k, kind, x in ir.marks:
+        if kind != 'A':
+            continue
+        if prev is not None and prev[0] == k:
+            start = prev[1]
+        elif k:
+            # fim da instrução anterior: as palavras dela seguem até a próxima instrução
+            start = ir.addrs[k - 1]
+            stop = ir.addrs[k] if k < len(ir) else None
+            while start in text_bin and (stop is None or start < stop):
+                start += 2 if start in half else 4
+        else:
+            start = TEXT_BASE
+        out.append((start, x))
+        prev = (k, _align_up(start, x))
+    return out
+
+def compress_words(text_bin, half, ir=None):
+    """Troca as palavras dos endereços em half pela forma de 16 bits.
+
+    Com ir (o de compress_text), os 2 bytes que um .align ganha quando o
+    código antes dele termina num endereço só par viram c.nop (o endereço
+    entra em half): sem compressão esse preenchimento não existia e a
+    execução passava direto. O resto do preenchimento vira nop em text_image.
+    Retorna o novo text_bin (endereço -> palavra, em ordem).
+    """
+    for addr in half:
+        hw = rvc_word(text_bin[addr])
+        if hw is None:
+            raise ValueError(f"instrução em {hex(addr)} não tem forma comprimida")
+        text_bin[addr] = hw
+    pads = [a for a, x in _align_starts(ir, text_bin, half) if a % 4 == 2 and x > 2] if ir is not None else []
+    if not pads:
+        return text_bin
+    for addr in pads:
+        text_bin[addr] = C_NOP
+        half.add(addr)
+    return OrderedDict(sorted(text_bin.items()))
+
+def text_size(ir, far=None, half=()):
+    """Bytes do .text segundo ir (até o fim da última instrução)."""
+    if not len(ir):
+        return 0
+    addr = ir.addrs[-1]
+    size = 2 if addr in half else (far or {}).get(addr) or OP_SIZE[ir.ops[-1]]
+    return addr + size - TEXT_BASE
+
+def report(size_before, ir, far, half):
+    """{'comprimidas', 'instrucoes', 'bytes_antes', 'bytes_depois', 'reducao'} de compress_text."""
+    after = text_size(ir, far, half)
+    return {
+        'comprimidas': len(half),
+        'instrucoes': len(ir),
+        'bytes_antes': size_before,
+        'bytes_depois': after,
+        'reducao': round(1 - after / size_before, 4) if size_before else 0.0,
+    }
+
+def format_report(rep):
+    return (f"RVC: {rep['comprimidas']} de {rep['instrucoes']} instruções comprimidas, .text "
+            f"{rep['bytes_antes']} -> {rep['bytes_depois']} bytes (-{100 * rep['reducao']:.1f}%)")
+
+def main():
+    ap = argparse.ArgumentParser(description="Compressão RV32C entre as passagens do aRVA")
+    ap.add_argument('infile', help="arquivo assembly de entrada")
+    ap.add_argument('outfile', nargs='?', help="grava a listagem do programa comprimido")
+    ap.add_argument('rawprefix', nargs='?', help="prefixo dos arquivos .text.raw/.data.raw")
+    opts = ap.parse_args()
+    with open(opts.infile, 'r', encoding='utf-8') as f:
+        lines, lexed, pp = preprocess(f.readlines(), opts.infile)
+    ir, symtab, data_bin, data_syms = pass_one(lines, lexed=lexed, where=pp and pp.where)
+    ir, far = relax_branches(ir, symtab)
+    before = text_size(ir, far)
+    ir, far, half = compress_text(ir, symtab, far)
+    print(format_report(report(before, ir, far, half)))
+    if opts.outfile:
+        text_bin = compress_words(pass_two(ir, symtab, data_syms, far=far, where=pp and pp.where), half, ir)
+        write_text_bin_file(text_bin, data_bin, opts.outfile, opts.rawprefix, half=half)
+
+if __name__ == '__main__':
+    main()
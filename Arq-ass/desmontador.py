@@ -0,0 +1,200 @@
+"""
+Desmontador em lote para os .text.raw gerados pelo aRVA.
+O segmento é mapeado sem cópia (numpy.memmap de uint32 little-endian) e os
+campos de todas as palavras (opcode, funct3, funct7, registradores e
+imediatos) são extraídos de uma vez com operações vetoriais. O mnemônico sai
+de uma tabela indexada por (opcode, funct3, funct7), montada a partir do
+DECODE_MAP do montador, então as duas pontas usam o mesmo INSTR_MAP.
+
+Cada palavra distinta é formatada uma única vez; só os branch/jal, que
+dependem do endereço, são formatados por ocorrência. Os alvos dos desvios
+viram labels, com o nome tirado do arquivo de mapa (aRVA.py --map) quando
+existe, ou L_<endereço> quando não; um alvo fora do .text (ou desalinhado)
+fica como endereço absoluto. A saída é um .s que o aRVA monta de volta
+para o mesmo .text.raw (e .data.raw, se ele também for desmontado).
+
+Uso: python desmontador.py prefixo.text.raw [-o saida.s] [--map ARQ] [--data ARQ] [-a]
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+
+from aRVA import TEXT_BASE, DATA_BASE, REG_MAP, INSTR_MAP, DECODE_MAP
+
+# nome da ABI de cada registrador (o último nome de REG_MAP vence: s0 em vez de fp)
+REG_NAMES = [f'x{i}' for i in range(32)]
+for _name, _n in REG_MAP.items():
+    if not _name.startswith('x'):
+        REG_NAMES[_n] = _name
+
+MNEMS = list(INSTR_MAP)
+FORMATS = 'RISBUJ'
+MNEM_FMT = np.array([FORMATS.index(INSTR_MAP[m][0]) for m in MNEMS], dtype=np.int8)
+MNEM_SHAMT = np.array([INSTR_MAP[m][4].endswith('shamt') for m in MNEMS])
+
+# (opcode << 10 | funct3 << 7 | funct7) -> índice em MNEMS, -1 se inválida.
+# Preenchida do mais genérico para o mais específico, na mesma prioridade de decode().
+DECODE_LUT = np.full(1 << 17, -1, dtype=np.int16)
+_lut = DECODE_LUT.reshape(128, 8, 128)
+for _wild in (2, 1, 0):
+    for (_op, _f3, _f7), _mnem in DECODE_MAP.items():
+        if (_f3 is None) + (_f7 is None) == _wild:
+            _lut[_op, slice(None) if _f3 is None else _f3, slice(None) if _f7 is None else _f7] = MNEMS.index(_mnem)
+
+def load_words(path):
+    """Palavras do segmento sem cópia (memmap); arquivo vazio vira array vazio."""
+    if os.path.getsize(path) < 4:
+        return np.zeros(0, dtype='<u4')
+    return np.memmap(path, dtype='<u4', mode='r', shape=(os.path.getsize(path) // 4,))
+
+def read_map_file(path):
+    """endereço -> [nomes] de um arquivo gravado por aRVA.write_map_file."""
+    syms = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('# Linhas'):
+                break   # daqui em diante é a origem das instruções, não símbolos
+            line = line.split('#', 1)[0].split()
+            if len(line) >= 2:
+                syms.setdefault(int(line[0], 16), []).append(line[1])
+    return syms
+
+def decode_fields(words):
+    """Campos de todas as palavras: (mnem, rd, rs1, rs2, imm) como arrays; mnem = -1 se inválida."""
+    w = np.asarray(words, dtype=np.uint32)
+    opcode = w & 0x7f
+    funct3 = (w >> 12) & 0x7
+    funct7 = w >> 25
+    mnem = DECODE_LUT[(opcode << 10) | (funct3 << 7) | funct7]
+    rd = ((w >> 7) & 0x1f).astype(np.int8)
+    rs1 = ((w >> 15) & 0x1f).astype(np.int8)
+    rs2 = ((w >> 20) & 0x1f).astype(np.int8)
+
+    s = w.view(np.int32)
+    imm_i = s >> 20
+    imm_s = ((s >> 25) << 5) | ((w >> 7) & 0x1f).astype(np.int32)
+    imm_b = (((s >> 31) << 12) | (((w >> 7) & 0x1) << 11) | (((w >> 25) & 0x3f) << 5)
+             | (((w >> 8) & 0xf) << 1)).astype(np.int32)
+    imm_u = (w & 0xfffff000).astype(np.int64)
+    imm_j = (((s >> 31) << 20) | (w & 0xff000) | (((w >> 20) & 0x1) << 11)
+             | (((w >> 21) & 0x3ff) << 1)).astype(np.int32)
+    fmt = np.where(mnem >= 0, MNEM_FMT[mnem], -1)
+    imm = np.select([fmt == 1, fmt == 2, fmt == 3, fmt == 4, fmt == 5],
+                    [imm_i, imm_s, imm_b, imm_u, imm_j], 0).astype(np.int64)
+    shamt = (mnem >= 0) & MNEM_SHAMT[mnem]
+    imm[shamt] = rs2[shamt]
+    return mnem, rd, rs1, rs2, imm
+
+def _render(m, rd, rs1, rs2, imm, label=None):
+    mnem = MNEMS[m]
+    ops = INSTR_MAP[mnem][4]
+    r = REG_NAMES
+    if ops == 'rd,rs1,rs2':
+        return f"    {mnem} {r[rd]}, {r[rs1]}, {r[rs2]}"
+    if ops == 'rd,rs1,imm' or ops == 'rd,rs1,shamt':
+        return f"    {mnem} {r[rd]}, {r[rs1]}, {imm}"
+    if ops == 'rd,mem':
+        return f"    {mnem} {r[rd]}, {imm}({r[rs1]})"
+    if ops == 'rs2,mem':
+        return f"    {mnem} {r[rs2]}, {imm}({r[rs1]})"
+    if ops == 'rd,imm':
+        return f"    {mnem} {r[rd]}, {imm:#x}"
+    if ops == 'rs1,rs2,label':
+        return f"    {mnem} {r[rs1]}, {r[rs2]}, {label}"
+    return f"    {mnem} {r[rd]}, {label}"
+
+def disassemble(words, symbols=None, addresses=False):
+    """Linhas de assembly para as palavras do .text (a partir de TEXT_BASE)."""
+    symbols = symbols or {}
+    n = len(words)
+    end = TEXT_BASE + 4*n
+    uniq, inv = np.unique(np.asarray(words), return_inverse=True)
+    mnem, rd, rs1, rs2, imm = decode_fields(uniq)
+    fmt = np.where(mnem >= 0, MNEM_FMT[mnem], -1)
+    pcrel_u = (fmt == 3) | (fmt == 5)
+
+    # palavras distintas formatadas uma vez; nos branch/jal falta só a label
+    rendered = np.empty(len(uniq), dtype=object)
+    for k, (m, d, s1, s2, im, w) in enumerate(zip(mnem.tolist(), rd.tolist(), rs1.tolist(),
+                                                  rs2.tolist(), imm.tolist(), uniq.tolist())):
+        if m < 0:
+            rendered[k] = f"    # palavra inválida {w:#010x}"
+        else:
+            rendered[k] = _render(m, d, s1, s2, im, '')
+    lines = rendered[inv]
+
+    # branch/jal: alvo = pc + imm, vira label (fora do .text, o endereço absoluto)
+    pos = np.flatnonzero(pcrel_u[inv])
+    targets = TEXT_BASE + 4*pos + imm[inv[pos]]
+    inside = (targets >= TEXT_BASE) & (targets <= end) & (targets & 3 == 0)
+    names = {a: v[0] for a, v in symbols.items() if TEXT_BASE <= a <= end}
+    for a in np.unique(targets[inside]).tolist():
+        names.setdefault(a, f"L_{a:08x}")
+    for p, k, t, ok in zip(pos.tolist(), inv[pos].tolist(), targets.tolist(), inside.tolist()):
+        if ok:
+            lines[p] = rendered[k] + names[t]
+        else:
+            lines[p] = rendered[k] + f"{t:#010x}"
+    lines = lines.tolist()
+
+    if addresses:
+        lines = [f"{line:<36}# {TEXT_BASE + 4*i:#010x}: {w:08x}"
+                 for i, (line, w) in enumerate(zip(lines, np.asarray(words).tolist()))]
+
+    # labels: todos os nomes do mapa e os alvos sintetizados, na ordem dos endereços
+    labels = {a: '\n'.join(f"{name}:" for name in v) for a, v in symbols.items() if TEXT_BASE <= a <= end}
+    for a, name in names.items():
+        if a not in labels:
+            labels[a] = f"{name}:"
+    out = ['.text']
+    prev = 0
+    for a in sorted(labels):
+        i = (a - TEXT_BASE) >> 2
+        out += lines[prev:i]
+        out.append(labels[a])
+        prev = i
+    out += lines[prev:]
+    return out
+
+def disassemble_data(data, symbols=None, per_line=16):
+    """Linhas .data com .byte, quebradas nos símbolos do segmento de dados."""
+    symbols = symbols or {}
+    end = DATA_BASE + len(data)
+    cuts = sorted(a - DATA_BASE for a in symbols if DATA_BASE <= a <= end)
+    out = ['.data']
+    bounds = sorted(set(cuts) | {len(data)})
+    prev = 0
+    for c in bounds:
+        for k in range(prev, c, per_line):
+            out.append("    .byte " + ", ".join(str(b) for b in data[k:min(k + per_line, c)]))
+        out += [f"{name}:" for name in symbols.get(DATA_BASE + c, ())]
+        prev = c
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Desmontador RV32I dos arquivos .text.raw")
+    ap.add_argument('textraw', help="arquivo .text.raw")
+    ap.add_argument('-o', '--out', help="arquivo .s de saída (padrão: saída padrão)")
+    ap.add_argument('--map', metavar='ARQ', help="símbolos (aRVA.py --map); padrão: prefixo.map se existir")
+    ap.add_argument('--data', metavar='ARQ', help="também desmonta o .data.raw (padrão: prefixo.data.raw se existir)")
+    ap.add_argument('-a', '--enderecos', action='store_true', help="comenta cada linha com endereço e palavra")
+    opts = ap.parse_args()
+    prefix = opts.textraw[:-len('.text.raw')] if opts.textraw.endswith('.text.raw') else opts.textraw
+    map_path = opts.map or (prefix + '.map' if os.path.exists(prefix + '.map') else None)
+    data_path = opts.data or (prefix + '.data.raw' if os.path.exists(prefix + '.data.raw') else None)
+
+    symbols = read_map_file(map_path) if map_path else {}
+    lines = disassemble(load_words(opts.textraw), symbols, opts.enderecos)
+    if data_path:
+        with open(data_path, 'rb') as f:
+            lines += disassemble_data(f.read(), symbols)
+    if opts.out:
+        with open(opts.out, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+    else:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,433 @@
+"""
+Simulação de caches L1 (instruções e dados) sobre o traço de memória de um
+programa RV32I.
+O programa roda no simulador com trace_memory=True: as buscas de instrução a
+partir de TEXT_BASE formam o traço da I-cache e os endereços de
+lw/lh/lb/sw/sh/sb o da D-cache. Cada configuração é reproduzida nos dois:
+
+ - tamanho, bloco e associatividade (1 = mapeamento direto, 0 = totalmente
+   associativa)
+ - substituição LRU, FIFO ou aleatória (semente fixa: resultado repetível)
+ - write-back com write-allocate (wb) ou write-through sem write-allocate (wt)
+
+Uma configuração é escrita 'tamanho:bloco:assoc:politica:escrita', como
+4K:32:2:lru:wb; várias de uma vez com -c repetido ou com as listas de
+--tamanhos/--blocos/--assoc/--politicas/--escrita (todas as combinações).
+
+O preparo é vetorial (numpy): endereço -> bloco, e cada sequência de acessos
+seguidos ao mesmo bloco vira um só, já que os seguintes acertam sem mudar o
+estado (fica guardado se algum sujou o bloco e quantos stores vêm antes do
+primeiro load, que é o que conta sem write-allocate). Isso só depende do
+tamanho do bloco, então é feito uma vez por bloco para a varredura inteira.
+Com mapeamento direto não há escolha de vítima e tudo é vetorial, como o
+preditor de 1 bit de preditor.py: ordena por conjunto e compara com o acesso
+anterior do mesmo conjunto. As associativas rodam num laço sobre as
+sequências já comprimidas, com um OrderedDict (tag -> sujo) por conjunto.
+
+AMAT = tempo de acerto + taxa de falhas * penalidade de falha, por cache e
+ponderado pelo número de acessos de cada uma (as escritas do write-through
+vão para um buffer e não entram no AMAT, só no tráfego). Cada acesso conta no
+bloco do endereço inicial (um lw desalinhado que cruza blocos conta uma vez).
+
+Uso: python hierarquia_cache.py programa.s [-c 4K:32:2:lru:wb ...] [--json ARQ]
+     python hierarquia_cache.py programa.s --tamanhos 1K,4K,16K --blocos 16,32,64 --assoc 1,2,4
+     python hierarquia_cache.py --raw prefixo | --traco traco.npz    (como em preditor.py)
+"""
+import json
+import time
+import argparse
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+
+from aRVA import TEXT_BASE, assemble
+from simulador import Simulator
+
+POLICIES = ('lru', 'fifo', 'aleatoria')
+WRITE_POLICIES = ('wb', 'wt')
+HIT_TIME = 1
+MISS_PENALTY = 100
+
+# varredura padrão (sem -c e sem listas)
+DEFAULT_SIZES = '1K,4K,16K'
+DEFAULT_BLOCKS = '16,32,64'
+DEFAULT_ASSOC = '1,2,4'
+
+STORE_BYTES = np.array([0, 1, 2, 4], dtype=np.int64)   # bytes escritos por código de acesso
+
+class MemoryTrace:
+    """Traço de memória: buscas de instrução (pcs) e acessos a dados (endereço e código do acesso)."""
+    __slots__ = ('fetch', 'data', 'codes')
+
+    def __init__(self, fetch, data, codes):
+        self.fetch = np.asarray(fetch, dtype=np.uint32)
+        self.data = np.asarray(data, dtype=np.uint32)
+        self.codes = np.asarray(codes, dtype=np.uint8)   # simulador.MEM_CODES: 0 load, 1/2/3 sb/sh/sw
+
+    @classmethod
+    def from_simulator(cls, sim):
+        """Traço de um Simulator criado com trace_memory=True (depois de run())."""
+        starts = np.frombuffer(sim.fetch_blocks, dtype=np.uint32)
+        lens = np.asarray(sim.lens, dtype=np.uint32)[starts]
+        # instrução k do bloco que começa em s: pc = TEXT_BASE + 4*(s + k), tudo em uint32
+        # (a conta é módulo 2**32 e o resultado cabe): 100M buscas ocupam 400 MB
+        ends = np.cumsum(lens, dtype=np.uint64)
+        pcs = np.arange(int(ends[-1]) if len(ends) else 0, dtype=np.uint32)
+        pcs -= np.repeat((ends - lens).astype(np.uint32) - starts, lens)
+        pcs <<= 2
+        pcs += TEXT_BASE
+        mem = np.frombuffer(sim.mem_trace, dtype=np.uint64)
+        return cls(pcs, (mem >> 2).astype(np.uint32), (mem & 3).astype(np.uint8))
+
+    @property
+    def stores(self):
+        return self.codes != 0
+
+    def save(self, path):
+        np.savez_compressed(path, fetch=self.fetch, data=self.data, codes=self.codes)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z['fetch'], z['data'], z['codes'])
+
+class CacheConfig:
+    """Uma cache: tamanho e bloco em bytes, vias (0 = totalmente associativa) e políticas."""
+    __slots__ = ('size', 'block', 'assoc', 'policy', 'write')
+
+    def __init__(self, size, block, assoc=1, policy='lru', write='wb'):
+        for name, v in (('tamanho', size), ('bloco', block)):
+            if v <= 0 or v & (v - 1):
+                raise ValueError(f"{name} deve ser potência de 2: {v}")
+        if block < 4 or block > size:
+            raise ValueError(f"bloco de {block} bytes não cabe numa cache de {size}")
+        lines = size // block
+        if assoc < 0 or assoc > lines or (assoc and assoc & (assoc - 1)):
+            raise ValueError(f"associatividade {assoc} inválida para {lines} blocos")
+        if policy not in POLICIES:
+            raise ValueError(f"política de substituição desconhecida '{policy}' ({', '.join(POLICIES)})")
+        if write not in WRITE_POLICIES:
+            raise ValueError(f"política de escrita desconhecida '{write}' ({', '.join(WRITE_POLICIES)})")
+        self.size, self.block, self.assoc, self.policy, self.write = size, block, assoc, policy, write
+
+    @property
+    def ways(self):
+        return self.assoc or self.size // self.block
+
+    @property
+    def set_bits(self):
+        return (self.size // self.block // self.ways).bit_length() - 1
+
+    @property
+    def block_bits(self):
+        return self.block.bit_length() - 1
+
+    @classmethod
+    def parse(cls, spec):
+        """'4K:32:2:lru:wb' (os três últimos campos são opcionais)."""
+        parts = spec.split(':')
+        if not 2 <= len(parts) <= 5:
+            raise ValueError(f"configuração '{spec}': use tamanho:bloco[:assoc[:politica[:escrita]]]")
+        size, block = parse_size(parts[0]), parse_size(parts[1])
+        assoc = 0 if len(parts) > 2 and parts[2] in ('fa', 'total') else int(parts[2]) if len(parts) > 2 else 1
+        return cls(size, block, assoc, *[p.lower() for p in parts[3:]])
+
+    def __str__(self):
+        assoc = 'fa' if self.assoc == 0 else self.assoc
+        return f"{format_size(self.size)}:{self.block}:{assoc}:{self.policy}:{self.write}"
+
+def parse_size(text):
+    """'4K' -> 4096, '1M' -> 1048576, '64' -> 64."""
+    text = text.strip().upper()
+    mult = {'K': 1 << 10, 'M': 1 << 20}.get(text[-1:], 1)
+    try:
+        return int(text[:-1] if mult > 1 else text) * mult
+    except ValueError:
+        raise ValueError(f"tamanho inválido '{text}'") from None
+
+def format_size(n):
+    for unit, mult in (('M', 1 << 20), ('K', 1 << 10)):
+        if n >= mult and n % mult == 0:
+            return f"{n // mult}{unit}"
+    return str(n)
+
+class Runs:
+    """Acessos seguidos ao mesmo bloco, comprimidos (ver o topo do arquivo)."""
+    __slots__ = ('blocks', 'lengths', 'dirty', 'lead', 'accesses', 'store_bytes')
+
+    def __init__(self, addrs, codes, block_bits):
+        n = len(addrs)
+        self.accesses = n
+        self.store_bytes = int(STORE_BYTES[codes].sum())
+        if not n:
+            self.blocks = self.lengths = self.dirty = self.lead = np.zeros(0, dtype=np.int64)
+            return
+        blk = addrs >> np.uint32(block_bits)
+        new = np.empty(n, dtype=bool)
+        new[0] = True
+        np.not_equal(blk[1:], blk[:-1], out=new[1:])
+        starts = np.flatnonzero(new)
+        self.blocks = blk[starts]
+        self.lengths = np.diff(np.append(starts, n))
+        stores = codes != 0
+        if not stores.any():   # buscas de instrução e traços só de loads
+            self.dirty = np.zeros(len(starts), dtype=bool)
+            self.lead = np.zeros(len(starts), dtype=np.int64)
+            return
+        self.dirty = np.maximum.reduceat(stores, starts)
+        # stores antes do primeiro load de cada sequência (= comprimento se não houver load)
+        first_load = np.minimum.reduceat(np.where(stores, n, np.arange(n)), starts)
+        self.lead = np.minimum(first_load - starts, self.lengths)
+
+def replay_direct(runs, cfg):
+    """(falhas, blocos trazidos, write-backs) de uma cache de mapeamento direto, sem laço."""
+    if not len(runs.blocks):
+        return 0, 0, 0
+    sets = runs.blocks & ((1 << cfg.set_bits) - 1)
+    order = np.argsort(sets, kind='stable')
+    s_set = sets[order]
+    s_tag = runs.blocks[order] >> cfg.set_bits
+    same_set = np.zeros(len(order), dtype=bool)
+    same_set[1:] = s_set[1:] == s_set[:-1]
+    if cfg.write == 'wb':
+        # o bloco residente é o do acesso anterior no mesmo conjunto
+        hit = np.zeros(len(order), dtype=bool)
+        hit[1:] = same_set[1:] & (s_tag[1:] == s_tag[:-1])
+        miss = np.flatnonzero(~hit)
+        # cada falha começa uma estadia; a anterior no mesmo conjunto sai (suja se teve store)
+        stay_dirty = np.maximum.reduceat(runs.dirty[order], miss)
+        evicted = same_set[miss[1:]]
+        return len(miss), len(miss), int(np.count_nonzero(stay_dirty[:-1] & evicted))
+    # sem write-allocate só os loads trazem blocos: o residente é o da última sequência com load
+    lead = runs.lead[order]
+    has_load = lead < runs.lengths[order]
+    last = np.maximum.accumulate(np.where(has_load, np.arange(len(order)), -1))
+    prev = np.empty_like(last)
+    prev[0] = -1
+    prev[1:] = last[:-1]
+    ok = prev >= 0
+    resident = np.zeros(len(order), dtype=bool)
+    resident[ok] = (s_set[prev[ok]] == s_set[ok]) & (s_tag[prev[ok]] == s_tag[ok])
+    missed = ~resident
+    return (int(lead[missed].sum()) + int(np.count_nonzero(has_load & missed)),
+            int(np.count_nonzero(has_load & missed)), 0)
+
+def _first_touch(runs, sel, write_back):
+    """(falhas, blocos trazidos) das sequências em sel quando nenhum bloco sai da cache:
+    só falha o primeiro acesso a cada bloco (sem write-allocate, até o primeiro load)."""
+    blocks = runs.blocks[sel]
+    if not len(blocks):
+        return 0, 0
+    order = np.argsort(blocks, kind='stable')
+    s_blk = blocks[order]
+    first = np.empty(len(order), dtype=bool)
+    first[0] = True
+    np.not_equal(s_blk[1:], s_blk[:-1], out=first[1:])
+    if write_back:
+        n = int(np.count_nonzero(first))
+        return n, n
+    lead = runs.lead[sel][order]
+    has_load = lead < runs.lengths[sel][order]
+    # residente = alguma sequência anterior do mesmo bloco teve load
+    before = np.cumsum(has_load) - has_load
+    base = before[np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))]
+    missed = before == base
+    loads = int(np.count_nonzero(has_load & missed))
+    return int(lead[missed].sum()) + loads, loads
+
+def replay_assoc(runs, cfg, seed=0):
+    """(falhas, blocos trazidos, write-backs) de uma cache associativa.
+
+    Conjuntos que recebem no máximo 'vias' blocos distintos nunca escolhem
+    vítima: são contados de forma vetorial (_first_touch). Só as sequências
+    dos outros passam pelo laço.
+    """
+    set_bits = cfg.set_bits
+    mask = (1 << set_bits) - 1
+    ways = cfg.ways
+    lru = cfg.policy == 'lru'
+    rand = cfg.policy == 'aleatoria'
+    write_back = cfg.write == 'wb'
+    set_of = runs.blocks & mask
+    distinct = np.bincount(np.unique(runs.blocks) & mask, minlength=1 << set_bits)
+    busy = (distinct > ways)[set_of]
+    misses, fills = _first_touch(runs, ~busy, write_back)
+    writebacks = 0
+    victims = iter(np.random.default_rng(seed).integers(0, ways, len(runs.blocks)).tolist()) if rand else None
+    sets = [OrderedDict() for _ in range(1 << set_bits)]
+    for b, n, dirty, lead in zip(runs.blocks[busy].tolist(), runs.lengths[busy].tolist(),
+                                 runs.dirty[busy].tolist(), runs.lead[busy].tolist()):
+        s = sets[b & mask]
+        tag = b >> set_bits
+        if tag in s:
+            if lru:
+                s.move_to_end(tag)
+            if write_back and dirty:
+                s[tag] = True
+            continue
+        if write_back:
+            misses += 1
+        else:
+            misses += lead   # os stores antes do primeiro load não alocam
+            if lead == n:
+                continue
+            misses += 1
+            dirty = False
+        fills += 1
+        if len(s) >= ways:
+            if rand:
+                old = s.pop(next(itertools.islice(s, next(victims), None)))
+            else:
+                old = s.popitem(last=False)[1]
+            writebacks += old
+        s[tag] = dirty
+    return misses, fills, writebacks
+
+def simulate(runs, cfg, hit_time=HIT_TIME, penalty=MISS_PENALTY, seed=0):
+    """Estatísticas de uma cache sobre as sequências comprimidas de um traço."""
+    if cfg.ways == 1:
+        misses, fills, writebacks = replay_direct(runs, cfg)
+    else:
+        misses, fills, writebacks = replay_assoc(runs, cfg, seed)
+    n = runs.accesses
+    rate = misses / n if n else 0.0
+    return {
+        'acessos': n,
+        'falhas': misses,
+        'taxa_falhas': rate,
+        'amat': hit_time + rate * penalty,
+        'write_backs': writebacks,
+        'bytes_lidos': fills * cfg.block,
+        # write-through: cada store vai para a memória; write-back: os blocos sujos que saem
+        'bytes_escritos': runs.store_bytes if cfg.write == 'wt' else writebacks * cfg.block,
+    }
+
+def sweep(trace, configs, hit_time=HIT_TIME, penalty=MISS_PENALTY, seed=0):
+    """Roda cada configuração como I-cache e D-cache; retorna uma lista de resultados.
+
+    As sequências comprimidas são calculadas uma vez por tamanho de bloco.
+    """
+    fetch_codes = np.zeros(len(trace.fetch), dtype=np.uint8)
+    prepared = {}
+    results = []
+    for cfg in configs:
+        t = time.perf_counter()
+        if cfg.block not in prepared:
+            prepared[cfg.block] = (Runs(trace.fetch, fetch_codes, cfg.block_bits),
+                                   Runs(trace.data, trace.codes, cfg.block_bits))
+        i_runs, d_runs = prepared[cfg.block]
+        icache = simulate(i_runs, cfg, hit_time, penalty, seed)
+        dcache = simulate(d_runs, cfg, hit_time, penalty, seed)
+        n = icache['acessos'] + dcache['acessos']
+        results.append({
+            'config': str(cfg),
+            'icache': icache,
+            'dcache': dcache,
+            'amat': (icache['amat'] * icache['acessos'] + dcache['amat'] * dcache['acessos']) / n if n else 0.0,
+            'tempo': time.perf_counter() - t,
+        })
+    return results
+
+def sweep_configs(sizes, blocks, assocs, policies, writes):
+    """Todas as combinações válidas das listas (as que não cabem são puladas)."""
+    out = []
+    for size, block, assoc, policy, write in itertools.product(sizes, blocks, assocs, policies, writes):
+        if assoc == 1 and policy != policies[0]:
+            continue   # mapeamento direto: a política de substituição não muda nada
+        try:
+            out.append(CacheConfig(size, block, assoc, policy, write))
+        except ValueError:
+            continue
+    return out
+
+def _list(text, conv=str):
+    return [conv(x) for x in text.split(',') if x.strip()]
+
+def _assoc(text):
+    return 0 if text.strip() in ('fa', 'total') else int(text)
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulação de caches L1 de instruções e de dados")
+    ap.add_argument('infile', nargs='?', help="arquivo assembly a montar e executar")
+    ap.add_argument('--raw', metavar='PREFIXO', help="executa PREFIXO.text.raw / PREFIXO.data.raw")
+    ap.add_argument('--traco', metavar='ARQ', help="usa um traço salvo (.npz) em vez de executar")
+    ap.add_argument('--salvar-traco', metavar='ARQ', help="grava o traço de memória em ARQ (.npz)")
+    ap.add_argument('--max-steps', type=int, default=100_000_000)
+    ap.add_argument('-c', '--config', action='append', default=[], metavar='SPEC',
+                    help="configuração tamanho:bloco:assoc:politica:escrita, ex. 4K:32:2:lru:wb (repetível)")
+    ap.add_argument('--tamanhos', help=f"tamanhos a varrer (padrão sem -c: {DEFAULT_SIZES})")
+    ap.add_argument('--blocos', help=f"blocos a varrer, em bytes (padrão: {DEFAULT_BLOCKS})")
+    ap.add_argument('--assoc', help=f"associatividades a varrer, 0 = total (padrão: {DEFAULT_ASSOC})")
+    ap.add_argument('--politicas', default='lru', help=f"substituição a varrer: {','.join(POLICIES)}")
+    ap.add_argument('--escrita', default='wb', help="escrita a varrer: wb (write-back), wt (write-through)")
+    ap.add_argument('--acerto', type=float, default=HIT_TIME, help="tempo de acerto, em ciclos")
+    ap.add_argument('--penalidade', type=float, default=MISS_PENALTY, help="penalidade de falha, em ciclos")
+    ap.add_argument('--semente', type=int, default=0, help="semente da substituição aleatória")
+    ap.add_argument('--json', metavar='ARQ', help="grava os resultados em JSON ('-' = saída padrão)")
+    opts = ap.parse_args()
+
+    try:
+        configs = [CacheConfig.parse(spec) for spec in opts.config]
+        policies, writes = _list(opts.politicas.lower()), _list(opts.escrita.lower())
+        for p in policies:
+            if p not in POLICIES:
+                raise ValueError(f"política de substituição desconhecida '{p}' ({', '.join(POLICIES)})")
+        for w in writes:
+            if w not in WRITE_POLICIES:
+                raise ValueError(f"política de escrita desconhecida '{w}' ({', '.join(WRITE_POLICIES)})")
+        if not configs or opts.tamanhos or opts.blocos or opts.assoc:
+            configs += sweep_configs(_list(opts.tamanhos or DEFAULT_SIZES, parse_size),
+                                     _list(opts.blocos or DEFAULT_BLOCKS, parse_size),
+                                     _list(opts.assoc or DEFAULT_ASSOC, _assoc), policies, writes)
+    except ValueError as e:
+        ap.error(str(e))
+    if not configs:
+        ap.error("nenhuma configuração válida")
+
+    if opts.traco:
+        trace = MemoryTrace.load(opts.traco)
+    else:
+        if opts.raw:
+            with open(opts.raw + '.text.raw', 'rb') as f:
+                text = f.read()
+            try:
+                with open(opts.raw + '.data.raw', 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = b''
+            sim = Simulator(text, data, trace_memory=True)
+        elif opts.infile:
+            with open(opts.infile, 'r', encoding='utf-8') as f:
+                text_bin, data_bin, symtab = assemble(f.readlines(), path=opts.infile)
+            sim = Simulator.from_assembly(text_bin, data_bin, trace_memory=True)
+        else:
+            ap.error("informe um arquivo .s, --raw ou --traco")
+        steps = sim.run(opts.max_steps)
+        trace = MemoryTrace.from_simulator(sim)
+        print(f"Instruções executadas: {steps}")
+    if opts.salvar_traco:
+        trace.save(opts.salvar_traco)
+
+    n_stores = int(np.count_nonzero(trace.stores))
+    print(f"Buscas: {len(trace.fetch)}; acessos a dados: {len(trace.data)} ({n_stores} stores)")
+    results = sweep(trace, configs, opts.acerto, opts.penalidade, opts.semente)
+    print(f"{'configuração':<22} {'falhas I':>9} {'falhas D':>9} {'AMAT I':>8} {'AMAT D':>8} {'AMAT':>8}"
+          f" {'lidos':>10} {'escritos':>10} {'tempo':>8}")
+    for r in results:
+        i, d = r['icache'], r['dcache']
+        print(f"{r['config']:<22} {100*i['taxa_falhas']:8.2f}% {100*d['taxa_falhas']:8.2f}% {i['amat']:8.2f}"
+              f" {d['amat']:8.2f} {r['amat']:8.2f} {i['bytes_lidos'] + d['bytes_lidos']:>10}"
+              f" {d['bytes_escritos']:>10} {r['tempo']:7.3f}s")
+    if opts.json:
+        text = json.dumps({'buscas': len(trace.fetch), 'acessos_dados': len(trace.data), 'stores': n_stores,
+                           'acerto': opts.acerto, 'penalidade': opts.penalidade, 'resultados': results},
+                          indent=2, ensure_ascii=False)
+        if opts.json == '-':
+            print(text)
+        else:
+            with open(opts.json, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+
+if __name__ == '__main__':
+    main()
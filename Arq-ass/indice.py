@@ -0,0 +1,178 @@
+"""
+Índice endereço -> fonte para os binários do aRVA.
+Guarda, ordenados por endereço, o início de cada instrução do .text com o
+arquivo e a linha de origem (arrays 'I'/'H', sem um objeto por entrada), e
+os símbolos ordenados por endereço. Uma consulta faz duas buscas binárias:
+a instrução que contém o endereço (uma 'la' ou 'li' cobre as suas palavras) e
+a label mais próxima antes dele, então custa O(log n) mesmo com milhões de
+endereços.
+
+O índice pode ser gravado em binário (compacto, carregado sem análise de
+texto) com save/load, ou como seção '# Linhas' do arquivo de mapa do aRVA.
+
+Uso: python indice.py programa.idx 0x400010 0x400abc ...
+"""
+import sys
+import json
+import struct
+import argparse
+from array import array
+from bisect import bisect_right
+
+from aRVA import OP_SIZE
+
+INDEX_MAGIC = b'RVIX'
+
+def _le(arr):
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+class SourceIndex:
+    __slots__ = ('files', 'addrs', 'lines', 'file_ids', 'end', 'sym_addrs', 'sym_names')
+
+    def __init__(self, files=('<entrada>',)):
+        self.files = list(files)
+        self.addrs = array('I')       # início de cada instrução, crescente
+        self.lines = array('I')       # linha de origem (1 = primeira)
+        self.file_ids = array('H')    # índice em files
+        self.end = 0                  # primeiro endereço depois da última instrução
+        self.sym_addrs = array('I')
+        self.sym_names = []
+
+    def add(self, addr, line, size=4, file_id=0):
+        """Acrescenta uma instrução; os endereços devem vir em ordem crescente."""
+        self.addrs.append(addr)
+        self.lines.append(line)
+        self.file_ids.append(file_id)
+        self.end = addr + size
+
+    def extend(self, addrs, lines, end, file_id=0):
+        """Acrescenta instruções em bloco; end é o primeiro endereço depois da última."""
+        self.addrs.extend(array('I', addrs))
+        self.lines.extend(array('I', lines))
+        self.file_ids.extend(array('H', [file_id]) * len(addrs))
+        self.end = end
+
+    def set_origins(self, files, origin):
+        """Troca as linhas do programa expandido pela origem de cada uma.
+
+        origin(linha) -> (índice em files, linha no arquivo), como em
+        aRVA.Preprocessor.origin.
+        """
+        self.files = list(files)
+        file_ids, lines = array('H'), array('I')
+        for ln in self.lines:
+            fid, line = origin(ln)
+            file_ids.append(fid)
+            lines.append(line)
+        self.file_ids, self.lines = file_ids, lines
+
+    def set_symbols(self, symtab):
+        pairs = sorted((a, n) for n, a in symtab.items())
+        self.sym_addrs = array('I', (a for a, _ in pairs))
+        self.sym_names = [n for _, n in pairs]
+
+    @classmethod
+    def from_text(cls, ir, symtab, filename='<entrada>', far=None):
+        """Índice a partir do .text de pass_one (aRVA.TextIR) e da tabela de símbolos.
+
+        far: tamanhos fora do padrão (endereço -> bytes): desvios longos de
+        aRVA.relax_branches e instruções de 16 bits de compressao.py.
+        """
+        idx = cls((filename,))
+        if len(ir):
+            idx.extend(ir.addrs, ir.lines, 0)
+            last = ir.addrs[-1]
+            idx.end = last + ((far or {}).get(last) or OP_SIZE[ir.ops[-1]])
+        idx.set_symbols(symtab)
+        return idx
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def nearest_symbol(self, addr):
+        """(nome, deslocamento) do último símbolo em ou antes de addr, ou None."""
+        k = bisect_right(self.sym_addrs, addr) - 1
+        if k < 0:
+            return None
+        return self.sym_names[k], addr - self.sym_addrs[k]
+
+    def lookup(self, addr):
+        """(arquivo, linha, símbolo, deslocamento) do endereço, ou None fora do .text indexado."""
+        k = bisect_right(self.addrs, addr) - 1
+        if k < 0 or addr >= self.end:
+            return None
+        sym = self.nearest_symbol(addr)
+        name, off = sym if sym else (None, None)
+        return self.files[self.file_ids[k]], self.lines[k], name, off
+
+    def describe(self, addr):
+        """Texto 'arquivo:linha (símbolo+0x..)' para mensagens e traços."""
+        r = self.lookup(addr)
+        if r is None:
+            sym = self.nearest_symbol(addr)
+            return f"{addr:#010x}" + (f" ({sym[0]}+{sym[1]:#x})" if sym else "")
+        f, line, name, off = r
+        return f"{f}:{line}" + (f" ({name}+{off:#x})" if name is not None else "")
+
+    def to_bytes(self):
+        header = json.dumps({'files': self.files, 'n': len(self.addrs), 'end': self.end,
+                             'symbols': self.sym_names}).encode('utf-8')
+        return b''.join([INDEX_MAGIC, struct.pack('<I', len(header)), header,
+                         _le(self.addrs), _le(self.lines), _le(self.file_ids), _le(self.sym_addrs)])
+
+    @classmethod
+    def from_bytes(cls, buf):
+        if buf[:4] != INDEX_MAGIC:
+            raise ValueError("arquivo de índice inválido (magic)")
+        (hlen,) = struct.unpack_from('<I', buf, 4)
+        h = json.loads(bytes(buf[8:8+hlen]).decode('utf-8'))
+        idx = cls(h['files'])
+        idx.end = h['end']
+        idx.sym_names = h['symbols']
+        n, m = h['n'], len(h['symbols'])
+        pos = 8 + hlen
+        for attr, code, count in (('addrs', 'I', n), ('lines', 'I', n), ('file_ids', 'H', n),
+                                  ('sym_addrs', 'I', m)):
+            arr = array(code)
+            size = arr.itemsize * count
+            arr.frombytes(buf[pos:pos+size])
+            if sys.byteorder == 'big':
+                arr.byteswap()
+            setattr(idx, attr, arr)
+            pos += size
+        return idx
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def listing_lines(self):
+        """Linhas da seção '# Linhas' do mapa: 'endereço arquivo:linha símbolo+desl'."""
+        names, sym_addrs = self.sym_names, self.sym_addrs
+        k = -1
+        for addr, line, fid in zip(self.addrs, self.lines, self.file_ids):
+            while k + 1 < len(sym_addrs) and sym_addrs[k + 1] <= addr:
+                k += 1
+            sym = f" {names[k]}+{addr - sym_addrs[k]:#x}" if k >= 0 else ""
+            yield f"{addr:#010x} {self.files[fid]}:{line}{sym}\n"
+
+def main():
+    ap = argparse.ArgumentParser(description="Consulta endereço -> linha de origem")
+    ap.add_argument('index', help="índice gravado com aRVA.py --index")
+    ap.add_argument('addrs', nargs='+', help="endereços (ex: 0x400010)")
+    opts = ap.parse_args()
+    idx = SourceIndex.load(opts.index)
+    for a in opts.addrs:
+        addr = int(a, 0)
+        print(f"{addr:#010x}: {idx.describe(addr)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Arquivos objeto relocáveis e ligador para o montador aRVA.
+Cada arquivo .s é montado separadamente (em paralelo, num pool de processos)
+para um objeto com o conteúdo das seções, os símbolos definidos/exportados
+e os registros de relocação; o ligador junta os objetos e corrige as
+referências entre eles.
+
+Formato do objeto (.o):
+ - b'RVO1' + tamanho (u32 little-endian) do cabeçalho JSON
+ - cabeçalho JSON: símbolos {nome: [seção, offset]}, globais, relocações
+   [[tipo, offset no .text, símbolo], ...], tamanhos das seções e o maior
+   .align do .text (text_align)
+ - bytes do .text seguidos dos bytes do .data
+
+Tipos de relocação: 'B' (branch), 'J' (jal), 'LA' (par auipc + addi).
+
+No programa ligado, o .text de cada objeto começa num múltiplo do maior
+text_align entre os objetos (o espaço entre eles vira nop), e a tabela de
+símbolos traz os globais pelo nome e os locais como 'objeto:nome'.
+
+Uso: python ligador.py saida.txt a.s b.s c.o [-r raw_prefix] [--elf ARQ] [-j N]
+     python ligador.py -c a.s b.s      (só gera a.o, b.o)
+"""
+import os
+import sys
+import json
+import struct
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from aRVA import (TEXT_BASE, DATA_BASE, NOP_WORD, assemble, text_image, la_words,
+                  _pack_b, _pack_j, B_RANGE, J_RANGE, write_text_bin_file, write_elf_file)
+
+OBJ_MAGIC = b'RVO1'
+# alinhamento do .data de cada objeto dentro do .data ligado (cobre .align até 4)
+DATA_ALIGN = 16
+# alinhamento mínimo do .text de um objeto (uma palavra)
+TEXT_ALIGN = 4
+
+class ObjectFile:
+    __slots__ = ('name', 'text', 'data', 'symbols', 'globls', 'relocs', 'text_align')
+
+    def __init__(self, name, text, data, symbols, globls, relocs, text_align=TEXT_ALIGN):
+        self.name = name
+        self.text = bytes(text)      # .text a partir de offset 0
+        self.data = bytes(data)      # .data a partir de offset 0
+        self.symbols = symbols       # nome -> ('text' | 'data', offset)
+        self.globls = set(globls)    # nomes exportados
+        self.relocs = relocs         # [(tipo, offset no .text, símbolo)]
+        self.text_align = text_align # maior .align do .text, em bytes
+
+    def undefined(self):
+        return sorted({sym for _, _, sym in self.relocs if sym not in self.symbols})
+
+    def to_bytes(self):
+        header = json.dumps({
+            'name': self.name,
+            'symbols': self.symbols,
+            'globals': sorted(self.globls),
+            'relocs': self.relocs,
+            'text_size': len(self.text),
+            'data_size': len(self.data),
+            'text_align': self.text_align,
+        }).encode('utf-8')
+        return OBJ_MAGIC + struct.pack('<I', len(header)) + header + self.text + self.data
+
+    @classmethod
+    def from_bytes(cls, buf):
+        if buf[:4] != OBJ_MAGIC:
+            raise ValueError("arquivo objeto inválido (magic)")
+        (hlen,) = struct.unpack_from('<I', buf, 4)
+        h = json.loads(buf[8:8+hlen].decode('utf-8'))
+        t0 = 8 + hlen
+        t1 = t0 + h['text_size']
+        return cls(h['name'], buf[t0:t1], buf[t1:t1+h['data_size']],
+                   {k: tuple(v) for k, v in h['symbols'].items()},
+                   h['globals'], [tuple(r) for r in h['relocs']], h.get('text_align', TEXT_ALIGN))
+
+def assemble_object(lines, name='<entrada>'):
+    """Monta um arquivo em modo objeto (símbolos externos viram relocações)."""
+    relocs, globls, aligns = [], set(), []
+    text_bin, data_bin, symtab = assemble(lines, relocs, globls, path=name, aligns=aligns)
+    symbols = {}
+    for sym, addr in symtab.items():
+        if addr >= DATA_BASE:
+            symbols[sym] = ('data', addr - DATA_BASE)
+        else:
+            symbols[sym] = ('text', addr - TEXT_BASE)
+    for sym in globls:
+        if sym not in symbols:
+            raise ValueError(f"{name}: símbolo global {sym} não definido")
+    return ObjectFile(name, text_image(text_bin), data_bin, symbols, globls, relocs,
+                      max(aligns, default=TEXT_ALIGN))
+
+def assemble_file(path):
+    """Monta um .s para objeto; roda nos processos do pool."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return assemble_object(f.readlines(), path).to_bytes()
+
+def load_object(path):
+    with open(path, 'rb') as f:
+        return ObjectFile.from_bytes(f.read())
+
+def link(objects):
+    """Liga os objetos na ordem dada e retorna (text_bin, data_bin, symtab) como assemble().
+
+    symtab traz os símbolos globais pelo nome e os locais de cada objeto
+    como 'objeto:nome' (só os globais resolvem referências entre objetos).
+    """
+    # posiciona as seções de cada objeto
+    text_align = max([TEXT_ALIGN] + [obj.text_align for obj in objects])
+    text_bases, data_bases = [], []
+    text_off = data_off = 0
+    for obj in objects:
+        text_off = (text_off + text_align - 1) & ~(text_align - 1)
+        text_bases.append(TEXT_BASE + text_off)
+        text_off += len(obj.text)
+        data_off = (data_off + DATA_ALIGN - 1) & ~(DATA_ALIGN - 1)
+        data_bases.append(DATA_BASE + data_off)
+        data_off += len(obj.data)
+
+    def addr_of(i, sym):
+        sec, off = objects[i].symbols[sym]
+        return (text_bases[i] if sec == 'text' else data_bases[i]) + off
+
+    # tabela de símbolos globais
+    globals_ = {}
+    for i, obj in enumerate(objects):
+        for sym in obj.globls:
+            if sym in globals_:
+                raise ValueError(f"símbolo global {sym} definido em mais de um objeto ({obj.name})")
+            globals_[sym] = addr_of(i, sym)
+
+    nop = struct.pack('<I', NOP_WORD)
+    text = bytearray()
+    data = bytearray(data_off)
+    for i, obj in enumerate(objects):
+        text += nop * ((text_bases[i] - TEXT_BASE - len(text)) >> 2)
+        text += obj.text
+        d0 = data_bases[i] - DATA_BASE
+        data[d0:d0+len(obj.data)] = obj.data
+
+    # aplica as relocações
+    word = struct.Struct('<I')
+    for i, obj in enumerate(objects):
+        for typ, off, sym in obj.relocs:
+            if sym in obj.symbols:
+                target = addr_of(i, sym)
+            elif sym in globals_:
+                target = globals_[sym]
+            else:
+                raise ValueError(f"{obj.name}: símbolo indefinido {sym}")
+            pos = text_bases[i] - TEXT_BASE + off
+            addr = TEXT_BASE + pos
+            (w,) = word.unpack_from(text, pos)
+            # entre objetos não há relaxamento: o tamanho do desvio já está fixo
+            limit = B_RANGE if typ == 'B' else J_RANGE if typ == 'J' else None
+            if limit and not -limit <= target - addr < limit:
+                raise ValueError(f"{obj.name}: desvio para {sym} fora do alcance ({target - addr:+d} bytes)")
+            if typ == 'B':
+                word.pack_into(text, pos, _pack_b(w, 0, 0, 0, target - addr))
+            elif typ == 'J':
+                word.pack_into(text, pos, _pack_j(w, 0, 0, 0, target - addr))
+            elif typ == 'LA':
+                rd = (w >> 7) & 0x1f
+                auipc_word, addi_word = la_words(rd, target, addr)
+                word.pack_into(text, pos, auipc_word)
+                word.pack_into(text, pos + 4, addi_word)
+            else:
+                raise ValueError(f"{obj.name}: tipo de relocação desconhecido {typ}")
+
+    text_bin = OrderedDict()
+    for n, (w,) in enumerate(word.iter_unpack(text)):
+        text_bin[TEXT_BASE + 4*n] = w
+    symtab = {}
+    for i, obj in enumerate(objects):
+        for sym in obj.symbols:
+            symtab[sym if sym in obj.globls else f"{obj.name}:{sym}"] = addr_of(i, sym)
+    return text_bin, data, symtab
+
+def build_objects(paths, jobs=None):
+    """Monta os .s em paralelo (pool de processos) e carrega os .o, mantendo a ordem."""
+    sources = [p for p in paths if not p.endswith('.o')]
+    objs = {}
+    if len(sources) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for p, buf in zip(sources, pool.map(assemble_file, sources)):
+                objs[p] = ObjectFile.from_bytes(buf)
+    else:
+        for p in sources:
+            objs[p] = ObjectFile.from_bytes(assemble_file(p))
+    return [objs[p] if p in objs else load_object(p) for p in paths]
+
+def main():
+    ap = argparse.ArgumentParser(description="Monta e liga vários arquivos RV32I")
+    ap.add_argument('outfile', nargs='?', help="listagem de saída do programa ligado")
+    ap.add_argument('inputs', nargs='+', help="arquivos .s (montados em paralelo) ou .o")
+    ap.add_argument('-c', action='store_true', help="só monta: grava um .o ao lado de cada .s")
+    ap.add_argument('-r', '--raw', metavar='PREFIXO', help="prefixo dos arquivos .text.raw/.data.raw")
+    ap.add_argument('--elf', metavar='ARQ', help="também grava um executável ELF32 em ARQ")
+    ap.add_argument('-j', '--jobs', type=int, default=None, help="processos do pool (padrão: nº de CPUs)")
+    opts = ap.parse_args()
+
+    if opts.c:
+        inputs = ([opts.outfile] if opts.outfile else []) + opts.inputs
+        objects = build_objects(inputs, opts.jobs)
+        for p, obj in zip(inputs, objects):
+            out = os.path.splitext(p)[0] + '.o'
+            with open(out, 'wb') as f:
+                f.write(obj.to_bytes())
+            print(f"{p} -> {out} (indefinidos: {', '.join(obj.undefined()) or '-'})")
+        return
+
+    objects = build_objects(opts.inputs, opts.jobs)
+    text_bin, data_bin, symtab = link(objects)
+    write_text_bin_file(text_bin, data_bin, opts.outfile, opts.raw)
+    if opts.elf:
+        write_elf_file(opts.elf, text_image(text_bin), data_bin, symtab)
+    print("Ligação concluída.")
+    print(f"Objetos: {len(objects)}; Instruções: {len(text_bin)} words; Dados bytes: {len(data_bin)}")
+    print("Símbolos (locais como objeto:nome):")
+    for k,v in symtab.items():
+        print(f"  {k} -> {hex(v)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Montagem em lote: muitos arquivos .s de uma vez, em paralelo.
+As entradas vêm de padrões glob e/ou de um arquivo de manifesto (um caminho
+por linha, relativo ao manifesto; linhas vazias e '#' são ignoradas). Cada
+arquivo é montado num processo do pool exatamente como 'python aRVA.py'
+faria, com as saídas ao lado da entrada (prog.s -> prog.txt,
+prog.text.raw, prog.data.raw e, se pedidos, prog.map/.idx/.elf). Um arquivo
+com erro não interrompe os outros: o relatório traz o resultado de cada um
+e o total, e o programa sai com código 1 se algum falhou. Se um processo do
+pool morrer, os arquivos que ainda não terminaram são montados de novo num
+pool novo, e só o que derrubou o processo fica com erro.
+
+Uso: python lote.py 'testes/**/*.s' [-m manifesto.txt] [-j N] [--map] [--index] [--elf]
+                    [--json relatorio.json] [-- opções do aRVA.py]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from servidor import run_job, _warm
+
+CHUNK_MAX = 64   # arquivos por tarefa do pool, no máximo
+
+def read_manifest(path):
+    """Caminhos listados no manifesto, relativos ao diretório dele."""
+    base = os.path.dirname(path)
+    out = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                out.append(os.path.join(base, line))
+    return out
+
+def collect_inputs(patterns=(), manifest=None):
+    """Entradas em ordem, sem repetição: os padrões (glob, com **) e depois o manifesto."""
+    paths = []
+    for pat in patterns:
+        found = sorted(glob.glob(pat, recursive=True))
+        paths += found if found else [pat]   # sem glob: vale o caminho (o erro aparece no relatório)
+    if manifest:
+        paths += read_manifest(manifest)
+    return list(dict.fromkeys(paths))
+
+def outputs_for(path, extra=(), map_file=False, index=False, elf=False):
+    """argv do aRVA.py para montar path com as saídas ao lado dele."""
+    base = os.path.splitext(path)[0]
+    argv = [path, base + '.txt', base]
+    if map_file:
+        argv += ['--map', base + '.map']
+    if index:
+        argv += ['--index', base + '.idx']
+    if elf:
+        argv += ['--elf', base + '.elf']
+    return argv + list(extra)
+
+def assemble_one(argv):
+    """Monta um arquivo (no processo do pool); retorna o resultado dele."""
+    t = time.perf_counter()
+    code, out, err = run_job(argv, os.getcwd())
+    res = {'arquivo': argv[0], 'codigo': code, 'tempo_s': round(time.perf_counter() - t, 6)}
+    if code:
+        lines = err.strip().splitlines()
+        res['erro'] = lines[-1] if lines else f"código de saída {code}"
+    return res
+
+def assemble_many(argvs):
+    """Um lote de arquivos por tarefa: com programas pequenos, a troca de
+    mensagens com o pool custaria mais que a montagem de cada um."""
+    return [assemble_one(argv) for argv in argvs]
+
+def _failed(argv, msg):
+    return {'arquivo': argv[0], 'codigo': 1, 'tempo_s': None, 'erro': msg}
+
+def _log_errors(log, chunk):
+    if log:
+        for r in chunk:
+            if r['codigo']:
+                print(f"ERRO {r['arquivo']}: {r['erro']}", file=log)
+
+def _run_pool(tasks, jobs, results, log=None):
+    """Roda as tarefas {k: [argv, ...]} num pool novo; o resultado do i-ésimo
+    arquivo da tarefa k vai para results[k + i].
+
+    Quando um processo do pool morre, o pool inteiro quebra e todas as
+    tarefas que não tinham terminado falham juntas: essas são devolvidas
+    (no mesmo formato) para rodar de novo, sem resultado gravado.
+    """
+    lost = {}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_warm) as pool:
+        futures = {pool.submit(assemble_many, argvs): k for k, argvs in tasks.items()}
+        for fut in as_completed(futures):
+            k = futures[fut]
+            try:
+                chunk = fut.result()
+            except BrokenProcessPool:
+                lost[k] = tasks[k]
+                continue
+            except Exception as e:   # a tarefa não chegou ao processo ou o resultado não voltou
+                chunk = [_failed(a, f"{type(e).__name__}: {e}") for a in tasks[k]]
+            results[k:k+len(chunk)] = chunk
+            _log_errors(log, chunk)
+    return lost
+
+def run_batch(paths, jobs=None, extra=(), map_file=False, index=False, elf=False, log=None):
+    """Monta todos os arquivos; retorna o relatório (por arquivo, na ordem de paths, e total)."""
+    start = time.perf_counter()
+    jobs = jobs or os.cpu_count() or 1
+    argvs = [outputs_for(p, extra, map_file, index, elf) for p in paths]
+    results = [None] * len(paths)
+    if jobs == 1 or len(paths) <= 1:
+        for k, argv in enumerate(argvs):
+            results[k] = assemble_one(argv)
+            _log_errors(log, results[k:k+1])
+    else:
+        # ~4 tarefas por processo equilibram a carga sem muitas mensagens
+        size = max(1, min(CHUNK_MAX, -(-len(paths) // (jobs * 4))))
+        lost = _run_pool({k: argvs[k:k+size] for k in range(0, len(argvs), size)}, jobs, results, log)
+        if lost:
+            # um processo morreu e levou o pool junto: o que não terminou roda de
+            # novo, um arquivo por tarefa, e o que se perder outra vez roda sozinho
+            # num pool de um processo, até achar o arquivo que derruba o processo
+            single = {k + i: [argv] for k, chunk in lost.items() for i, argv in enumerate(chunk)}
+            lost = _run_pool(single, jobs, results, log)
+            for k, (argv,) in sorted(lost.items()):
+                if _run_pool({k: [argv]}, 1, results, log):
+                    results[k] = _failed(argv, "o processo do pool morreu montando este arquivo")
+                    _log_errors(log, results[k:k+1])
+    total = time.perf_counter() - start
+    failed = sum(1 for r in results if r['codigo'])
+    return {
+        'arquivos': len(paths),
+        'ok': len(paths) - failed,
+        'falhas': failed,
+        'tempo_s': round(total, 6),
+        'arquivos_s': round(len(paths) / total, 1) if total else None,
+        'resultados': results,
+    }
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    extra = []
+    if '--' in argv:   # o resto vai para o aRVA.py
+        k = argv.index('--')
+        argv, extra = argv[:k], argv[k+1:]
+    ap = argparse.ArgumentParser(description="Monta vários arquivos RV32I em paralelo",
+                                 epilog="Opções depois de '--' são repassadas ao aRVA.py "
+                                        "(ex: -- --no-cache --peephole).")
+    ap.add_argument('inputs', nargs='*', help="arquivos ou padrões glob (use aspas para '**')")
+    ap.add_argument('-m', '--manifesto', metavar='ARQ', help="arquivo com um caminho de entrada por linha")
+    ap.add_argument('-j', '--jobs', type=int, default=None, help="processos do pool (padrão: nº de CPUs)")
+    ap.add_argument('--map', action='store_true', help="grava prog.map ao lado de cada entrada")
+    ap.add_argument('--index', action='store_true', help="grava prog.idx ao lado de cada entrada")
+    ap.add_argument('--elf', action='store_true', help="grava prog.elf ao lado de cada entrada")
+    ap.add_argument('--json', metavar='ARQ', help="grava o relatório completo em JSON ('-' = saída padrão)")
+    opts = ap.parse_args(argv)
+    paths = collect_inputs(opts.inputs, opts.manifesto)
+    if not paths:
+        ap.error("nenhuma entrada (dê arquivos, padrões glob ou -m manifesto)")
+
+    rep = run_batch(paths, opts.jobs, extra, opts.map, opts.index, opts.elf, log=sys.stderr)
+    print(f"Lote: {rep['arquivos']} arquivos, {rep['ok']} ok, {rep['falhas']} com erro, "
+          f"{rep['tempo_s']:.2f} s ({rep['arquivos_s']} arquivos/s)", file=sys.stderr)
+    if opts.json:
+        text = json.dumps(rep, indent=2, ensure_ascii=False)
+        if opts.json == '-':
+            print(text)
+        else:
+            with open(opts.json, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+    if rep['falhas']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""
+Otimizador peephole do aRVA, aplicado entre as duas passagens.
+Percorre o .text de pass_one com uma janela de duas instruções e aplica
+regras locais até nenhuma mudar mais nada:
+
+ - escrita_x0:      instrução de ALU (ou lui/auipc) com rd = zero é removida
+ - identidade:      addi x, x, 0 / add x, x, zero / slli x, x, 0 ... são removidas
+ - desvio_proximo:  branch ou jal zero para a instrução seguinte é removido
+ - encadeamento:    desvio para um 'jal zero, L2' passa a ir direto para L2
+ - sw_lw:           lw logo depois de sw no mesmo endereço vira mv (ou some)
+ - lw_sw:           sw do valor que acabou de ser lido do mesmo endereço some
+                    (não vale para zero: 'lw zero' descarta o valor e o sw grava 0)
+ - sw_sw:           sw sobrescrito pelo sw seguinte no mesmo endereço some
+
+A janela nunca atravessa uma label ou .align: uma instrução com label pode
+ser alvo de desvio e ter outro antecessor. No fim o layout é refeito
+(endereços e symtab), então o relaxamento e a segunda passagem seguem
+normalmente. Código que depende do tamanho exato de um trecho (tabela de
+saltos calculada com jalr, nops de preenchimento) não deve passar por aqui.
+
+A economia de ciclos é estimada por execução de cada trecho, com o modelo
+do pipeline.py: 1 ciclo por instrução removida, mais a penalidade de
+desvio tomado nos saltos evitados e a bolha de load evitada no sw_lw.
+
+Uso: python otimizador.py entrada.s [saida.txt] [rawprefix]
+     (teste_peephole.asm traz os casos que as regras não podem mudar)
+"""
+import argparse
+from collections import Counter
+
+from aRVA import (INSTR_MAP, MNEMONICS, MNEM_ID, preprocess, pass_one, pass_two, relax_branches, _relayout,
+                  _sem_gc, write_text_bin_file)
+from pipeline import TAKEN_PENALTY, LAT_LOAD, LAT_ALU
+
+_ZERO = ('reg', 'zero', 0)
+_IMM_0 = ('imm', '0', 0)
+ADDI = MNEM_ID['addi']
+
+# instruções cujo único efeito é escrever rd
+PURE = {m for m, (fmt, opcode, _, _, _) in INSTR_MAP.items()
+        if fmt == 'R' or fmt == 'U' or (fmt == 'I' and opcode == 0x13)}
+# x op zero == x
+IDENTITY_R = {'add', 'sub', 'or', 'xor', 'sll', 'srl', 'sra'}
+IDENTITY_I = {'addi', 'ori', 'xori', 'slli', 'srli', 'srai'}
+# zero op x == x
+COMMUTATIVE = {'add', 'or', 'xor'}
+
+# ciclos economizados por regra (por execução)
+RULE_CYCLES = {
+    'escrita_x0': 1,
+    'identidade': 1,
+    'desvio_proximo': 1 + TAKEN_PENALTY,
+    'encadeamento': 1 + TAKEN_PENALTY,
+    'sw_lw': LAT_LOAD - LAT_ALU,
+    'sw_lw_removido': 1 + LAT_LOAD - LAT_ALU,
+    'lw_sw': 1,
+    'sw_sw': 1,
+}
+
+def _regs(args):
+    """Números dos registradores, ou None se algum operando não for registrador."""
+    out = []
+    for tok in args:
+        if tok[0] != 'reg':
+            return None
+        out.append(tok[2])
+    return out
+
+def _is_nop(mnem, args):
+    """Regra que remove a instrução sozinha, ou None."""
+    if mnem not in PURE or not args or args[0][0] != 'reg':
+        return None
+    if args[0][2] == 0:
+        return 'escrita_x0'
+    if len(args) == 3 and args[2][0] == 'imm':
+        if mnem in IDENTITY_I and args[1][0] == 'reg' and args[0][2] == args[1][2] and args[2][2] == 0:
+            return 'identidade'
+    elif len(args) == 3:
+        r = _regs(args)
+        if r and mnem in IDENTITY_R and r[0] == r[1] and r[2] == 0:
+            return 'identidade'
+        if r and mnem in COMMUTATIVE and r[0] == r[2] and r[1] == 0:
+            return 'identidade'
+    return None
+
+def _jump_target(mnem, args):
+    """Símbolo alvo de um branch/jal, ou None."""
+    spec = INSTR_MAP.get(mnem)
+    if spec and (spec[0] == 'B' or spec[0] == 'J') and args:
+        return args[-1][1]   # como em _label: vale o texto (uma label pode se chamar 'a1')
+    return None
+
+def _same_slot(a, b):
+    return a[0] == 'mem' and b[0] == 'mem' and a[2] == b[2]
+
+def _layout_maps(ir):
+    """(labels logo antes de cada instrução que tem label, primeira instrução depois de cada label)."""
+    before = {}
+    for k, kind, x in ir.marks:
+        if kind == 'A':
+            before.pop(k, None)   # labels antes de um .align não estão logo antes da instrução
+        elif k < len(ir):
+            before.setdefault(k, []).append(x)
+    first = {lbl: k for k, lbls in before.items() for lbl in lbls}
+    return before, first
+
+def _final_target(sym, first, ir):
+    """Segue a cadeia de 'jal zero, L' a partir da label sym."""
+    seen = {sym}
+    while True:
+        k = first.get(sym)
+        if k is None:
+            return sym
+        mnem, args = ir.mnem(k), ir.args[k]
+        if mnem != 'jal' or len(args) != 2 or args[0][0] != 'reg' or args[0][2] != 0:
+            return sym
+        nxt = _jump_target(mnem, args)
+        if nxt is None or nxt in seen:
+            return sym
+        seen.add(nxt)
+        sym = nxt
+
+def _one_pass(ir, stats):
+    before, first = _layout_maps(ir)
+    marked = {k for k, _, _ in ir.marks}
+    aligned = {k for k, kind, _ in ir.marks if kind == 'A'}
+    # labels que vêm logo depois da instrução k (sem .align no meio)
+    following = {k - 1: lbls for k, lbls in before.items() if k and k not in aligned}
+
+    ops, all_args = ir.ops, ir.args
+    keep = []     # posições mantidas (None = removida depois, pelo sw_sw)
+    new = {}      # posição -> (id, operandos) das instruções reescritas
+    prev = None   # índice em keep da instrução anterior, se não houver label no meio
+    changed = False
+    for k in range(len(ir)):
+        if k in marked:
+            prev = None
+        mnem, args = MNEMONICS[ops[k]], all_args[k]
+
+        rule = _is_nop(mnem, args)
+        target = _jump_target(mnem, args)
+        if rule is None and target is not None:
+            is_jump = mnem == 'jal'
+            if target in following.get(k, ()) and (not is_jump or (args[0][0] == 'reg' and args[0][2] == 0)):
+                rule = 'desvio_proximo'
+            else:
+                final = _final_target(target, first, ir)
+                if final != target:
+                    stats['encadeamento'] += 1
+                    new[k] = (ops[k], tuple(args[:-1]) + (('sym', final, final),))
+                    changed = True
+        if rule is None and prev is not None and len(args) == 2:
+            p = keep[prev]
+            pop, pargs = new.get(p) or (ops[p], all_args[p])
+            pm = MNEMONICS[pop]
+            if len(pargs) == 2 and _same_slot(pargs[1], args[1]) and pargs[0][0] == 'reg' and args[0][0] == 'reg':
+                if pm == 'sw' and mnem == 'lw':
+                    if args[0][2] == pargs[0][2]:
+                        rule = 'sw_lw_removido'
+                    elif args[0][2] != 0:
+                        stats['sw_lw'] += 1
+                        new[k] = (ADDI, (args[0], pargs[0], _IMM_0))
+                        changed = True
+                elif pm == 'lw' and mnem == 'sw':
+                    # com rd = zero o lw descarta o valor e o sw grava 0: não é o mesmo valor
+                    if args[0][2] == pargs[0][2] and pargs[0][2] != 0 and pargs[0][2] != args[1][2][1]:
+                        rule = 'lw_sw'
+                elif pm == 'sw' and mnem == 'sw':
+                    stats['sw_sw'] += 1
+                    keep[prev] = None
+                    changed = True
+        if rule is not None:
+            stats[rule] += 1
+            changed = True
+            continue
+        keep.append(k)
+        prev = len(keep) - 1
+    if not changed:
+        return ir, False
+    kept = [k for k in keep if k is not None]
+    out = ir.take(kept)
+    if new:
+        for j, k in enumerate(kept):
+            if k in new:
+                out.ops[j], out.args[j] = new[k]
+    return out, True
+
+@_sem_gc
+def peephole_text(ir, symtab):
+    """Aplica as regras até o ponto fixo e refaz o layout.
+
+    Retorna (ir, relatório) com o relatório em
+    {'removidas': n, 'regras': {regra: vezes}, 'ciclos_estimados': c}.
+    """
+    stats = Counter()
+    n_before = len(ir)
+    changed = True
+    while changed:
+        ir, changed = _one_pass(ir, stats)
+    ir = _relayout(ir, symtab, {})
+    return ir, {
+        'removidas': n_before - len(ir),
+        'regras': dict(stats),
+        'ciclos_estimados': sum(RULE_CYCLES[r] * n for r, n in stats.items()),
+    }
+
+def format_report(rep):
+    rules = ', '.join(f"{r} {n}" for r, n in sorted(rep['regras'].items())) or 'nenhuma regra aplicada'
+    return (f"Peephole: {rep['removidas']} instruções removidas, ~{rep['ciclos_estimados']} ciclos"
+            f" a menos ({rules})")
+
+def main():
+    ap = argparse.ArgumentParser(description="Otimizador peephole entre as passagens do aRVA")
+    ap.add_argument('infile', help="arquivo assembly de entrada")
+    ap.add_argument('outfile', nargs='?', help="grava a listagem do programa otimizado")
+    ap.add_argument('rawprefix', nargs='?', help="prefixo dos arquivos .text.raw/.data.raw")
+    opts = ap.parse_args()
+    with open(opts.infile, 'r', encoding='utf-8') as f:
+        lines, lexed, pp = preprocess(f.readlines(), opts.infile)
+    ir, symtab, data_bin, data_syms = pass_one(lines, lexed=lexed, where=pp and pp.where)
+    ir, rep = peephole_text(ir, symtab)
+    print(format_report(rep))
+    if opts.outfile:
+        ir, far = relax_branches(ir, symtab)
+        text_bin = pass_two(ir, symtab, data_syms, far=far, where=pp and pp.where)
+        write_text_bin_file(text_bin, data_bin, opts.outfile, opts.rawprefix)
+
+if __name__ == '__main__':
+    main()
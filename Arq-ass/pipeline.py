@@ -0,0 +1,252 @@
+"""
+Análise de hazards num pipeline clássico de 5 estágios (IF ID EX MEM WB) e
+escalonamento de instruções por bloco básico.
+
+Modelo (com forwarding completo e desvios resolvidos no ID):
+ - ALU -> ALU/load/store: sem bolha
+ - load -> uso no EX (load-use): 1 bolha
+ - ALU -> branch/jalr: 1 bolha (o operando é comparado no ID)
+ - load -> branch/jalr: 2 bolhas
+ - desvio tomado / jal / jalr: 1 ciclo de penalidade (a busca seguinte é descartada)
+
+O escalonador monta, para cada bloco básico, o grafo de dependências
+(RAW/WAR/WAW entre registradores e ordem conservadora entre loads e stores,
+sem reordenar dois acessos se um deles for store) e faz list scheduling
+priorizando o caminho crítico, mantendo o desvio no fim do bloco e cada
+auipc (cujo resultado depende do próprio endereço) no seu lugar. Como cada
+bloco mantém o tamanho, as labels não mudam de endereço.
+
+Uso: python pipeline.py entrada.s [saida.txt]
+"""
+import argparse
+import heapq
+
+from aRVA import (INSTR_MAP, OP_SIZE, PSEUDO_SIZE, preprocess, pass_one, pass_two, relax_branches,
+                  write_text_bin_file)
+
+# latência mínima (em ciclos de EX) entre produtor e consumidor, por tipo
+LAT_ALU = 1
+LAT_LOAD = 2
+LAT_ALU_BRANCH = 2
+LAT_LOAD_BRANCH = 3
+TAKEN_PENALTY = 1
+
+class Instr:
+    """Instrução do .text com os registradores que lê e escreve."""
+    __slots__ = ('pos', 'mnem', 'kind', 'defs', 'uses', 'size')
+
+    def __init__(self, ir, k):
+        self.pos = k   # posição em ir
+        self.mnem = mnem = ir.mnem(k)
+        self.size = OP_SIZE[ir.ops[k]]
+        self.defs, self.uses, self.kind = operand_regs(mnem, ir.args[k])
+
+def operand_regs(mnem, args):
+    """(registradores escritos, registradores lidos, tipo) de uma instrução (operandos como tokens)."""
+    if mnem in PSEUDO_SIZE:   # la, li: só escrevem rd
+        return (args[0][2],), (), 'alu'
+    fmt, opcode, _, _, ops = INSTR_MAP[mnem]
+    defs, uses = [], []
+    for name, tok in zip(ops.split(','), args):
+        if name == 'rd':
+            defs.append(tok[2] if tok[0] == 'reg' else -1)
+        elif name in ('rs1', 'rs2'):
+            uses.append(tok[2] if tok[0] == 'reg' else -1)
+        elif name == 'mem':
+            uses.append(tok[2][1] if tok[0] == 'mem' else -1)
+    defs = tuple(r for r in defs if r > 0)   # escrita em x0 não produz valor
+    uses = tuple(r for r in uses if r > 0)
+    if fmt == 'B':
+        kind = 'branch'
+    elif fmt == 'J':
+        kind = 'jump'
+    elif mnem == 'jalr':
+        kind = 'jalr'
+    elif fmt == 'S':
+        kind = 'store'
+    elif opcode == 0x03:
+        kind = 'load'
+    elif mnem == 'auipc':
+        kind = 'auipc'   # o resultado depende do próprio endereço: não pode trocar de lugar
+    else:
+        kind = 'alu'
+    return defs, uses, kind
+
+def latency(producer, consumer):
+    early = consumer.kind in ('branch', 'jalr')
+    if producer.kind == 'load':
+        return LAT_LOAD_BRANCH if early else LAT_LOAD
+    return LAT_ALU_BRANCH if early else LAT_ALU
+
+def stall_cycles(instrs):
+    """Bolhas de dados ao executar a sequência em ordem."""
+    ready = {}   # registrador -> (ciclo de EX do produtor, produtor)
+    cycle = -1
+    stalls = 0
+    for ins in instrs:
+        t = cycle + 1
+        for r in ins.uses:
+            if r in ready:
+                c, prod = ready[r]
+                t = max(t, c + latency(prod, ins))
+        stalls += t - cycle - 1
+        cycle = t
+        for r in ins.defs:
+            ready[r] = (cycle, ins)
+    return stalls
+
+def control_penalty(instrs):
+    """Penalidade de controle no pior caso (todo desvio tomado)."""
+    return sum(TAKEN_PENALTY for ins in instrs if ins.kind in ('branch', 'jump', 'jalr'))
+
+def basic_blocks(ir):
+    """Divide o .text (aRVA.TextIR) em blocos: listas de Instr separadas por labels, .align e desvios."""
+    blocks, cur = [], []
+    for k, kind, _ in ir.walk():
+        if kind != 'I':
+            if cur: blocks.append(cur)
+            cur = []
+        else:
+            ins = Instr(ir, k)
+            cur.append(ins)
+            if ins.kind in ('branch', 'jump', 'jalr'):
+                blocks.append(cur)
+                cur = []
+    if cur: blocks.append(cur)
+    return blocks
+
+def dependence_graph(block):
+    """Arestas (pred -> [(succ, latência)]) de um bloco; latência 0 = só ordem."""
+    n = len(block)
+    succs = [[] for _ in range(n)]
+    last_def = {}
+    uses_since = {}
+    last_store = None
+    mem_since_store = []
+    fixed = 0   # posição do último auipc (as anteriores a ele já vêm antes dele)
+    for j, ins in enumerate(block):
+        if fixed:                               # nada sobe acima do último auipc
+            succs[fixed - 1].append((j, 0))
+        if ins.kind == 'auipc':                 # e nada desce abaixo de um auipc
+            for i in range(max(fixed - 1, 0), j):
+                succs[i].append((j, 0))
+            fixed = j + 1
+        for r in ins.uses:                      # RAW
+            if r in last_def:
+                i = last_def[r]
+                succs[i].append((j, latency(block[i], ins)))
+        for r in ins.defs:
+            if r in last_def:                   # WAW
+                succs[last_def[r]].append((j, 1))
+            for i in uses_since.get(r, ()):     # WAR
+                if i != j: succs[i].append((j, 0))
+        if ins.kind in ('load', 'store'):
+            if last_store is not None:
+                succs[last_store].append((j, 1))
+            if ins.kind == 'store':
+                for i in mem_since_store:
+                    succs[i].append((j, 1))
+                last_store = j
+                mem_since_store = []
+            else:
+                mem_since_store.append(j)
+        if ins.kind in ('branch', 'jump', 'jalr'):  # o desvio fica por último
+            for i in range(j):
+                succs[i].append((j, 0))
+        for r in ins.uses:
+            uses_since.setdefault(r, []).append(j)
+        for r in ins.defs:
+            last_def[r] = j
+            uses_since[r] = []
+    return succs
+
+def list_schedule(block):
+    """Reordena um bloco minimizando bolhas; retorna a nova lista de Instr."""
+    n = len(block)
+    if n < 3:
+        return list(block)
+    succs = dependence_graph(block)
+    npreds = [0] * n
+    for i in range(n):
+        for j, _ in succs[i]:
+            npreds[j] += 1
+    # prioridade: maior caminho (em latência) até o fim do bloco
+    prio = [0] * n
+    for i in range(n - 1, -1, -1):
+        prio[i] = max((prio[j] + lat for j, lat in succs[i]), default=0)
+    earliest = [0] * n
+    # prontas: esperando o operando, por (ciclo mais cedo, i), e já disponíveis, por (-prioridade, i)
+    waiting = [(0, i) for i in range(n) if npreds[i] == 0]
+    avail = []
+    order = []
+    cycle = 0
+    while waiting or avail:
+        while waiting and waiting[0][0] <= cycle:
+            i = heapq.heappop(waiting)[1]
+            heapq.heappush(avail, (-prio[i], i))
+        if not avail:
+            cycle = waiting[0][0]
+            continue
+        pick = heapq.heappop(avail)[1]
+        order.append(pick)
+        for j, lat in succs[pick]:
+            earliest[j] = max(earliest[j], cycle + max(lat, 1))
+            npreds[j] -= 1
+            if npreds[j] == 0:
+                heapq.heappush(waiting, (earliest[j], j))
+        cycle += 1
+    return [block[i] for i in order]
+
+def schedule_text(ir):
+    """Escalona os blocos do .text de pass_one e retorna (nova ir, bolhas antes, bolhas depois)."""
+    blocks = basic_blocks(ir)
+    linear_before, linear_after = [], []
+    for block in blocks:
+        linear_before += block
+        linear_after += list_schedule(block)
+    before = stall_cycles(linear_before)
+    after = stall_cycles(linear_after)
+    # as labels ficam onde estavam; as instruções de cada bloco trocam de lugar
+    new = ir.take([ins.pos for ins in linear_after])
+    addrs = new.addrs
+    j = 0
+    for block in blocks:
+        addr = ir.addrs[block[0].pos]
+        for _ in block:
+            addrs[j] = addr
+            addr += linear_after[j].size
+            j += 1
+    return new, before, after
+
+def report(ir):
+    instrs = [ins for b in basic_blocks(ir) for ins in b]
+    return {
+        'instrucoes': sum(ins.size // 4 for ins in instrs),
+        'bolhas_dados': stall_cycles(instrs),
+        'penalidade_controle': control_penalty(instrs),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Hazards de pipeline e escalonamento de instruções")
+    ap.add_argument('infile', help="arquivo assembly de entrada")
+    ap.add_argument('outfile', nargs='?', help="grava a listagem do programa escalonado")
+    ap.add_argument('rawprefix', nargs='?', help="prefixo dos arquivos .text.raw/.data.raw")
+    opts = ap.parse_args()
+    with open(opts.infile, 'r', encoding='utf-8') as f:
+        lines, lexed, pp = preprocess(f.readlines(), opts.infile)
+    ir, symtab, data_bin, data_syms = pass_one(lines, lexed=lexed, where=pp and pp.where)
+    rep = report(ir)
+    ir, before, after = schedule_text(ir)
+    print(f"Instruções: {rep['instrucoes']}")
+    print(f"Penalidade de controle (pior caso): {rep['penalidade_controle']} ciclos")
+    print(f"Bolhas de dados antes do escalonamento: {before}")
+    print(f"Bolhas de dados depois do escalonamento: {after}")
+    print(f"Ciclos estimados: {rep['instrucoes'] + 4 + before + rep['penalidade_controle']}"
+          f" -> {rep['instrucoes'] + 4 + after + rep['penalidade_controle']}")
+    if opts.outfile:
+        ir, far = relax_branches(ir, symtab)
+        text_bin = pass_two(ir, symtab, data_syms, far=far, where=pp and pp.where)
+        write_text_bin_file(text_bin, data_bin, opts.outfile, opts.rawprefix)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Simulação de preditores de desvio sobre o traço de um programa RV32I.
+O programa roda no simulador com trace_branches=True, que registra o pc e o
+resultado (tomado ou não) de cada desvio condicional executado; o traço é
+então reproduzido em cada preditor:
+
+ - nunca-tomado / sempre-tomado: estáticos, sem estado
+ - btfn: desvio para trás é previsto tomado, para frente não tomado
+ - 1-bit: tabela de bits indexada pelo pc (repete o último resultado)
+ - 2-bit: tabela de contadores saturantes de 2 bits indexada pelo pc
+ - gshare: contadores de 2 bits indexados por pc XOR histórico global
+
+Os estáticos e o 1-bit são calculados com numpy sobre o traço inteiro; os
+contadores de 2 bits têm estado e rodam num laço sobre um bytearray, com os
+índices (inclusive o histórico do gshare) já calculados de forma vetorial.
+O alvo é considerado conhecido a tempo (BTB ideal), então só a direção conta:
+cada erro custa a penalidade de desvio do pipeline (ver pipeline.py).
+
+Uso: python preditor.py programa.s [--entradas 1024] [--historico 8] [--penalidade N]
+     python preditor.py --raw prefixo
+     python preditor.py --traco traco.npz       (traço salvo com --salvar-traco)
+"""
+import time
+import argparse
+
+import numpy as np
+
+from aRVA import TEXT_BASE, assemble
+from pipeline import TAKEN_PENALTY
+from simulador import Simulator
+
+COUNTER_INIT = 1   # contadores começam em "fracamente não tomado"
+
+class BranchTrace:
+    """Traço de desvios: pc, resultado (1 = tomado) e direção (1 = alvo para trás)."""
+    __slots__ = ('pcs', 'taken', 'backward')
+
+    def __init__(self, pcs, taken, backward):
+        self.pcs = np.asarray(pcs, dtype=np.uint32)
+        self.taken = np.asarray(taken, dtype=np.uint8)
+        self.backward = np.asarray(backward, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.pcs)
+
+    @classmethod
+    def from_simulator(cls, sim):
+        """Traço de um Simulator criado com trace_branches=True (depois de run())."""
+        pcs = np.frombuffer(sim.branch_pcs, dtype=np.uint32)
+        taken = np.frombuffer(sim.branch_taken, dtype=np.uint8)
+        # direção de cada desvio do .text, tirada da predecodificação
+        back = np.zeros(sim.n + 1, dtype=np.uint8)
+        for k, d in enumerate(sim.decoded):
+            if d is not None and d[0] in ('beq', 'bne', 'blt', 'bge') and d[4] < 0:
+                back[k] = 1
+        return cls(pcs, taken, back[(pcs - TEXT_BASE) >> 2])
+
+    def save(self, path):
+        np.savez_compressed(path, pcs=self.pcs, taken=self.taken, backward=self.backward)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z['pcs'], z['taken'], z['backward'])
+
+def pc_index(trace, table_bits):
+    return ((trace.pcs >> 2) & ((1 << table_bits) - 1)).astype(np.intp)
+
+def global_history(taken, history_bits):
+    """Histórico global antes de cada desvio; o resultado mais recente fica no bit 0."""
+    ghr = np.zeros(len(taken), dtype=np.uint32)
+    t = taken.astype(np.uint32)
+    for j in range(min(history_bits, len(taken))):
+        ghr[j+1:] |= t[:len(t)-j-1] << j
+    return ghr
+
+def saturating_counters(idx, taken, size):
+    """Acertos de uma tabela de contadores de 2 bits; idx já calculado por desvio."""
+    ctr = bytearray([COUNTER_INIT]) * size
+    hits = 0
+    for i, t in zip(idx.tolist(), taken.tolist()):
+        c = ctr[i]
+        if t:
+            if c >= 2: hits += 1
+            if c < 3: ctr[i] = c + 1
+        else:
+            if c < 2: hits += 1
+            if c: ctr[i] = c - 1
+    return hits
+
+# preditores: (traço, bits de índice da tabela, bits de histórico) -> acertos
+
+def never_taken(trace, table_bits, history_bits):
+    return int(len(trace) - np.count_nonzero(trace.taken))
+
+def always_taken(trace, table_bits, history_bits):
+    return int(np.count_nonzero(trace.taken))
+
+def btfn(trace, table_bits, history_bits):
+    return int(np.count_nonzero(trace.taken == trace.backward))
+
+def one_bit(trace, table_bits, history_bits):
+    # a previsão é o resultado anterior do mesmo índice: ordena por índice
+    # (estável, mantendo a ordem no tempo) e compara cada um com o vizinho
+    idx = pc_index(trace, table_bits)
+    order = np.argsort(idx, kind='stable')
+    s_idx = idx[order]
+    s_taken = trace.taken[order]
+    pred = np.empty_like(s_taken)
+    pred[1:] = s_taken[:-1]
+    first = np.ones(len(s_idx), dtype=bool)
+    first[1:] = s_idx[1:] != s_idx[:-1]
+    pred[first] = 0   # entrada nova prevê não tomado
+    return int(np.count_nonzero(pred == s_taken))
+
+def two_bit(trace, table_bits, history_bits):
+    return saturating_counters(pc_index(trace, table_bits), trace.taken, 1 << table_bits)
+
+def gshare(trace, table_bits, history_bits):
+    mask = (1 << table_bits) - 1
+    ghr = global_history(trace.taken, history_bits)
+    idx = (((trace.pcs >> 2) ^ ghr) & mask).astype(np.intp)
+    return saturating_counters(idx, trace.taken, 1 << table_bits)
+
+PREDICTORS = {
+    'nunca-tomado': never_taken,
+    'sempre-tomado': always_taken,
+    'btfn': btfn,
+    '1-bit': one_bit,
+    '2-bit': two_bit,
+    'gshare': gshare,
+}
+
+def evaluate(trace, names=None, table_bits=10, history_bits=8, penalty=TAKEN_PENALTY):
+    """Roda os preditores sobre o traço; retorna {nome: {acertos, erros, precisao, ciclos_penalidade, tempo}}."""
+    n = len(trace)
+    results = {}
+    for name in names or PREDICTORS:
+        t = time.perf_counter()
+        hits = PREDICTORS[name](trace, table_bits, history_bits)
+        dt = time.perf_counter() - t
+        results[name] = {
+            'acertos': hits,
+            'erros': n - hits,
+            'precisao': hits / n if n else 1.0,
+            'ciclos_penalidade': (n - hits) * penalty,
+            'tempo': dt,
+        }
+    return results
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulação de preditores de desvio")
+    ap.add_argument('infile', nargs='?', help="arquivo assembly a montar e executar")
+    ap.add_argument('--raw', metavar='PREFIXO', help="executa PREFIXO.text.raw / PREFIXO.data.raw")
+    ap.add_argument('--traco', metavar='ARQ', help="usa um traço salvo (.npz) em vez de executar")
+    ap.add_argument('--salvar-traco', metavar='ARQ', help="grava o traço de desvios em ARQ (.npz)")
+    ap.add_argument('--max-steps', type=int, default=100_000_000)
+    ap.add_argument('--entradas', type=int, default=1024, help="entradas da tabela (potência de 2)")
+    ap.add_argument('--historico', type=int, default=8, help="bits de histórico global do gshare")
+    ap.add_argument('--penalidade', type=int, default=TAKEN_PENALTY, help="ciclos perdidos por erro")
+    ap.add_argument('-p', '--preditor', action='append', choices=list(PREDICTORS),
+                    help="preditor a simular (repetível; padrão: todos)")
+    opts = ap.parse_args()
+    if opts.entradas <= 0 or opts.entradas & (opts.entradas - 1):
+        ap.error("--entradas deve ser potência de 2")
+
+    if opts.traco:
+        trace = BranchTrace.load(opts.traco)
+    else:
+        if opts.raw:
+            with open(opts.raw + '.text.raw', 'rb') as f:
+                text = f.read()
+            try:
+                with open(opts.raw + '.data.raw', 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = b''
+            sim = Simulator(text, data, trace_branches=True)
+        elif opts.infile:
+            with open(opts.infile, 'r', encoding='utf-8') as f:
+                text_bin, data_bin, symtab = assemble(f.readlines(), path=opts.infile)
+            sim = Simulator.from_assembly(text_bin, data_bin, trace_branches=True)
+        else:
+            ap.error("informe um arquivo .s, --raw ou --traco")
+        steps = sim.run(opts.max_steps)
+        trace = BranchTrace.from_simulator(sim)
+        print(f"Instruções executadas: {steps}")
+    if opts.salvar_traco:
+        trace.save(opts.salvar_traco)
+
+    n = len(trace)
+    print(f"Desvios condicionais: {n} ({int(np.count_nonzero(trace.taken))} tomados)")
+    table_bits = opts.entradas.bit_length() - 1
+    results = evaluate(trace, opts.preditor, table_bits, opts.historico, opts.penalidade)
+    print(f"{'preditor':<14} {'precisão':>9} {'erros':>10} {'penalidade':>12} {'tempo':>8}")
+    for name, r in results.items():
+        print(f"{name:<14} {100*r['precisao']:8.2f}% {r['erros']:>10} {r['ciclos_penalidade']:>12} {r['tempo']:7.3f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Servidor de montagem do aRVA: evita pagar a partida do interpretador (e dos
+módulos/regex do montador) a cada arquivo.
+Fica no ar com um pool de processos que já importaram o montador; cada
+pedido é uma linha JSON com os mesmos argumentos do aRVA.py e a resposta é
+outra linha JSON com o código de saída, a saída e as mensagens de erro.
+Os pedidos são aceitos em paralelo (asyncio) e cada um roda num processo do
+pool, que também mantém o cache de .include entre os pedidos.
+
+Protocolo (uma linha JSON por mensagem, em qualquer ordem de resposta):
+ - pedido:   {"id": 1, "argv": ["prog.s", "out.txt", "--map", "p.map"], "cwd": "/dir"}
+ - resposta: {"id": 1, "codigo": 0, "saida": "...", "erros": "..."}
+ - {"id": 2, "comando": "ping"} responde {"id": 2, "codigo": 0}; "parar" desliga o servidor
+   depois de responder os pedidos que ainda estão rodando (em todas as conexões)
+   e de fechar as outras conexões abertas
+
+Depois de mudar o montador, reinicie o servidor (os processos guardam o código antigo).
+
+Uso: python servidor.py [--socket ARQ] [-j N]   (socket Unix; cliente: cliente.py)
+     python servidor.py --stdio [-j N]          (pedidos na entrada padrão, respostas na saída)
+"""
+import io
+import os
+import sys
+import json
+import asyncio
+import argparse
+import traceback
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+from cliente import DEFAULT_SOCKET
+
+def _warm():
+    """Inicializa cada processo do pool: importa o montador uma vez."""
+    import aRVA, indice, cache_montagem   # noqa: F401
+
+def run_job(argv, cwd):
+    """Roda aRVA.main(argv) em cwd; retorna (código, saída, erros)."""
+    import aRVA
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    old = os.getcwd()
+    try:
+        os.chdir(cwd)
+        sys.argv = ['aRVA.py'] + argv   # prog das mensagens do argparse
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                aRVA.main(argv)
+            except SystemExit as e:   # argparse e sys.exit
+                if e.code is None or isinstance(e.code, int):
+                    code = e.code or 0
+                else:
+                    code = 1
+                    print(e.code, file=sys.stderr)
+            except Exception as e:
+                code = 1
+                err.write(''.join(traceback.format_exception_only(type(e), e)))
+    finally:
+        os.chdir(old)
+    return code, out.getvalue(), err.getvalue()
+
+class _StdinReader:
+    """readline() da entrada padrão sem travar o loop (vale para pipe, terminal ou arquivo)."""
+    async def readline(self):
+        return await asyncio.get_running_loop().run_in_executor(None, sys.stdin.buffer.readline)
+
+class _StdoutWriter:
+    """O mínimo de asyncio.StreamWriter que handle() usa, sobre a saída padrão."""
+    def write(self, data):
+        sys.stdout.buffer.write(data)
+
+    async def drain(self):
+        sys.stdout.buffer.flush()
+
+    def close(self):
+        sys.stdout.buffer.flush()
+
+class AssemblyServer:
+    def __init__(self, jobs=None):
+        self.pool = ProcessPoolExecutor(max_workers=jobs, initializer=_warm)
+        self.stop = None
+        self.served = 0
+        self.pending = set()   # respostas ainda não enviadas, de todas as conexões
+        self.conns = {}        # tarefa de handle() -> writer, das conexões abertas
+
+    async def _run(self, req):
+        resp = {'id': req.get('id')}
+        cmd = req.get('comando')
+        if cmd == 'ping':
+            resp['codigo'] = 0
+        elif cmd == 'parar':
+            resp['codigo'] = 0   # quem desliga é handle(), depois de responder o que falta
+        elif cmd is not None:
+            resp.update(codigo=2, saida='', erros=f"comando desconhecido '{cmd}'\n")
+        else:
+            loop = asyncio.get_running_loop()
+            try:
+                code, out, err = await loop.run_in_executor(
+                    self.pool, run_job, list(req['argv']), req.get('cwd') or os.getcwd())
+            except Exception as e:   # pedido mal formado ou processo do pool morto
+                code, out, err = 1, '', f"erro no servidor: {type(e).__name__}: {e}\n"
+            resp.update(codigo=code, saida=out, erros=err)
+            self.served += 1
+        return resp
+
+    async def _answer(self, req, writer, lock):
+        if isinstance(req, dict):
+            resp = await self._run(req)
+        else:
+            resp = {'id': None, 'codigo': 2, 'saida': '', 'erros': "pedido não é um objeto JSON\n"}
+        async with lock:
+            writer.write(json.dumps(resp, ensure_ascii=False).encode('utf-8') + b'\n')
+            await writer.drain()
+
+    async def handle(self, reader, writer):
+        """Atende uma conexão: cada linha é um pedido, respondido assim que termina."""
+        lock = asyncio.Lock()
+        tasks = set()
+        stopping = False
+        me = asyncio.current_task()
+        self.conns[me] = writer
+        try:
+            while not self.stop.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    req = json.loads(line)
+                except ValueError:
+                    req = None
+                t = asyncio.create_task(self._answer(req, writer, lock))
+                tasks.add(t)
+                t.add_done_callback(tasks.discard)
+                self.pending.add(t)
+                t.add_done_callback(self.pending.discard)
+                if isinstance(req, dict) and req.get('comando') == 'parar':
+                    stopping = True
+                    break
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            if stopping:
+                await self._shutdown()
+        finally:
+            del self.conns[me]
+            writer.close()
+
+    async def _shutdown(self):
+        """Espera as respostas pendentes das outras conexões (já escritas e
+        drenadas ao terminar), fecha essas conexões e só então desliga o
+        servidor. Fechar o writer faz o readline() da conexão ociosa terminar
+        com fim de arquivo, então cada handle() sai sozinho antes do fim do
+        loop, em vez de ficar preso (e ser cancelado) no readline()."""
+        while self.pending:
+            await asyncio.gather(*list(self.pending), return_exceptions=True)
+        others = [t for t in self.conns if t is not asyncio.current_task()]
+        for t in others:
+            self.conns[t].close()
+        if others:
+            await asyncio.gather(*others, return_exceptions=True)
+        self.stop.set()
+
+    async def serve_unix(self, path):
+        self.stop = asyncio.Event()
+        if os.path.exists(path):
+            os.unlink(path)   # socket de um servidor anterior que não saiu limpo
+        server = await asyncio.start_unix_server(self.handle, path)
+        print(f"aRVA: servindo em {path}", file=sys.stderr, flush=True)
+        try:
+            async with server:
+                await self.stop.wait()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def serve_stdio(self):
+        self.stop = asyncio.Event()
+        await self.handle(_StdinReader(), _StdoutWriter())
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor de montagem do aRVA (pedidos em JSON por linha)")
+    ap.add_argument('--socket', default=DEFAULT_SOCKET, help=f"socket Unix (padrão: {DEFAULT_SOCKET})")
+    ap.add_argument('--stdio', action='store_true', help="atende pela entrada/saída padrão em vez do socket")
+    ap.add_argument('-j', '--jobs', type=int, default=None, help="processos do pool (padrão: nº de CPUs)")
+    opts = ap.parse_args()
+    srv = AssemblyServer(opts.jobs)
+    try:
+        asyncio.run(srv.serve_stdio() if opts.stdio else srv.serve_unix(opts.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.close()
+    print(f"aRVA: {srv.served} montagens atendidas", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
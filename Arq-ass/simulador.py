@@ -0,0 +1,308 @@
+"""
+Simulador RV32I para as instruções de INSTR_MAP do montador aRVA.
+Cada palavra do .text é decodificada uma única vez (predecodificação) para um
+registro (mnem, rd, rs1, rs2, imm). Na primeira vez que a execução chega a um
+endereço, o bloco básico que começa ali é traduzido desses registros para uma
+função Python com os operandos já como constantes; daí em diante o laço
+principal só chama uma função por bloco, sem voltar a extrair campos de bits.
+A memória é esparsa, em páginas de 4 KiB criadas sob demanda, com o .text em
+TEXT_BASE e o .data em DATA_BASE.
+
+A execução termina quando o pc sai do .text (ex.: passar da última instrução
+ou 'jalr x0, ra, 0' com ra = 0, que é o valor inicial) ou quando passa de
+max_steps (conferido a cada bloco). O código não pode se modificar: escritas
+no .text não mudam o que já foi predecodificado.
+
+Com trace_branches=True, cada desvio condicional executado acrescenta seu pc
+a branch_pcs (array 'I') e o resultado (1 = tomado) a branch_taken
+(bytearray); é o traço usado por preditor.py.
+
+Com trace_memory=True, o laço principal registra em fetch_blocks o índice de
+cada bloco executado (as buscas de instrução saem daí e de lens) e cada
+load/store acrescenta a mem_trace (array 'Q') o endereço efetivo deslocado
+de dois bits, com o tipo do acesso nos bits 1-0 (MEM_CODES: 0 = load,
+1/2/3 = sb/sh/sw); é o traço usado por hierarquia_cache.py.
+
+Uso: python simulador.py programa.s [--max-steps N]
+     python simulador.py --raw prefixo      (lê prefixo.text.raw / prefixo.data.raw)
+"""
+import re
+import time
+import struct
+import argparse
+from array import array
+
+from aRVA import TEXT_BASE, DATA_BASE, REG_MAP, assemble, decode
+
+PAGE_BITS = 12
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+M32 = 0xffffffff
+SIGN = 0x80000000
+STACK_TOP = 0x7ffffff0
+MAX_BLOCK = 256
+
+_W = struct.Struct('<I')
+
+class SimError(Exception):
+    pass
+
+class _Halt(Exception):
+    pass
+
+class Memory:
+    """Memória esparsa: número da página -> bytearray(PAGE_SIZE)."""
+    def __init__(self):
+        self.pages = {}
+
+    def page(self, addr):
+        n = addr >> PAGE_BITS
+        p = self.pages.get(n)
+        if p is None:
+            p = self.pages[n] = bytearray(PAGE_SIZE)
+        return p
+
+    def load_bytes(self, addr, data):
+        off = 0
+        while off < len(data):
+            a = addr + off
+            p = self.page(a)
+            po = a & PAGE_MASK
+            n = min(PAGE_SIZE - po, len(data) - off)
+            p[po:po+n] = data[off:off+n]
+            off += n
+
+    def read(self, addr, size):
+        """Leitura little-endian sem sinal de 1, 2 ou 4 bytes (pode cruzar página)."""
+        v = 0
+        for i in range(size):
+            a = (addr + i) & M32
+            p = self.pages.get(a >> PAGE_BITS)
+            if p is not None:
+                v |= p[a & PAGE_MASK] << (8*i)
+        return v
+
+    def write(self, addr, size, value):
+        for i in range(size):
+            a = (addr + i) & M32
+            self.page(a)[a & PAGE_MASK] = (value >> (8*i)) & 0xff
+
+# Código Python de cada instrução; campos: rd, rs1, rs2, imm, u (imediato sem sinal),
+# su (u com o bit de sinal invertido, para comparar com sinal) e pc.
+# Escritas em x0 são descartadas antes de chegar aqui.
+_EA = "a = (x[{rs1}] + {imm}) & 0xffffffff"
+TEMPLATES = {
+    'add':  "x[{rd}] = (x[{rs1}] + x[{rs2}]) & 0xffffffff",
+    'sub':  "x[{rd}] = (x[{rs1}] - x[{rs2}]) & 0xffffffff",
+    'sll':  "x[{rd}] = (x[{rs1}] << (x[{rs2}] & 31)) & 0xffffffff",
+    'srl':  "x[{rd}] = x[{rs1}] >> (x[{rs2}] & 31)",
+    'sra':  "v = x[{rs1}]\nx[{rd}] = ((v - ((v & 0x80000000) << 1)) >> (x[{rs2}] & 31)) & 0xffffffff",
+    'and':  "x[{rd}] = x[{rs1}] & x[{rs2}]",
+    'or':   "x[{rd}] = x[{rs1}] | x[{rs2}]",
+    'xor':  "x[{rd}] = x[{rs1}] ^ x[{rs2}]",
+    'slt':  "x[{rd}] = 1 if (x[{rs1}] ^ 0x80000000) < (x[{rs2}] ^ 0x80000000) else 0",
+    'sltu': "x[{rd}] = 1 if x[{rs1}] < x[{rs2}] else 0",
+    'addi': "x[{rd}] = (x[{rs1}] + {imm}) & 0xffffffff",
+    'andi': "x[{rd}] = x[{rs1}] & {u}",
+    'ori':  "x[{rd}] = x[{rs1}] | {u}",
+    'xori': "x[{rd}] = x[{rs1}] ^ {u}",
+    'slti': "x[{rd}] = 1 if (x[{rs1}] ^ 0x80000000) < {su} else 0",
+    'sltiu':"x[{rd}] = 1 if x[{rs1}] < {u} else 0",
+    'slli': "x[{rd}] = (x[{rs1}] << {imm}) & 0xffffffff",
+    'srli': "x[{rd}] = x[{rs1}] >> {imm}",
+    'srai': "v = x[{rs1}]\nx[{rd}] = ((v - ((v & 0x80000000) << 1)) >> {imm}) & 0xffffffff",
+    'lui':  "x[{rd}] = {u}",
+    'auipc':"x[{rd}] = ({pc} + {imm}) & 0xffffffff",
+    'lw':   _EA + "\np = pages.get(a >> 12)\n"
+            "x[{rd}] = unpack(p, a & 0xfff)[0] if p is not None and a & 0xfff <= 0xffc else read(a, 4)",
+    'lh':   _EA + "\nx[{rd}] = ((read(a, 2) ^ 0x8000) - 0x8000) & 0xffffffff",
+    'lb':   _EA + "\nx[{rd}] = ((read(a, 1) ^ 0x80) - 0x80) & 0xffffffff",
+    'sw':   _EA + "\np = pages.get(a >> 12)\n"
+            "if p is not None and a & 0xfff <= 0xffc: pack(p, a & 0xfff, x[{rs2}])\n"
+            "else: write(a, 4, x[{rs2}])",
+    'sh':   _EA + "\nwrite(a, 2, x[{rs2}])",
+    'sb':   _EA + "\np = pages.get(a >> 12)\n"
+            "if p is not None: p[a & 0xfff] = x[{rs2}] & 0xff\n"
+            "else: write(a, 1, x[{rs2}])",
+}
+BRANCH_CONDS = {
+    'beq': "x[{rs1}] == x[{rs2}]",
+    'bne': "x[{rs1}] != x[{rs2}]",
+    'blt': "(x[{rs1}] ^ 0x80000000) < (x[{rs2}] ^ 0x80000000)",
+    'bge': "(x[{rs1}] ^ 0x80000000) >= (x[{rs2}] ^ 0x80000000)",
+}
+STORES = ('sw', 'sh', 'sb')
+MEM_CODES = {'lw': 0, 'lh': 0, 'lb': 0, 'sb': 1, 'sh': 2, 'sw': 3}   # traço de memória; store de 1 << (código-1) bytes
+_REG_RE = re.compile(r'x\[(\d+)\]')
+_REG_WRITE_RE = re.compile(r'^x\[(\d+)\] =', re.M)
+
+class Simulator:
+    def __init__(self, text, data=b'', trace_branches=False, trace_memory=False):
+        """text: bytes do .text (little-endian) a partir de TEXT_BASE; data: bytes do .data."""
+        self.mem = Memory()
+        self.mem.load_bytes(TEXT_BASE, text)
+        self.mem.load_bytes(DATA_BASE, data)
+        self.x = [0] * 32
+        self.x[REG_MAP['sp']] = STACK_TOP
+        self.n = len(text) // 4
+        self.steps = 0
+        self.pc = TEXT_BASE
+        self.trace_branches = trace_branches
+        self.branch_pcs = array('I')
+        self.branch_taken = bytearray()
+        self.trace_memory = trace_memory
+        self.fetch_blocks = array('I')
+        self.mem_trace = array('Q')
+        # predecodificação: um registro (mnem, rd, rs1, rs2, imm) por palavra, None se inválida
+        self.decoded = [decode(w) for (w,) in struct.iter_unpack('<I', bytes(text[:self.n*4]))]
+        # blocos traduzidos, indexados pelo índice da primeira instrução; o índice n é a parada
+        self.blocks = [None] * (self.n + 1)
+        self.lens = [0] * (self.n + 1)
+        self.blocks[self.n] = self._halt
+        self._env = {
+            'x': self.x, 'pages': self.mem.pages, 'read': self.mem.read, 'write': self.mem.write,
+            'unpack': _W.unpack_from, 'pack': _W.pack_into, 'index': self._index,
+            'SimError': SimError, 'bpc': self.branch_pcs.append, 'btk': self.branch_taken.append,
+            'mtr': self.mem_trace.append,
+        }
+
+    @classmethod
+    def from_assembly(cls, text_bin, data_bin, trace_branches=False, trace_memory=False):
+        """Carrega o resultado de assemble() (addr -> palavra, bytearray de dados)."""
+        text = bytearray()
+        for addr, w in sorted(text_bin.items()):
+            off = addr - TEXT_BASE
+            if off > len(text):
+                text += bytes(off - len(text))
+            text[off:off+4] = _W.pack(w)
+        return cls(text, data_bin, trace_branches, trace_memory)
+
+    def _halt(self):
+        raise _Halt
+
+    def _index(self, target):
+        """Índice da instrução em target, ou o índice de parada se estiver fora do .text."""
+        i = (target - TEXT_BASE) >> 2
+        if target & 3 or not 0 <= i < self.n:
+            return self.n
+        return i
+
+    def _translate(self, i):
+        """Traduz o bloco básico que começa no índice i para uma função que retorna o próximo índice."""
+        lines = []
+        j = i
+        while True:
+            pc = TEXT_BASE + 4*j
+            d = self.decoded[j]
+            if d is None:
+                lines.append(f"raise SimError('instrução inválida em {pc:#x}')")
+                j += 1
+                break
+            mnem, rd, rs1, rs2, imm = d
+            j += 1
+            if mnem in BRANCH_CONDS:
+                cond = BRANCH_CONDS[mnem].format(rs1=rs1, rs2=rs2)
+                if self.trace_branches:
+                    lines += [f"c = {cond}", f"bpc({pc})", "btk(c)"]
+                    cond = "c"
+                lines.append(f"return {self._index(pc + imm)} if {cond} else {self._index(pc + 4)}")
+                break
+            if mnem == 'jal':
+                if rd: lines.append(f"x[{rd}] = {(pc + 4) & M32}")
+                lines.append(f"return {self._index(pc + imm)}")
+                break
+            if mnem == 'jalr':
+                lines.append(f"t = (x[{rs1}] + {imm}) & 0xfffffffe")
+                if rd: lines.append(f"x[{rd}] = {(pc + 4) & M32}")
+                lines.append("return index(t)")
+                break
+            if rd or mnem in STORES:
+                u = imm & M32
+                code = TEMPLATES[mnem].format(rd=rd, rs1=rs1, rs2=rs2, imm=imm, u=u, su=u ^ SIGN, pc=pc)
+                if self.trace_memory and mnem in MEM_CODES:   # o endereço fica em 'a' na 1ª linha
+                    ea, code = code.split('\n', 1)
+                    lines += [ea, f"mtr(a << 2 | {MEM_CODES[mnem]})"]
+                lines.append(code)
+            if j >= self.n or j - i >= MAX_BLOCK:
+                lines.append(f"return {self._index(TEXT_BASE + 4*j)}")
+                break
+        # registradores usados viram variáveis locais: carregados na entrada e
+        # gravados de volta antes do return (a última linha)
+        src = '\n'.join(lines[:-1])
+        used = sorted({int(r) for r in _REG_RE.findall(src + lines[-1])})
+        written = sorted({int(r) for r in _REG_WRITE_RE.findall(src)})
+        code = ([f"r{r} = x[{r}]" for r in used] + _REG_RE.sub(r'r\1', src).split('\n')
+                + [f"x[{r}] = r{r}" for r in written] + [_REG_RE.sub(r'r\1', lines[-1])])
+        body = '\n'.join('    ' + l for l in code if l)
+        args = ', '.join(f'{k}={k}' for k in self._env)
+        ns = {}
+        exec(f"def _bloco_{i}({args}):\n{body}\n", self._env, ns)
+        f = self.blocks[i] = ns[f'_bloco_{i}']
+        self.lens[i] = j - i
+        return f
+
+    def run(self, max_steps=100_000_000):
+        """Executa a partir de self.pc; retorna o número de instruções executadas."""
+        blocks = self.blocks
+        lens = self.lens
+        translate = self._translate
+        i = self._index(self.pc)
+        steps = 0
+        try:
+            if self.trace_memory:   # laço separado: o normal não paga o registro dos blocos
+                fetched = self.fetch_blocks.append
+                while steps < max_steps:
+                    f = blocks[i]
+                    if f is None:
+                        f = translate(i)
+                    fetched(i)
+                    steps += lens[i]
+                    i = f()
+            else:
+                while steps < max_steps:
+                    f = blocks[i]
+                    if f is None:
+                        f = translate(i)
+                    steps += lens[i]
+                    i = f()
+        except _Halt:
+            pass
+        self.pc = TEXT_BASE + 4*i
+        self.steps += steps
+        return steps
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulador RV32I predecodificado")
+    ap.add_argument('infile', nargs='?', help="arquivo assembly a montar e executar")
+    ap.add_argument('--raw', metavar='PREFIXO', help="executa PREFIXO.text.raw / PREFIXO.data.raw")
+    ap.add_argument('--max-steps', type=int, default=100_000_000)
+    opts = ap.parse_args()
+    if opts.raw:
+        with open(opts.raw + '.text.raw', 'rb') as f:
+            text = f.read()
+        try:
+            with open(opts.raw + '.data.raw', 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        sim = Simulator(text, data)
+    elif opts.infile:
+        with open(opts.infile, 'r', encoding='utf-8') as f:
+            text_bin, data_bin, symtab = assemble(f.readlines(), path=opts.infile)
+        sim = Simulator.from_assembly(text_bin, data_bin)
+    else:
+        ap.error("informe um arquivo .s ou --raw")
+
+    t = time.perf_counter()
+    steps = sim.run(opts.max_steps)
+    dt = time.perf_counter() - t
+    print(f"Instruções executadas: {steps}")
+    print(f"Tempo: {dt:.3f} s ({steps / dt / 1e6 if dt else 0:.2f} MIPS)")
+    print(f"pc final: {sim.pc:#x}")
+    print("Registradores (não nulos):")
+    for r in range(32):
+        if sim.x[r]:
+            print(f"  x{r} = {sim.x[r]:#010x} ({sim.x[r] - ((sim.x[r] & SIGN) << 1)})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+# ---- TESTE DO PEEPHOLE (otimizador.py) ----
+# O resultado tem que ser o mesmo com e sem o otimizador:
+#   python simulador.py teste_peephole.asm
+#   python otimizador.py teste_peephole.asm saida.txt saida
+#   python simulador.py --raw saida
+# Esperado no fim: a0 = 0, a1 = 200
+
+.text
+
+main:
+    la   s0, var1
+
+    # lw_sw com rd = zero: o lw descarta o valor e o sw grava 0 (o sw fica)
+    lw   zero, 0(s0)
+    sw   zero, 0(s0)     # var1 = 0
+
+    # lw_sw normal: o sw grava o que acabou de ser lido (o sw sai)
+    lw   t0, 4(s0)
+    sw   t0, 4(s0)       # var2 continua 200
+
+    lw   a0, 0(s0)       # a0 = 0
+    lw   a1, 4(s0)       # a1 = 200
+
+# ---- TESTE DE DADOS ----
+.data
+
+var1: .word 3
+var2: .word 200